@@ -1,5 +1,14 @@
+import hashlib
+import json
+from base64 import b64decode, b64encode
 from collections import OrderedDict
-from django.core.paginator import EmptyPage
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 from drf_spectacular.utils import OpenApiParameter
 from rest_framework import serializers
 from rest_framework.exceptions import NotFound
@@ -33,6 +42,65 @@ def get_paginated_response(queryset, serializer_class, request, pagination_class
     return Response(serializer.data)
     
 
+def get_table_estimate(model, using="default") -> int:
+    """
+    Number of rows of the model's table estimated by Postgres. -1 if there
+    is no estimate.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return -1
+
+    # Autovacuum does not analyze partitioned tables, only their partitions
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT CASE WHEN parent.relkind = 'p' THEN (
+                SELECT coalesce(sum(partition.reltuples) FILTER (WHERE partition.reltuples >= 0), -1)
+                FROM pg_inherits JOIN pg_class partition ON partition.oid = pg_inherits.inhrelid
+                WHERE pg_inherits.inhparent = parent.oid
+            ) ELSE parent.reltuples END
+            FROM pg_class parent WHERE parent.oid = to_regclass(%s)
+        """, [model._meta.db_table])
+        row = cursor.fetchone()
+        return int(row[0]) if row else -1
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator for large tables. Tables estimated below
+    PAGINATION_EXACT_COUNT_THRESHOLD rows are counted exactly; above it,
+    unfiltered querysets take the table estimate and filtered ones are
+    counted once every PAGINATION_COUNT_CACHE_TTL seconds per query.
+    count_exact says whether the count was computed for this page.
+    """
+    count_exact = True
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+
+        estimate = get_table_estimate(queryset.model, queryset.db)
+        if estimate < settings.PAGINATION_EXACT_COUNT_THRESHOLD:
+            return super().count
+
+        if not queryset.query.where:
+            self.count_exact = False
+            return estimate
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        key = "pagination-count:" + hashlib.sha1(repr((sql, params)).encode()).hexdigest()
+        count = cache.get(key)
+        if count is not None:
+            self.count_exact = False
+            return count
+
+        count = super().count
+        cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TTL)
+        return count
+
+
 class PageNumberPagination(_PageNumberPagination):
     """
     A simple page number based style that supports page numbers as
@@ -136,6 +204,188 @@ class PageNumberPagination(_PageNumberPagination):
         )
         
 
+class ApproximateCountPagination(PageNumberPagination):
+    """
+    Page number pagination with ApproximateCountPaginator, for large tables.
+    The response says whether the count is exact.
+    """
+    django_paginator_class = ApproximateCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["pagination"]["count_exact"] = getattr(
+            self.page.paginator, "count_exact", True)
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["pagination"]["properties"]["count_exact"] = {
+            "type": "boolean",
+            "example": True,
+        }
+        return response_schema
+
+    @classmethod
+    def get_paginated_response_serializer(cls, data_serializer):
+        return inline_serializer(
+            name = "ApproximateCountPagination_" + data_serializer.__qualname__ + "_PaginatedResponseSerializer",
+            fields = {
+                "pagination": inline_serializer(
+                    name = "ApproximateCountPagination_" + data_serializer.__qualname__ + "_PaginatedResponse_PaginationSerializer",
+                    fields = {
+                        "page": serializers.IntegerField(),
+                        "page_size": serializers.IntegerField(),
+                        "count": serializers.IntegerField(),
+                        "pages": serializers.IntegerField(),
+                        "count_exact": serializers.BooleanField(),
+                    }
+                ),
+                "data": data_serializer(many = True),
+            }
+        )
+
+
+class KeysetPagination(ApproximateCountPagination):
+    """
+    Page number pagination for querysets sorted by a datetime field (by
+    default register_datetime) in either direction. The response also has
+    the cursors of the next and previous pages:
+
+    http://api.example.org/history/?page_size=25&cursor=WzIsICIyMDI0LTA1...
+
+    A cursor holds the key (datetime, id) of the last row of its page, so the
+    page is fetched with an indexed range filter instead of an offset that
+    scans every row before it. Requests without cursor are served by page
+    number. Querysets sorted by any other field fall back to the page number
+    pagination.
+    """
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+    keyset_field = "register_datetime"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.next_cursor = self.previous_cursor = None
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        descending = self.get_descending(queryset)
+        if descending is None:
+            return super().paginate_queryset(queryset, request, view)
+
+        prefix = "-" if descending else ""
+        queryset = queryset.order_by(prefix + self.keyset_field, prefix + "id")
+        if not queryset.query.standard_ordering:
+            # Reversed queryset: order_by keeps the reversal
+            queryset = queryset.reverse()
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            number = self.get_page_number(request, paginator)
+            if number in self.last_page_strings:
+                number = paginator.num_pages
+            try:
+                number = paginator.validate_number(number)
+            except EmptyPage:
+                number = paginator.num_pages
+            except InvalidPage:
+                number = 1
+            offset = (number - 1) * page_size
+            rows = list(queryset[offset:offset + page_size])
+        else:
+            number, value, pk, backwards = cursor
+            # Rows past the cursor in the direction the page is read
+            lookup = "lt" if descending != backwards else "gt"
+            position = (Q(**{f"{self.keyset_field}__{lookup}": value}) |
+                        Q(**{self.keyset_field: value, f"id__{lookup}": pk}))
+            if backwards:
+                rows = list(queryset.reverse().filter(position)[:page_size])[::-1]
+            else:
+                rows = list(queryset.filter(position)[:page_size])
+
+        self.page = Page(rows, number, paginator)
+        if rows and self.page.has_next():
+            self.next_cursor = self.encode_cursor(number + 1, rows[-1], backwards=False)
+        if rows and self.page.has_previous():
+            self.previous_cursor = self.encode_cursor(number - 1, rows[0], backwards=True)
+
+        self.request = request
+        return rows
+
+    def get_descending(self, queryset):
+        # Direction of the keyset, None if the queryset is sorted by another field
+        ordering = list(queryset.query.order_by)
+        if not ordering or ordering[0].lstrip("-") != self.keyset_field:
+            return None
+        descending = ordering[0].startswith("-")
+        if any(field not in ("id", "-id", "pk", "-pk") for field in ordering[1:]):
+            return None
+        return descending != (not queryset.query.standard_ordering)
+
+    def encode_cursor(self, number, row, backwards):
+        position = [number, getattr(row, self.keyset_field).isoformat(), row.pk, backwards]
+        return b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            number, value, pk, backwards = json.loads(b64decode(encoded.encode()))
+            value = parse_datetime(value)
+            if value is None or int(number) < 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return int(number), value, int(pk), bool(backwards)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["pagination"]["next_cursor"] = self.next_cursor
+        response.data["pagination"]["previous_cursor"] = self.previous_cursor
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["pagination"]["properties"].update({
+            "next_cursor": {
+                "type": "string",
+                "nullable": True,
+            },
+            "previous_cursor": {
+                "type": "string",
+                "nullable": True,
+            },
+        })
+        return response_schema
+
+    @classmethod
+    def get_paginated_response_serializer(cls, data_serializer):
+        return inline_serializer(
+            name = "KeysetPagination_" + data_serializer.__qualname__ + "_PaginatedResponseSerializer",
+            fields = {
+                "pagination": inline_serializer(
+                    name = "KeysetPagination_" + data_serializer.__qualname__ + "_PaginatedResponse_PaginationSerializer",
+                    fields = {
+                        "page": serializers.IntegerField(),
+                        "page_size": serializers.IntegerField(),
+                        "count": serializers.IntegerField(),
+                        "pages": serializers.IntegerField(),
+                        "count_exact": serializers.BooleanField(),
+                        "next_cursor": serializers.CharField(allow_null = True),
+                        "previous_cursor": serializers.CharField(allow_null = True),
+                    }
+                ),
+                "data": data_serializer(many = True),
+            }
+        )
+
+
 class LimitOffsetPagination(_LimitOffsetPagination):
     
     @classmethod
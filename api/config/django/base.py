@@ -61,6 +61,7 @@ THIRD_PARTY_APPS = [
     "django_crontab"
 ]
 
+# Also run by `manage.py run_monitor_scheduler`
 CRONJOBS = [
     ('*/10 * * * *', 'monitor.cron.update_driving_status', '>> ' +
      os.path.join(BASE_DIR, 'monitor/log/debug_sd.log' + ' 2>&1 ')),
@@ -80,11 +81,13 @@ CRONJOBS = [
      os.path.join(BASE_DIR, 'monitor/log/debug_elb.log' + ' 2>&1 ')),
     ('30 9 * * *', 'monitor.cron.send_daily_sd_report', '>> ' +
      os.path.join(BASE_DIR, 'monitor/log/debug_reports.log' + ' 2>&1 ')),
-    ('0 * * * *', 'monitor.cron.register_severity_counts', '>> ' +
-     os.path.join(BASE_DIR, 'monitor/log/debug_counts.log' + ' 2>&1 ')),
     ('*/30 * * * *', 'monitor.cron.check_severity_ratios'),
+    ('* * * * *', 'monitor.alerts.dispatch', '>> ' +
+     os.path.join(BASE_DIR, 'monitor/log/debug_alerts.log' + ' 2>&1 ')),
     ('5 0 * * *', 'monitor.register_late_logs.register_logs', '>> ' +
      os.path.join(BASE_DIR, 'monitor/log/debug_late_logs.log' + ' 2>&1 ')),
+    ('0 3 * * *', 'monitor.partitions.maintain_partitions', '>> ' +
+     os.path.join(BASE_DIR, 'monitor/log/debug_partitions.log' + ' 2>&1 ')),
 ]
 
 INSTALLED_APPS = [
@@ -211,6 +214,15 @@ CSRF_COOKIE_HTTPONLY = False
 CSRF_COOKIE_SECURE = False
 
 
+# Cache URLs: locmemcache://<name>, filecache:///<path> or redis://<host>:<port>/<db>
+# (the redis backend needs the redis package)
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+    # Responses of the monitor dashboards (monitor.response_cache)
+    "responses": env.cache("MONITOR_RESPONSE_CACHE_URL", default="locmemcache://monitor-responses"),
+}
+
+
 REST_FRAMEWORK = {
     "DEFAULT_VERSIONING_CLASS": "rest_framework.versioning.URLPathVersioning",
     "VERSION_PARAM": "version",
@@ -225,6 +237,10 @@ REST_FRAMEWORK = {
     # "PAGE_SIZE": 25,
     "DEFAULT_SCHEMA_CLASS": "api.openapi.AutoSchema",
 }
+# api.pagination.ApproximateCountPaginator: tables estimated above the
+# threshold are not counted exactly on every page
+PAGINATION_EXACT_COUNT_THRESHOLD = env.int("PAGINATION_EXACT_COUNT_THRESHOLD", default=100000)
+PAGINATION_COUNT_CACHE_TTL = env.int("PAGINATION_COUNT_CACHE_TTL", default=60) # seconds
 '''"DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",
@@ -303,6 +319,7 @@ from config.settings.email import *  # noqa
 from config.settings.errors import *  # noqa
 from config.settings.files_and_storages import *  # noqa
 from config.settings.guardian import *  # noqa
+from config.settings.monitor import *  # noqa
 from config.settings.openapi import *  # noqa
 from config.settings.rest_auth import *  # noqa
 from config.settings.session import *  # noqa
@@ -0,0 +1,41 @@
+from config.env import env
+
+
+# Client API fetching in the monitor cron jobs
+MONITOR_FETCH_MAX_WORKERS = env.int("MONITOR_FETCH_MAX_WORKERS", default=8)
+MONITOR_FETCH_CLIENT_TIMEOUT = env.int("MONITOR_FETCH_CLIENT_TIMEOUT", default=120) # seconds
+MONITOR_REQUEST_TIMEOUT = env.int("MONITOR_REQUEST_TIMEOUT", default=60) # seconds
+
+# run_monitor_scheduler
+MONITOR_SCHEDULER_WORKERS = env.int("MONITOR_SCHEDULER_WORKERS", default=4)
+MONITOR_SCHEDULER_JITTER = env.int("MONITOR_SCHEDULER_JITTER", default=30) # seconds
+
+# Per-client work queue (run_monitor_worker). When enabled, the status jobs
+# enqueue one item per client instead of polling every client themselves.
+MONITOR_WORK_QUEUE = env.bool("MONITOR_WORK_QUEUE", default=False)
+MONITOR_WORK_LEASE = env.int("MONITOR_WORK_LEASE", default=300) # seconds
+MONITOR_WORK_MAX_ATTEMPTS = env.int("MONITOR_WORK_MAX_ATTEMPTS", default=3)
+MONITOR_WORK_POLL_INTERVAL = env.int("MONITOR_WORK_POLL_INTERVAL", default=5) # seconds
+
+# Telegram alerts. Messages are written to the OutboxMessage table and sent
+# by monitor.alerts.dispatch; chat ids are read from the env var named by
+# each chat (e.g. INDUSTRY_CHAT).
+MONITOR_ALERTS = env.bool("ALERTS", default=False)
+TELEGRAM_BOT = env.str("TELEGRAM_BOT", default="")
+TELEGRAM_API_URL = env.str("TELEGRAM_API_URL", default="https://api.telegram.org")
+MONITOR_ALERT_MAX_ATTEMPTS = env.int("MONITOR_ALERT_MAX_ATTEMPTS", default=5)
+MONITOR_ALERT_RETRY_DELAY = env.int("MONITOR_ALERT_RETRY_DELAY", default=30) # seconds, doubled on every attempt
+
+# Spool of late Safe Driving logs, registered nightly by register_late_logs
+MONITOR_LATE_LOG_SPOOL_DIR = env.str("MONITOR_LATE_LOG_SPOOL_DIR", default="./late_logs")
+MONITOR_LATE_LOG_SEGMENT_SIZE = env.int("MONITOR_LATE_LOG_SEGMENT_SIZE", default=1024 * 1024) # bytes
+
+# Monthly partitions of the history tables (monitor.partitions)
+MONITOR_PARTITION_MONTHS_AHEAD = env.int("MONITOR_PARTITION_MONTHS_AHEAD", default=3)
+# Months of history kept per model, e.g. "GxRecord=3,ServerHistory=6". Older
+# partitions are dropped; models that are not listed are kept forever.
+MONITOR_HISTORY_RETENTION = env.dict("MONITOR_HISTORY_RETENTION", cast={"value": int}, default={})
+
+# Cached dashboard responses, invalidated by the status runs (monitor.response_cache)
+MONITOR_RESPONSE_CACHE = env.str("MONITOR_RESPONSE_CACHE", default="responses") # alias in CACHES
+MONITOR_RESPONSE_CACHE_TTL = env.int("MONITOR_RESPONSE_CACHE_TTL", default=3600) # seconds
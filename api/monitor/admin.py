@@ -1,4 +1,5 @@
 from django.contrib import admin
+from api.pagination import ApproximateCountPaginator
 from .models import *
 
 
@@ -68,6 +69,8 @@ class UnitHistoryAdmin(admin.ModelAdmin):
     )
 
     search_fields = ('unit__name',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
     def get_client(self, obj):
         return obj.unit.client.name
@@ -137,6 +140,8 @@ class DeviceHistoryAdmin(admin.ModelAdmin):
     )
 
     search_fields = ('device__name',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
 
 
 class RetailDeviceHistoryAdmin(admin.ModelAdmin):
@@ -365,6 +370,53 @@ class GxRecordsAdmin(admin.ModelAdmin):
     )
 
 
+class LogClassificationRuleAdmin(admin.ModelAdmin):
+    list_display = (
+        'deployment',
+        'gx_model',
+        'category',
+        'pattern',
+        'match_type',
+        'priority',
+        'active',
+    )
+    list_filter = ('deployment', 'gx_model', 'active')
+
+
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = (
+        'job',
+        'started_at',
+        'duration',
+        'success',
+    )
+    list_filter = ('job', 'success')
+
+
+class WorkItemAdmin(admin.ModelAdmin):
+    list_display = (
+        'job',
+        'client',
+        'status',
+        'worker',
+        'attempts',
+        'created_at',
+        'finished_at',
+    )
+    list_filter = ('job', 'status', 'deployment')
+
+
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'chat',
+        'status',
+        'attempts',
+        'created_at',
+        'sent_at',
+    )
+    list_filter = ('chat', 'status')
+
+
 admin.site.register(Unit, UnitAdmin)
 admin.site.register(UnitStatus, UnitStatusAdmin)
 admin.site.register(UnitTrip, UnitTripAdmin)
@@ -411,3 +463,7 @@ admin.site.register(GxMetric)
 admin.site.register(GxRecord, GxRecordsAdmin)
 
 admin.site.register(GxModel)
+admin.site.register(LogClassificationRule, LogClassificationRuleAdmin)
+admin.site.register(JobRun, JobRunAdmin)
+admin.site.register(WorkItem, WorkItemAdmin)
+admin.site.register(OutboxMessage, OutboxMessageAdmin)
@@ -0,0 +1,155 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytz
+import requests
+from django.conf import settings
+from django.db import transaction
+
+from . import client_api
+from .models import OutboxMessage
+
+
+# Telegram alert outbox. The status runs only write their messages to
+# OutboxMessage; dispatch (a cron job, or the dispatch_alerts command) sends
+# the pending messages of every chat as a few digests through one keep-alive
+# session, backing off when Telegram rate limits a chat or fails.
+
+MAX_MESSAGE_LENGTH = 4096  # Telegram limit
+SEPARATOR = "\n\n"
+
+
+def queue(chat: str, message: str):
+    # chat is the name of the env var with the chat id, e.g. "INDUSTRY_CHAT"
+    if not settings.MONITOR_ALERTS:
+        print("Alerts are disabled")
+        return None
+
+    return OutboxMessage.objects.create(chat=chat, message=message)
+
+
+def _digests(messages: list):
+    """
+    Joins the messages of a chat into as few texts as fit in a Telegram
+    message. Yields (text, messages completed by text); longer messages are
+    split and only their last part completes them.
+    """
+    text, batch = "", []
+    for outbox_message in messages:
+        body = outbox_message.message
+        if batch and len(text) + len(SEPARATOR) + len(body) <= MAX_MESSAGE_LENGTH:
+            text += SEPARATOR + body
+            batch.append(outbox_message)
+            continue
+
+        if batch:
+            yield text, batch
+        text, batch = body, [outbox_message]
+
+        while len(text) > MAX_MESSAGE_LENGTH:
+            yield text[:MAX_MESSAGE_LENGTH], []
+            text = text[MAX_MESSAGE_LENGTH:]
+
+    if batch:
+        yield text, batch
+
+
+def send_message(chat_id: str, text: str) -> requests.Response:
+    url = f'{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT}/sendMessage'
+    return client_api.get_session(url).post(
+        url, json={"chat_id": chat_id, "text": text},
+        timeout=settings.MONITOR_REQUEST_TIMEOUT)
+
+
+def _retry_after(response: requests.Response):
+    try:
+        return int(response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return settings.MONITOR_ALERT_RETRY_DELAY
+
+
+def _postpone(messages: list, now, error, seconds=None):
+    """
+    Retries messages after seconds (rate limits, the attempt does not
+    count) or after a delay that doubles on every failed attempt.
+    """
+    for outbox_message in messages:
+        outbox_message.error = error
+        if seconds is None:
+            outbox_message.attempts += 1
+            delay = settings.MONITOR_ALERT_RETRY_DELAY * 2 ** (outbox_message.attempts - 1)
+            if outbox_message.attempts >= settings.MONITOR_ALERT_MAX_ATTEMPTS:
+                outbox_message.status = OutboxMessage.FAILED
+        else:
+            delay = seconds
+        outbox_message.next_attempt_at = now + timedelta(seconds=delay)
+
+    OutboxMessage.objects.bulk_update(
+        messages, ["status", "attempts", "next_attempt_at", "error"])
+
+
+def _dispatch_chat(chat: str, messages: list, now) -> int:
+    chat_id = os.environ.get(chat)
+    if not chat_id or not settings.TELEGRAM_BOT:
+        for outbox_message in messages:
+            outbox_message.status = OutboxMessage.FAILED
+            outbox_message.error = f"{chat} or TELEGRAM_BOT is not configured"
+        OutboxMessage.objects.bulk_update(messages, ["status", "error"])
+        return 0
+
+    sent = 0
+    pending = list(messages)
+    for text, done in _digests(messages):
+        try:
+            response = send_message(chat_id, text)
+        except requests.RequestException as e:
+            # Keep the order of the chat: the rest waits for this digest
+            _postpone(pending, now, str(e))
+            return sent
+
+        if response.status_code == 429:
+            seconds = _retry_after(response)
+            print(f"{chat} is rate limited, retrying in {seconds}s")
+            _postpone(pending, now, response.text, seconds)
+            return sent
+        if response.status_code != 200:
+            print(f"{chat} alert error: {response.status_code} {response.text}")
+            _postpone(pending, now, response.text)
+            return sent
+
+        for outbox_message in done:
+            outbox_message.status = OutboxMessage.SENT
+            outbox_message.sent_at = datetime.now(tz=pytz.timezone("UTC"))
+            outbox_message.error = None
+        OutboxMessage.objects.bulk_update(done, ["status", "sent_at", "error"])
+        pending = [outbox_message for outbox_message in pending
+                   if outbox_message.status == OutboxMessage.PENDING]
+        sent += len(done)
+
+    return sent
+
+
+def dispatch(limit=1000) -> int:
+    """
+    Sends the pending messages that are due. Messages are locked while they
+    are sent (SKIP LOCKED), so dispatchers can run at the same time.
+    Returns the number of messages sent.
+    """
+    now = datetime.now(tz=pytz.timezone("UTC"))
+
+    with transaction.atomic():
+        messages = OutboxMessage.objects.select_for_update(skip_locked=True).filter(
+            status=OutboxMessage.PENDING, next_attempt_at__lte=now,
+        ).order_by("id")[:limit]
+
+        by_chat = defaultdict(list)
+        for outbox_message in messages:
+            by_chat[outbox_message.chat].append(outbox_message)
+
+        sent = sum(_dispatch_chat(chat, chat_messages, now)
+                   for chat, chat_messages in by_chat.items())
+
+    if by_chat:
+        print(f"{sent} alerts sent to {len(by_chat)} chats")
+    return sent
@@ -1,7 +1,7 @@
 from datetime import datetime
 from django.shortcuts import render
-from django.db.models import Count, F, Window, Q, Sum
-from django.db.models.functions import Lead, Cast
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Cast, Coalesce
 from django.db.models.fields.json import KT
 from django.utils.timezone import make_aware
 from django_filters.rest_framework import DjangoFilterBackend
@@ -17,9 +17,12 @@ import humanize.locale
 
 from .selectors import *
 from .services import assign_project_to_server, create_project, delete_project, edit_project, get_or_create_client, get_or_create_gx_metric
-from api.pagination import get_paginated_response, LimitOffsetPagination
+from api.pagination import get_paginated_response, KeysetPagination, LimitOffsetPagination
 from .models import UnitStatus
 from .cron import api_login, make_request
+from . import fleet_status
+from .response_cache import bump_generation, run_cached
+from .rollups import most_common
 
 
 class DeploymentList(APIView):
@@ -50,22 +53,12 @@ class UnitStatusList(APIView):
         pending_status = serializers.IntegerField()
         client = serializers.CharField(source='unit.client.name')
 
-    class reversor:
-        def __init__(self, obj):
-            self.obj = obj
-
-        def __eq__(self, other):
-            return other.obj == self.obj
-
-        def __lt__(self, other):
-            return other.obj < self.obj
-
+    @run_cached()
     def get(self, request, *args, **kwargs):
-        devices = active_unitstatus_list()
-        sorted_units = sorted(
-            devices, key=lambda x: (x.status.priority, x.status.severity, x.unit.name), reverse=True)
+        devices = active_unitstatus_list().order_by(
+            "-status__priority", "-status__severity", "-unit__name")
 
-        data = self.OutputSerializer(sorted_units, many=True).data
+        data = self.OutputSerializer(devices, many=True).data
 
         return Response(data)
 
@@ -82,6 +75,7 @@ class DeviceStatusList(APIView):
         delayed = serializers.BooleanField()
         delay_time = serializers.DurationField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
         deployment_name = ' '.join(
             map(lambda x: x.capitalize(), request.path.split("/")[4].split("-")))
@@ -101,6 +95,7 @@ class UnitSeverityCount(APIView):
         count = serializers.IntegerField()
         breakdown = serializers.JSONField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
 
         counts = get_units_severity_counts()
@@ -123,6 +118,7 @@ class DeviceSeverityCount(APIView):
         severity = serializers.IntegerField()
         count = serializers.IntegerField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
         deployment_name = ' '.join(
             map(lambda x: x.capitalize(), request.path.split("/")[4].split("-")))
@@ -138,6 +134,46 @@ class DeviceSeverityCount(APIView):
         return Response(serializer.data)
 
 
+class FleetSummaryAPI(APIView):
+    class FiltersSerializer(serializers.Serializer):
+        top = serializers.IntegerField(
+            required=False, min_value=1, max_value=50, default=fleet_status.TOP_PROBLEMS)
+
+    class OutputSerializer(serializers.Serializer):
+        class BreakdownSerializer(serializers.Serializer):
+            kind = serializers.CharField()
+            severity = serializers.IntegerField()
+            description = serializers.CharField()
+            count = serializers.IntegerField()
+
+        class ProblemSerializer(serializers.Serializer):
+            kind = serializers.CharField()
+            entity_id = serializers.IntegerField()
+            name = serializers.CharField()
+            client = serializers.CharField()
+            severity = serializers.IntegerField()
+            description = serializers.CharField()
+            priority = serializers.BooleanField()
+            last_update = serializers.DateTimeField()
+
+        deployment = serializers.CharField()
+        total = serializers.IntegerField()
+        severity_counts = serializers.JSONField()
+        kinds = serializers.JSONField()
+        breakdown = BreakdownSerializer(many=True)
+        top_problems = ProblemSerializer(many=True)
+
+    def get(self, request, *args, **kwargs):
+        filters_serializer = self.FiltersSerializer(data=request.query_params)
+        filters_serializer.is_valid(raise_exception=True)
+
+        summary = fleet_status.summary(top=filters_serializer.validated_data["top"])
+
+        data = self.OutputSerializer(summary, many=True).data
+
+        return Response(data)
+
+
 # Device history
 class UnitFailedTripsAPI(APIView):
     class OutputSerializer(serializers.Serializer):
@@ -216,13 +252,14 @@ class UnitHistoryList(APIView):
             filters_serializer.validated_data["register_datetime_after"] = start_date
 
         logs = get_unithistory(
-            unit_id, filters=filters_serializer.validated_data)[::-1]
+            unit_id, filters=filters_serializer.validated_data).reverse()
 
         # return Response(output)
         return get_paginated_response(
             serializer_class=self.OutputSerializer,
             queryset=logs,
             request=request,
+            pagination_class=KeysetPagination,
         )
 
 
@@ -269,12 +306,13 @@ class DeviceHistoryList(APIView):
             filters_serializer.validated_data["register_datetime_after"] = start_date
 
         logs = get_devicehistory(
-            device_id, filters=filters_serializer.validated_data)[::-1]
+            device_id, filters=filters_serializer.validated_data).reverse()
 
         return get_paginated_response(
             serializer_class=self.OutputSerializer,
             queryset=logs,
             request=request,
+            pagination_class=KeysetPagination,
         )
 
 
@@ -316,13 +354,13 @@ class UnitReportAPI(APIView):
             if unit_status.pending_status:
                 text += f" - Status ({unit_status.pending_status})\n"
 
-        status_count = GxStatus.objects.filter(severity=5, deployment__name="Safe Driving").annotate(count=Count('unithistory', filter=(
-            Q(unithistory__unit_id=unit_id, unithistory__register_datetime__gte=now-timedelta(weeks=1))))).filter(count__gt=0).order_by("-count")
+        status_count = get_unit_description_counts(
+            unit_id, 5, now - timedelta(weeks=1))
 
         if status_count:
             text += "\nProblemas en la última semana:\n"
-            for count in status_count:
-                text += f" - {count.description} ({humanize.naturaldelta(timedelta(minutes=count.count*10))})\n"
+            for description, count in status_count:
+                text += f" - {description} ({humanize.naturaldelta(timedelta(minutes=count*10))})\n"
         print(text)
 
         return Response({"content": text}, status=status.HTTP_200_OK)
@@ -333,34 +371,10 @@ class UnitStatusTime(APIView):
         register_datetime = serializers.DateTimeField()
 
     def get(self, request, unit_id, *args, **kwargs):
-        unit_histories_with_next_severity = UnitHistory.objects.filter(
-            unit_id=unit_id,
-        ).annotate(
-            next_severity=Window(
-                expression=Lead('status__severity'),
-                partition_by=[F('unit_id')],
-                order_by=F('register_datetime').desc()
-            )
-        )
-
-        severity_changes = unit_histories_with_next_severity.filter(
-            # Excludes the last record for each unit, as it has no "next" record
-            next_severity__isnull=False,
-            # Optional: Exclude records with no severity to avoid comparing None values
-            status__severity__isnull=False
-        ).exclude(
-            status__severity=F('next_severity')
-        )
-
-        if not severity_changes:
-            first_register = unit_histories_with_next_severity[len(
-                unit_histories_with_next_severity)-1]
-            output = self.OutputSerializer(first_register).data
-            return Response(output)
-        else:
-            last_change = severity_changes[0]
-            output = self.OutputSerializer(last_change).data
-            return Response(output)
+        # Start of the current severity, from the open status interval
+        output = self.OutputSerializer(
+            {"register_datetime": get_status_since(unit_id)}).data
+        return Response(output)
 
 
 class DeviceStatusTime(APIView):
@@ -368,34 +382,10 @@ class DeviceStatusTime(APIView):
         register_datetime = serializers.DateTimeField()
 
     def get(self, request, device_id, *args, **kwargs):
-        device_histories_with_next_severity = DeviceHistory.objects.filter(
-            device_id=device_id,
-        ).annotate(
-            next_severity=Window(
-                expression=Lead('status__severity'),
-                partition_by=[F('device_id')],
-                order_by=F('register_datetime').desc()
-            )
-        )
-
-        severity_changes = device_histories_with_next_severity.filter(
-            # Excludes the last record for each unit, as it has no "next" record
-            next_severity__isnull=False,
-            # Optional: Exclude records with no severity to avoid comparing None values
-            status__severity__isnull=False
-        ).exclude(
-            status__severity=F('next_severity')
-        )
-
-        if not severity_changes:
-            first_register = device_histories_with_next_severity[len(
-                device_histories_with_next_severity)-1]
-            output = self.OutputSerializer(first_register).data
-            return Response(output)
-        else:
-            last_change = severity_changes[0]
-            output = self.OutputSerializer(last_change).data
-            return Response(output)
+        # Start of the current severity, from the open status interval
+        output = self.OutputSerializer(
+            {"register_datetime": get_status_since(device_id)}).data
+        return Response(output)
 
 
 class UnitLastActiveStatus(APIView):
@@ -498,14 +488,13 @@ class CameraDisconnectionsList(APIView):
             filters_serializer.validated_data["register_datetime_after"] = start_date
 
         logs = get_cameradisconnections(
-            device_id, filters=filters_serializer.validated_data)[::-1]
-        
-        print(logs)
+            device_id, filters=filters_serializer.validated_data).reverse()
 
         return get_paginated_response(
             serializer_class=self.OutputSerializer,
             queryset=logs,
             request=request,
+            pagination_class=KeysetPagination,
         )
 
 
@@ -591,39 +580,16 @@ class UnitScatterPlotAPI(APIView):
             filters_serializer.validated_data["register_datetime_before"] = end_date
             filters_serializer.validated_data["register_datetime_after"] = start_date
 
-        registers = get_sd_scatterplot_data(
+        rollups = get_sd_scatterplot_data(
             unit_id, filters=filters_serializer.validated_data)
 
-        grouped_by_hour = {}
-
-        descriptions = {}
-        for register in registers:
-            hour = (register.register_datetime -
-                    timedelta(hours=6) + timedelta(hours=1)).replace(tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
-            severity = register.status.severity
-            description = register.status.description
-
-            if hour not in grouped_by_hour:
-                grouped_by_hour[hour] = [severity]
-            else:
-                grouped_by_hour[hour].append(severity)
-
-            if hour in descriptions:
-                if severity in descriptions[hour]:
-                    descriptions[hour][severity].append(description)
-                else:
-                    descriptions[hour][severity] = [description]
-            else:
-                descriptions[hour] = {severity: [description]}
-
+        # The rollups have the most common severity and description of each hour
         output = []
-        for date, severities in grouped_by_hour.items():
-            most_common_severity = max(set(severities), key=severities.count)
-            most_common_description = max(
-                set(descriptions[date][most_common_severity]), key=descriptions[date][most_common_severity].count)
-            output.append({"hora": date,
-                           "severidad": most_common_severity,
-                           "descripcion": most_common_description})
+        for rollup in rollups:
+            output.append({"hora": (rollup.hour -
+                                    timedelta(hours=6) + timedelta(hours=1)).replace(tzinfo=None).isoformat(timespec="hours", sep=' ') + "h",
+                           "severidad": rollup.severity,
+                           "descripcion": rollup.description})
 
         data = self.OutputSerializer(output, many=True).data
 
@@ -698,39 +664,16 @@ class DeviceScatterPlotAPI(APIView):
             filters_serializer.validated_data["register_datetime_before"] = end_date
             filters_serializer.validated_data["register_datetime_after"] = start_date
 
-        registers = get_ind_scatterplot_data(
+        rollups = get_ind_scatterplot_data(
             device_id, filters=filters_serializer.validated_data)
 
-        grouped_by_hour = {}
-
-        descriptions = {}
-        for register in registers:
-            hour = (register.register_datetime -
-                    timedelta(hours=6)).replace(tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
-            severity = register.status.severity
-            description = register.status.description
-
-            if hour not in grouped_by_hour:
-                grouped_by_hour[hour] = [severity]
-            else:
-                grouped_by_hour[hour].append(severity)
-
-            if hour in descriptions:
-                if severity in descriptions[hour]:
-                    descriptions[hour][severity].append(description)
-                else:
-                    descriptions[hour][severity] = [description]
-            else:
-                descriptions[hour] = {severity: [description]}
-
+        # The rollups have the most common severity and description of each hour
         output = []
-        for date, severities in grouped_by_hour.items():
-            most_common_severity = max(set(severities), key=severities.count)
-            most_common_description = max(
-                set(descriptions[date][most_common_severity]), key=descriptions[date][most_common_severity].count)
-            output.append({"hora": date,
-                           "severidad": most_common_severity,
-                           "descripcion": most_common_description})
+        for rollup in rollups:
+            output.append({"hora": (rollup.hour -
+                                    timedelta(hours=6)).replace(tzinfo=None).isoformat(timespec="hours", sep=' ') + "h",
+                           "severidad": rollup.severity,
+                           "descripcion": rollup.description})
 
         data = self.OutputSerializer(output, many=True).data
 
@@ -746,6 +689,7 @@ class SafeDrivingAreaPlotAPI(APIView):
         timestamp = serializers.DateTimeField()
         severity_counts = serializers.JSONField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
         import datetime
         import pytz
@@ -753,7 +697,6 @@ class SafeDrivingAreaPlotAPI(APIView):
         filters_serializer = self.FiltersSerializer(data=request.query_params)
         filters_serializer.is_valid(raise_exception=True)
 
-        severity_keys = list(range(6))
         timezone = pytz.timezone("America/Mexico_City")
 
         # Si no se especificó rango de fechas, regresar registros del último día
@@ -768,39 +711,16 @@ class SafeDrivingAreaPlotAPI(APIView):
             filters_serializer.validated_data["timestamp_before"] = end_date
             filters_serializer.validated_data["timestamp_after"] = start_date
 
+        # Sin cliente, los registros de todo el despliegue
         client_name = request.query_params.get("client")
-        registers = get_area_plot_data(
+        snapshots = get_area_plot_data(
             "Safe Driving", client_name=client_name, filters=filters_serializer.validated_data)
 
-        hourly_counts = {}
-
-        if not client_name:
-
-            for register in registers:
-
-                # Agrupar registros de diferentes clientes, por hora
-                if register.timestamp in hourly_counts:
-                    for k, v in register.severity_counts.items():
-                        if k in hourly_counts[register.timestamp]:
-                            hourly_counts[register.timestamp][k] += v
-                        else:
-                            hourly_counts[register.timestamp][k] = v
-
-                else:
-                    hourly_counts[register.timestamp] = register.severity_counts
-
-            registers = []
-            for timestamp, counts in hourly_counts.items():
-                registers.append(
-                    {"timestamp": timestamp, "severity_counts": counts})
-
-            for register in registers:
-                register["timestamp"] = register["timestamp"].astimezone(pytz.timezone("America/Mexico_City")).replace(
-                    tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
-        else:
-            for register in registers:
-                register.timestamp = register.timestamp.astimezone(pytz.timezone("America/Mexico_City")).replace(
-                    tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
+        registers = [{
+            "timestamp": snapshot.timestamp.astimezone(timezone).replace(
+                tzinfo=None).isoformat(timespec="minutes", sep=' ') + "h",
+            "severity_counts": snapshot.severity_counts,
+        } for snapshot in snapshots]
 
         data = self.OutputSerializer(registers, many=True).data
 
@@ -816,7 +736,9 @@ class IndustryAreaPlotAPI(APIView):
         timestamp = serializers.DateTimeField()
         severity_counts = serializers.JSONField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
+        import datetime
         import pytz
 
         deployment_name = ' '.join(
@@ -825,47 +747,30 @@ class IndustryAreaPlotAPI(APIView):
         filters_serializer = self.FiltersSerializer(data=request.query_params)
         filters_serializer.is_valid(raise_exception=True)
 
+        timezone = pytz.timezone("America/Mexico_City")
+
         # Si no se especificó rango de fechas, regresar registros del último día
         if not (filters_serializer.validated_data.get("timestamp_after") or
                 filters_serializer.validated_data.get("timestamp_before")):
-            import datetime
-            import pytz
 
             date_now = datetime.datetime.now()
-            end_date = date_now.astimezone(pytz.timezone("America/Mexico_City")).replace(
+            end_date = date_now.astimezone(timezone).replace(
                 tzinfo=pytz.utc) + datetime.timedelta(hours=6)
             start_date = end_date - timedelta(hours=24)
 
             filters_serializer.validated_data["timestamp_before"] = end_date
             filters_serializer.validated_data["timestamp_after"] = start_date
 
+        # Sin cliente, los registros de todo el despliegue
         client_name = request.query_params.get("client")
-        registers = get_area_plot_data(
+        snapshots = get_area_plot_data(
             deployment_name, client_name=client_name, filters=filters_serializer.validated_data)
 
-        hourly_counts = {}
-
-        if not client_name:
-            for register in registers:
-                if register.timestamp in hourly_counts:
-                    hourly_counts[register.timestamp] = {
-                        k: hourly_counts[register.timestamp][k] + v
-                        for k, v in register.severity_counts.items()}
-                else:
-                    hourly_counts[register.timestamp] = register.severity_counts
-
-            registers = []
-            for timestamp, counts in hourly_counts.items():
-                registers.append(
-                    {"timestamp": timestamp, "severity_counts": counts})
-
-            for register in registers:
-                register["timestamp"] = register["timestamp"].astimezone(pytz.timezone("America/Mexico_City")).replace(
-                    tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
-        else:
-            for register in registers:
-                register.timestamp = register.timestamp.astimezone(pytz.timezone("America/Mexico_City")).replace(
-                    tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
+        registers = [{
+            "timestamp": snapshot.timestamp.astimezone(timezone).replace(
+                tzinfo=None).isoformat(timespec="minutes", sep=' ') + "h",
+            "severity_counts": snapshot.severity_counts,
+        } for snapshot in snapshots]
 
         data = self.OutputSerializer(registers, many=True).data
 
@@ -876,6 +781,7 @@ class SafeDrivingLastUpdateAPI(APIView):
     class OutputSerializer(serializers.Serializer):
         last_update = serializers.DateTimeField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
         last_update_sd = get_last_sd_update()
         output = self.OutputSerializer(last_update_sd).data
@@ -887,6 +793,7 @@ class IndustryLastUpdateAPI(APIView):
     class OutputSerializer(serializers.Serializer):
         last_update = serializers.DateTimeField()
 
+    @run_cached("Safe Driving")
     def get(self, request, *args, **kwargs):
         last_update_sd = get_last_sd_update()
         output = self.OutputSerializer(last_update_sd).data
@@ -1300,6 +1207,8 @@ class SetUnitAsInactiveAPI(APIView):
             unit_status = get_unitstatus(unit_id)
             unit_status.active = False
             unit_status.save()
+            bump_generation(unit_status.unit.client.deployment_id)
+            fleet_status.refresh(FleetStatus.UNIT, unit_status.unit.client.deployment.name)
         except:
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1313,6 +1222,8 @@ class SetDeviceClientAsInactiveAPI(APIView):
             client = device.client
             client.active = False
             client.save()
+            bump_generation(client.deployment_id)
+            fleet_status.refresh(FleetStatus.DEVICE, client.deployment.name)
         except Exception as e:
             return Response(data={"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1337,6 +1248,7 @@ class RombergDeviceStatusList(APIView):
         severity = serializers.IntegerField(source='status.severity')
         description = serializers.CharField(source='status.description')
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
         status = get_all_romberg_device_status()
 
@@ -1351,6 +1263,7 @@ class RombergDeviceSeverityCount(APIView):
         severity = serializers.IntegerField()
         count = serializers.IntegerField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
 
         counts = RombergDeviceStatus.objects.filter(active=True).values('status__severity') \
@@ -1393,34 +1306,10 @@ class RombergDeviceStatusTime(APIView):
         register_datetime = serializers.DateTimeField()
 
     def get(self, request, device_id, *args, **kwargs):
-        device_histories_with_next_severity = RombergDeviceHistory.objects.filter(
-            device_id=device_id,
-        ).annotate(
-            next_severity=Window(
-                expression=Lead('status__severity'),
-                partition_by=[F('device_id')],
-                order_by=F('register_datetime').desc()
-            )
-        )
-
-        severity_changes = device_histories_with_next_severity.filter(
-            # Excludes the last record for each unit, as it has no "next" record
-            next_severity__isnull=False,
-            # Optional: Exclude records with no severity to avoid comparing None values
-            status__severity__isnull=False
-        ).exclude(
-            status__severity=F('next_severity')
-        )
-
-        if not severity_changes:
-            first_register = device_histories_with_next_severity[len(
-                device_histories_with_next_severity)-1]
-            output = self.OutputSerializer(first_register).data
-            return Response(output)
-        else:
-            last_change = severity_changes[0]
-            output = self.OutputSerializer(last_change).data
-            return Response(output)
+        # Start of the current severity, from the open status interval
+        output = self.OutputSerializer(
+            {"register_datetime": get_status_since(device_id)}).data
+        return Response(output)
 
 
 class RombergLogsAPI(APIView):
@@ -1594,12 +1483,13 @@ class RombergDeviceHistoryList(APIView):
         data = {'device_id': device_id}
 
         logs = get_romberg_device_history(
-            data, filters=filters_serializer.validated_data)[::-1]
+            data, filters=filters_serializer.validated_data).reverse()
 
         return get_paginated_response(
             serializer_class=self.OutputSerializer,
             queryset=logs,
             request=request,
+            pagination_class=KeysetPagination,
         )
 
 
@@ -1669,36 +1559,25 @@ class RombergDeviceScatterPlotAPI(APIView):
             filters_serializer.validated_data["register_datetime_before"] = end_date
             filters_serializer.validated_data["register_datetime_after"] = start_date
 
-        registers = get_romberg_scatterplot_data(
-            {"device_id": device_id}, filters=filters_serializer.validated_data)
-
-        grouped_by_hour = {}
+        rollups = list(get_romberg_scatterplot_data(
+            {"device_id": device_id}, filters=filters_serializer.validated_data))
 
+        # The description of each hour is the most common one of its
+        # severity in the whole range
         descriptions = {}
-        for register in registers:
-            hour = (register.register_datetime -
-                    timedelta(hours=6)).replace(tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
-            severity = register.status.severity
-            description = register.status.description
-
-            if hour not in grouped_by_hour:
-                grouped_by_hour[hour] = [severity]
-            else:
-                grouped_by_hour[hour].append(severity)
-
-            if severity in descriptions:
-                descriptions[severity].append(description)
-            else:
-                descriptions[severity] = [description]
+        for rollup in rollups:
+            for severity, counts in rollup.description_counts.items():
+                severity_descriptions = descriptions.setdefault(severity, {})
+                for description, count in counts.items():
+                    severity_descriptions[description] = severity_descriptions.get(
+                        description, 0) + count
 
         output = []
-        for date, severities in grouped_by_hour.items():
-            most_common_severity = max(set(severities), key=severities.count)
-            most_common_description = max(
-                set(descriptions[most_common_severity]), key=descriptions[most_common_severity].count)
-            output.append({"hora": date,
-                           "severidad": most_common_severity,
-                           "descripcion": most_common_description})
+        for rollup in rollups:
+            output.append({"hora": (rollup.hour -
+                                    timedelta(hours=6)).replace(tzinfo=None).isoformat(timespec="hours", sep=' ') + "h",
+                           "severidad": rollup.severity,
+                           "descripcion": most_common(descriptions[str(rollup.severity)]) or None})
 
         data = self.OutputSerializer(output, many=True).data
 
@@ -1714,6 +1593,7 @@ class RombergAreaPlotAPI(APIView):
         timestamp = serializers.DateTimeField()
         severity_counts = serializers.JSONField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
         import datetime
         import pytz
@@ -1721,7 +1601,6 @@ class RombergAreaPlotAPI(APIView):
         filters_serializer = self.FiltersSerializer(data=request.query_params)
         filters_serializer.is_valid(raise_exception=True)
 
-        severity_keys = list(range(6))
         timezone = pytz.timezone("America/Mexico_City")
 
         # Si no se especificó rango de fechas, regresar registros del último día
@@ -1736,39 +1615,16 @@ class RombergAreaPlotAPI(APIView):
             filters_serializer.validated_data["timestamp_before"] = end_date
             filters_serializer.validated_data["timestamp_after"] = start_date
 
+        # Sin cliente, los registros de todo el despliegue
         client_name = request.query_params.get("client")
-        registers = get_area_plot_data(
+        snapshots = get_area_plot_data(
             "Romberg", client_name=client_name, filters=filters_serializer.validated_data)
 
-        hourly_counts = {}
-
-        if not client_name:
-
-            for register in registers:
-
-                # Agrupar registros de diferentes clientes, por hora
-                if register.timestamp in hourly_counts:
-                    for k, v in register.severity_counts.items():
-                        if k in hourly_counts[register.timestamp]:
-                            hourly_counts[register.timestamp][k] += v
-                        else:
-                            hourly_counts[register.timestamp][k] = v
-
-                else:
-                    hourly_counts[register.timestamp] = register.severity_counts
-
-            registers = []
-            for timestamp, counts in hourly_counts.items():
-                registers.append(
-                    {"timestamp": timestamp, "severity_counts": counts})
-
-            for register in registers:
-                register["timestamp"] = register["timestamp"].astimezone(pytz.timezone("America/Mexico_City")).replace(
-                    tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
-        else:
-            for register in registers:
-                register.timestamp = register.timestamp.astimezone(pytz.timezone("America/Mexico_City")).replace(
-                    tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
+        registers = [{
+            "timestamp": snapshot.timestamp.astimezone(timezone).replace(
+                tzinfo=None).isoformat(timespec="minutes", sep=' ') + "h",
+            "severity_counts": snapshot.severity_counts,
+        } for snapshot in snapshots]
 
         data = self.OutputSerializer(registers, many=True).data
 
@@ -1793,6 +1649,8 @@ class SetRombergDeviceAsInactiveAPI(APIView):
             device_status = get_romberg_device_status(device_id)
             device_status.active = False
             device_status.save()
+            bump_generation(device_status.device.client.deployment_id)
+            fleet_status.refresh(FleetStatus.ROMBERG_DEVICE, device_status.device.client.deployment.name)
         except:
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1997,7 +1855,7 @@ class AllServersProjectsAPI(APIView):
             slug_field="name", read_only=True, many=True)
 
     def get(self, request, *args, **kwargs):
-        servers = get_all_servers()
+        servers = get_all_servers().prefetch_related("projects")
 
         output = self.OutputSerializer(servers, many=True).data
 
@@ -2027,11 +1885,9 @@ class ServerStatusListAPI(APIView):
             filters=filters_serializer.validated_data)
 
         all_server_status = all_server_status.annotate(
-            cpu_utilization=Cast(
-                KT("activity_data__Uso de CPU"), output_field=models.FloatField()))
-
-        all_server_status = sorted(
-            all_server_status, key=lambda x: x.activity_data.get("Uso de CPU", 0), reverse=True)
+            cpu_utilization=Coalesce(Cast(
+                KT("activity_data__Uso de CPU"), output_field=models.FloatField()), 0.0),
+        ).order_by("-cpu_utilization")
 
         output = self.OutputSerializer(
             all_server_status, many=True, read_only=True).data
@@ -2356,11 +2212,9 @@ class RDSStatusListAPI(APIView):
             filters=filters_serializer.validated_data)
 
         all_rds_status = all_rds_status.annotate(
-            cpu_utilization=Cast(
-                KT("activity_data__Uso de CPU"), output_field=models.FloatField()))
-
-        all_rds_status = sorted(
-            all_rds_status, key=lambda x: x.activity_data.get("Uso de CPU", 0), reverse=True)
+            cpu_utilization=Coalesce(Cast(
+                KT("activity_data__Uso de CPU"), output_field=models.FloatField()), 0.0),
+        ).order_by("-cpu_utilization")
 
         output = self.OutputSerializer(all_rds_status, many=True).data
 
@@ -2474,9 +2328,7 @@ class AllRDSProjectsAPI(APIView):
             slug_field="name", read_only=True, many=True)
 
     def get(self, request, *args, **kwargs):
-        rds = get_all_rds()
-        for r in rds:
-            print(r.projects)
+        rds = get_all_rds().prefetch_related("projects")
 
         output = self.OutputSerializer(rds, many=True).data
 
@@ -2612,6 +2464,7 @@ class RetailDeviceStatusList(APIView):
         description = serializers.CharField(source='status.description')
         log_counts = serializers.JSONField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
         devices = retail_device_status_list()
 
@@ -2626,6 +2479,7 @@ class RetailDeviceSeverityCount(APIView):
         severity = serializers.IntegerField()
         count = serializers.IntegerField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
 
         counts = RetailDeviceStatus.objects.filter(active=True).values('status__severity') \
@@ -2665,34 +2519,10 @@ class RetailDeviceStatusTime(APIView):
         register_datetime = serializers.DateTimeField()
 
     def get(self, request, device_id, *args, **kwargs):
-        device_histories_with_next_severity = RetailDeviceHistory.objects.filter(
-            device_id=device_id,
-        ).annotate(
-            next_severity=Window(
-                expression=Lead('status__severity'),
-                partition_by=[F('device_id')],
-                order_by=F('register_datetime').desc()
-            )
-        )
-
-        severity_changes = device_histories_with_next_severity.filter(
-            # Excludes the last record for each unit, as it has no "next" record
-            next_severity__isnull=False,
-            # Optional: Exclude records with no severity to avoid comparing None values
-            status__severity__isnull=False
-        ).exclude(
-            status__severity=F('next_severity')
-        )
-
-        if not severity_changes:
-            first_register = device_histories_with_next_severity[len(
-                device_histories_with_next_severity)-1]
-            output = self.OutputSerializer(first_register).data
-            return Response(output)
-        else:
-            last_change = severity_changes[0]
-            output = self.OutputSerializer(last_change).data
-            return Response(output)
+        # Start of the current severity, from the open status interval
+        output = self.OutputSerializer(
+            {"register_datetime": get_status_since(device_id)}).data
+        return Response(output)
 
 
 class RetailLogsAPI(APIView):
@@ -2817,12 +2647,13 @@ class RetailDeviceHistoryList(APIView):
         data = {'device_id': device_id}
 
         logs = get_retail_device_history(
-            data, filters=filters_serializer.validated_data)[::-1]
+            data, filters=filters_serializer.validated_data).reverse()
 
         return get_paginated_response(
             serializer_class=self.OutputSerializer,
             queryset=logs,
             request=request,
+            pagination_class=KeysetPagination,
         )
 
 
@@ -2892,36 +2723,25 @@ class RetailDeviceScatterPlotAPI(APIView):
             filters_serializer.validated_data["register_datetime_before"] = end_date
             filters_serializer.validated_data["register_datetime_after"] = start_date
 
-        registers = get_retail_scatterplot_data(
-            {"device_id": device_id}, filters=filters_serializer.validated_data)
-
-        grouped_by_hour = {}
+        rollups = list(get_retail_scatterplot_data(
+            {"device_id": device_id}, filters=filters_serializer.validated_data))
 
+        # The description of each hour is the most common one of its
+        # severity in the whole range
         descriptions = {}
-        for register in registers:
-            hour = (register.register_datetime -
-                    timedelta(hours=6)).replace(tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
-            severity = register.status.severity
-            description = register.status.description
-
-            if hour not in grouped_by_hour:
-                grouped_by_hour[hour] = [severity]
-            else:
-                grouped_by_hour[hour].append(severity)
-
-            if severity in descriptions:
-                descriptions[severity].append(description)
-            else:
-                descriptions[severity] = [description]
+        for rollup in rollups:
+            for severity, counts in rollup.description_counts.items():
+                severity_descriptions = descriptions.setdefault(severity, {})
+                for description, count in counts.items():
+                    severity_descriptions[description] = severity_descriptions.get(
+                        description, 0) + count
 
         output = []
-        for date, severities in grouped_by_hour.items():
-            most_common_severity = max(set(severities), key=severities.count)
-            most_common_description = max(
-                set(descriptions[most_common_severity]), key=descriptions[most_common_severity].count)
-            output.append({"hora": date,
-                           "severidad": most_common_severity,
-                           "descripcion": most_common_description})
+        for rollup in rollups:
+            output.append({"hora": (rollup.hour -
+                                    timedelta(hours=6)).replace(tzinfo=None).isoformat(timespec="hours", sep=' ') + "h",
+                           "severidad": rollup.severity,
+                           "descripcion": most_common(descriptions[str(rollup.severity)]) or None})
 
         data = self.OutputSerializer(output, many=True).data
 
@@ -2937,6 +2757,7 @@ class SmartRetailAreaPlotAPI(APIView):
         timestamp = serializers.DateTimeField()
         severity_counts = serializers.JSONField()
 
+    @run_cached()
     def get(self, request, *args, **kwargs):
         import datetime
         import pytz
@@ -2944,7 +2765,6 @@ class SmartRetailAreaPlotAPI(APIView):
         filters_serializer = self.FiltersSerializer(data=request.query_params)
         filters_serializer.is_valid(raise_exception=True)
 
-        severity_keys = list(range(6))
         timezone = pytz.timezone("America/Mexico_City")
 
         # Si no se especificó rango de fechas, regresar registros del último día
@@ -2959,39 +2779,16 @@ class SmartRetailAreaPlotAPI(APIView):
             filters_serializer.validated_data["timestamp_before"] = end_date
             filters_serializer.validated_data["timestamp_after"] = start_date
 
+        # Sin cliente, los registros de todo el despliegue
         client_name = request.query_params.get("client")
-        registers = get_area_plot_data(
+        snapshots = get_area_plot_data(
             "Smart Retail", client_name=client_name, filters=filters_serializer.validated_data)
 
-        hourly_counts = {}
-
-        if not client_name:
-
-            for register in registers:
-
-                # Agrupar registros de diferentes clientes, por hora
-                if register.timestamp in hourly_counts:
-                    for k, v in register.severity_counts.items():
-                        if k in hourly_counts[register.timestamp]:
-                            hourly_counts[register.timestamp][k] += v
-                        else:
-                            hourly_counts[register.timestamp][k] = v
-
-                else:
-                    hourly_counts[register.timestamp] = register.severity_counts
-
-            registers = []
-            for timestamp, counts in hourly_counts.items():
-                registers.append(
-                    {"timestamp": timestamp, "severity_counts": counts})
-
-            for register in registers:
-                register["timestamp"] = register["timestamp"].astimezone(pytz.timezone("America/Mexico_City")).replace(
-                    tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
-        else:
-            for register in registers:
-                register.timestamp = register.timestamp.astimezone(pytz.timezone("America/Mexico_City")).replace(
-                    tzinfo=None).isoformat(timespec="hours", sep=' ') + "h"
+        registers = [{
+            "timestamp": snapshot.timestamp.astimezone(timezone).replace(
+                tzinfo=None).isoformat(timespec="minutes", sep=' ') + "h",
+            "severity_counts": snapshot.severity_counts,
+        } for snapshot in snapshots]
 
         data = self.OutputSerializer(registers, many=True).data
 
@@ -3016,6 +2813,8 @@ class SetRetailDeviceAsInactiveAPI(APIView):
             device_status = get_retail_device_status(device_id)
             device_status.active = False
             device_status.save()
+            bump_generation(device_status.device.client.deployment_id)
+            fleet_status.refresh(FleetStatus.RETAIL_DEVICE, device_status.device.client.deployment.name)
         except:
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -0,0 +1,101 @@
+import hashlib
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+
+
+# Client (tenant) API gateway: one keep-alive session per host and a login
+# token cache keyed by login url + credentials, shared by the cron workers.
+
+_lock = threading.Lock()
+_sessions = {}
+_tokens = {}
+
+
+def get_session(url: str) -> requests.Session:
+    host = urlsplit(url).netloc
+
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({"Accept-Encoding": "gzip, deflate"})
+            adapter = requests.adapters.HTTPAdapter(
+                pool_maxsize=max(1, settings.MONITOR_FETCH_MAX_WORKERS))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+
+    return session
+
+
+def _token_key(login_url: str, credentials: dict):
+    digest = hashlib.sha256(
+        f'{credentials["username"]}:{credentials["password"]}'.encode()).hexdigest()
+    return login_url, digest
+
+
+def login(login_url: str, credentials: dict):
+    r = get_session(login_url).post(login_url, data=credentials,
+                                    timeout=settings.MONITOR_REQUEST_TIMEOUT)
+
+    if r.status_code == 200 or r.status_code == 201:
+        token = r.json()["token"]
+    else:
+        token = None
+        print(f"Login error: {r.status_code}")
+
+    return token
+
+
+def get_token(login_url: str, credentials: dict, refresh=False):
+    key = _token_key(login_url, credentials)
+
+    if not refresh:
+        with _lock:
+            token = _tokens.get(key)
+        if token is not None:
+            return token
+
+    token = login(login_url, credentials)
+
+    with _lock:
+        if token is not None:
+            _tokens[key] = token
+        else:
+            _tokens.pop(key, None)
+
+    return token
+
+
+def get(request_url: str, data, token):
+    headers = {"Authorization": f"Token {token}"}
+    r = get_session(request_url).get(request_url, data=data, headers=headers,
+                                     timeout=settings.MONITOR_REQUEST_TIMEOUT)
+
+    return r, r.status_code
+
+
+def authenticated_get(login_url: str, request_url: str, data, credentials: dict):
+    """
+    GET with a cached token, logging in again only if the API answers 401.
+    Returns (response, status_code).
+    """
+    token = get_token(login_url, credentials)
+    response, status = get(request_url, data, token)
+
+    if status == 401:
+        token = get_token(login_url, credentials, refresh=True)
+        response, status = get(request_url, data, token)
+
+    return response, status
+
+
+def clear():
+    with _lock:
+        _tokens.clear()
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
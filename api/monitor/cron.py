@@ -1,10 +1,17 @@
 from collections import defaultdict
 from .aws_metrics import AWSUtils
+from . import alerts as outbox
+from . import (client_api, fleet_status, identity_map, log_classifier, log_engine,
+               response_cache, severity_snapshots, work_queue)
+from .log_spool import LogSpool
+from .trips import TripBatch, TripIndex
+from .unit_of_work import StatusUnitOfWork
 from .models import *
 from .selectors import *
 from .services import *
 
-from dotenv import load_dotenv
+from django.conf import settings
+from django.db import connection
 import requests
 import pandas as pd
 import json
@@ -12,9 +19,9 @@ import json
 from datetime import datetime, timedelta
 
 import pytz
-import os
-import subprocess
+import time
 
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import Optional
 
 
@@ -37,16 +44,8 @@ def generate_testing_data(client_alias, response, processed_data):
 
 
 def send_telegram(chat: str, message: str):
-    load_dotenv()
-    if os.environ.get("ALERTS") != "true":
-        print("Alerts are disabled")
-        return
-    TELEGRAM_CHAT = os.environ.get(chat)
-    TELEGRAM_BOT = os.environ.get("TELEGRAM_BOT")
-
-    subprocess.run(
-        f"curl -X POST -H 'Content-Type: application/json' -d '{{\"chat_id\": \"{TELEGRAM_CHAT}\", \"text\": \"{message}\"}}\' https://api.telegram.org/bot{TELEGRAM_BOT}/sendMessage",
-        shell=True)
+    # Queued in the alert outbox, alerts.dispatch sends it
+    outbox.queue(chat, message)
 
 
 def send_sd_alerts(chat, alerts):
@@ -58,23 +57,67 @@ def send_sd_alerts(chat, alerts):
 
 
 def api_login(login_url, credentials):
+    # Always logs in; the cron fetchers use client_api.authenticated_get instead
+    return client_api.get_token(login_url, credentials, refresh=True)
 
-    r = requests.post(login_url, data=credentials)
 
-    if r.status_code == 200 or r.status_code == 201:
-        token = r.json()["token"]
-    else:
-        token = None
-        print(f"Login error: {r.status_code}")
+def make_request(request_url, data, token):
+    return client_api.get(request_url, data, token)
 
-    return token
 
+def fetch_clients_data(clients, fetch_data, max_workers=None, timeout=None):
+    """
+    Runs fetch_data(client) for every client on a bounded thread pool.
+    Returns a dict {client.id: response}; clients whose fetch raised or ran
+    longer than `timeout` seconds get None, so the caller skips them.
+    """
+    if max_workers is None:
+        max_workers = settings.MONITOR_FETCH_MAX_WORKERS
+    if timeout is None:
+        timeout = settings.MONITOR_FETCH_CLIENT_TIMEOUT
 
-def make_request(request_url, data, token):
-    headers = {"Authorization": f"Token {token}"}
-    r = requests.get(request_url, data=data, headers=headers)
+    clients = list(clients)
+    responses = {client.id: None for client in clients}
+    if not clients:
+        return responses
 
-    return r, r.status_code
+    start_times = {}
+
+    def run(client):
+        start_times[client.id] = time.monotonic()
+        try:
+            return fetch_data(client)
+        finally:
+            # Worker threads open their own DB connection (credentials lookup)
+            connection.close()
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    futures = {executor.submit(run, client): client for client in clients}
+    pending = set(futures)
+
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=1,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                client = futures[future]
+                try:
+                    responses[client.id] = future.result()
+                except Exception as e:
+                    print(f"Fetch error for {client.name}: {e!r}")
+
+            now = time.monotonic()
+            for future in list(pending):
+                client = futures[future]
+                started = start_times.get(client.id)
+                if started is not None and now - started > timeout:
+                    print(f"Fetch deadline exceeded for {client.name}")
+                    pending.discard(future)
+    finally:
+        # Don't block the run on fetches that went past their deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return responses
 
 
 # Safe Driving
@@ -109,17 +152,12 @@ def get_driving_data(client_keyname, client_id):
         request_url = f'https://{client_keyname}.safe-d.aivat.io/logs/'
 
     try:
-        token = api_login(login_url, credentials)
+        response, status = client_api.authenticated_get(
+            login_url, request_url, {"minutes": 60}, credentials)
     except requests.exceptions.ConnectionError:
         print("Connection error")
         return
 
-    response, status = make_request(request_url, {"minutes": 60}, token=token)
-    if status == 401:
-        token = api_login(login_url, credentials)
-        response, status = make_request(
-            request_url, {"minutes": 60}, token=token)
-
     if status == 200 or status == 201:
         response = response.json()
     else:
@@ -143,13 +181,10 @@ def process_driving_data(response, now=None):
 
     past_logs = pd.DataFrame([])
     if not df_logs.empty:
-        df_logs["Timestamp"] = df_logs["Timestamp"].apply(
-            lambda x: datetime.fromisoformat(x))
-        df_logs["Fecha_subida"] = df_logs["Fecha_subida"].apply(
-            lambda x: datetime.fromisoformat(x))
-
-        df_logs["Timestamp"] = df_logs["Timestamp"].dt.tz_localize('UTC')
-        df_logs["Fecha_subida"] = df_logs["Fecha_subida"].dt.tz_localize('UTC')
+        df_logs["Timestamp"] = pd.to_datetime(
+            df_logs["Timestamp"], format="ISO8601").dt.tz_localize('UTC')
+        df_logs["Fecha_subida"] = pd.to_datetime(
+            df_logs["Fecha_subida"], format="ISO8601").dt.tz_localize('UTC')
         # Arreglar timezone
 
         # Consider a log as delayed, if it was uploaded within the last 10 minutes,
@@ -171,19 +206,8 @@ def process_driving_data(response, now=None):
     else:
         logs_last_hour = pd.DataFrame([])
 
-    past_logs_file_path = "./past_logs.json"
-
-    try:
-        with open(past_logs_file_path, "r") as f:
-            previous_past_logs = json.load(f)
-
-        df_past_logs = pd.DataFrame(previous_past_logs)
-        df_past_logs = pd.concat([df_past_logs, past_logs], ignore_index=True)
-        df_past_logs.to_json(past_logs_file_path,
-                             orient='records', date_format='iso')
-    except FileNotFoundError:
-        past_logs.to_json(past_logs_file_path,
-                          orient='records', date_format='iso')
+    # Registered by the nightly late log job
+    LogSpool().append(past_logs)
 
     log_types = ["total", "restart", "reboot", "start",
                  "data_validation", "source_missing",
@@ -204,62 +228,75 @@ def process_driving_data(response, now=None):
                                  for device, datos in device_dict.items()}
                       for interval in ["hour", "ten_minutes"]}
 
-    for i in range(len(logs_last_hour)):
-        log = logs_last_hour.iloc[i]
-        unit = log["Unidad"]
-        log_type = log["Tipo"]
-
-        recent = log["Timestamp"] > now - timedelta(minutes=10)
-        if recent:
-            intervals = ["hour", "ten_minutes"]
-
-        else:
-            intervals = ["hour"]
-
-        if unit not in output_gx["hour"]:
-            continue
+    if not logs_last_hour.empty:
+        unit_logs = logs_last_hour[logs_last_hour["Unidad"].isin(
+            device_dict.keys())]
+        recent = unit_logs["Timestamp"] > now - timedelta(minutes=10)
+
+        # Log types without their own counter go to "others"
+        categories = unit_logs["Tipo"].where(
+            unit_logs["Tipo"].isin(log_types), "others")
+
+        # Discard restarts that happened right after ignition: match every
+        # restart with the unit's latest previous ignition
+        restarts = unit_logs[unit_logs["Tipo"] == "restart"]
+        ignitions = all_ignitions[["Unidad", "Timestamp"]].rename(
+            columns={"Timestamp": "ignition_time"}).sort_values("ignition_time")
+        matched = pd.merge_asof(restarts[["Unidad", "Timestamp"]].reset_index().sort_values("Timestamp"),
+                                ignitions, left_on="Timestamp", right_on="ignition_time",
+                                by="Unidad", allow_exact_matches=False).set_index("index")
+        after_ignition = pd.Series(False, index=unit_logs.index)
+        after_ignition[matched.index[
+            matched["Timestamp"] < matched["ignition_time"] + timedelta(minutes=5)]] = True
+
+        cameras = log_engine.disconnected_cameras(unit_logs)
+        disconnected_cameras = pd.DataFrame({
+            "Unidad": unit_logs.loc[cameras.index, "Unidad"],
+            "camera": cameras,
+            "recent": recent[cameras.index]
+        })
+
+        for interval in ["hour", "ten_minutes"]:
+            if interval == "hour":
+                interval_mask = pd.Series(True, index=unit_logs.index)
+                interval_cameras = disconnected_cameras
+            else:
+                interval_mask = recent
+                interval_cameras = disconnected_cameras[disconnected_cameras["recent"]]
 
-        for interval in intervals:
+            interval_gx = output_gx[interval]
 
-            if log_type in output_gx[interval][unit]:
-                output_gx[interval][unit][log_type] += 1
-            else:
-                output_gx[interval][unit]["others"] += 1
-
-            if log_type == "camera_missing":
-                cameras_num = log["Log"][:-2].split(":")[2].split()
-                if log["Log"].split()[1] == "'DISCONNECTED":
-                    for camera in cameras_num:
-                        if int(camera) in output_cameras[interval][unit]:
-                            output_cameras[interval][unit][int(camera)] += 5
-                        else:
-                            output_cameras[interval][unit][int(camera)] = 5
+            type_counts = categories[interval_mask].groupby(
+                [unit_logs["Unidad"][interval_mask], categories[interval_mask]]).size()
+            for (unit, log_type), count in type_counts.items():
+                interval_gx[unit][log_type] += int(count)
 
             # Ignore Ignition or Aux in total log count
-            if log_type not in {"Ignición", "Aux"}:
-                output_gx[interval][unit]["total"] += 1
-
-            # Discard restarts that happened right after ignition
-            if log_type == "restart":
-                unit_ignitions = all_ignitions[all_ignitions["Unidad"] == unit]
-
-                restart_time = log["Timestamp"]
-                for n in range(len(unit_ignitions)):
-                    ignition = unit_ignitions.iloc[n]
-
-                    ignition_time = ignition["Timestamp"]
-                    if ignition_time + timedelta(minutes=5) > restart_time > ignition_time:
-                        output_gx[interval][unit][log_type] -= 1
-                        output_gx[interval][unit]["total"] -= 1
-                        # Break out of the loop, to prevent repeating this logic
-                        # in case there was more than one ignition before the restart
-                        break
-
-                if recent and "Restarting" in log["Log"]:
-                    execution_number = int(log["Log"].split()[4])
-                    if execution_number > 1:
-                        output_gx["hour"][unit]["restarting_loop"] = True
-                        output_gx["ten_minutes"][unit]["restarting_loop"] = True
+            total_counts = unit_logs.loc[interval_mask & ~unit_logs["Tipo"].isin(
+                {"Ignición", "Aux"}), "Unidad"].value_counts()
+            for unit, count in total_counts.items():
+                interval_gx[unit]["total"] += int(count)
+
+            discarded_counts = unit_logs.loc[interval_mask &
+                                             after_ignition, "Unidad"].value_counts()
+            for unit, count in discarded_counts.items():
+                interval_gx[unit]["restart"] -= int(count)
+                interval_gx[unit]["total"] -= int(count)
+
+            camera_counts = interval_cameras.groupby(
+                ["Unidad", "camera"], sort=False).size()
+            for (unit, camera), count in camera_counts.items():
+                unit_cameras = output_cameras[interval][unit]
+                unit_cameras[int(camera)] = unit_cameras.get(
+                    int(camera), 0) + 5 * int(count)
+
+        # Restarts with an execution number above 1 mean the program is looping
+        recent_restarts = restarts[recent[restarts.index] &
+                                   restarts["Log"].str.contains("Restarting", regex=False)]
+        execution_numbers = recent_restarts["Log"].str.split().str[4].astype(int)
+        for unit in recent_restarts.loc[execution_numbers > 1, "Unidad"].unique():
+            output_gx["hour"][unit]["restarting_loop"] = True
+            output_gx["ten_minutes"][unit]["restarting_loop"] = True
 
     severities = {}
     alerts = {}
@@ -347,17 +384,38 @@ def process_driving_data(response, now=None):
             "past_log_times": past_log_times}
 
 
-def update_driving_status():
+def enqueue_client_runs(job: str, clients, **kwargs) -> bool:
+    """
+    With MONITOR_WORK_QUEUE, queues one item per client for the workers
+    (run_monitor_worker) instead of running the job here. Returns whether
+    the run was queued.
+    """
+    if not settings.MONITOR_WORK_QUEUE:
+        return False
+
+    items = work_queue.enqueue_clients(job, clients, **kwargs)
+    print(f"{job}: {len(items)} clients queued")
+    return True
+
+
+def update_driving_status(clients=None):
 
     deployment = get_or_create_deployment('Safe Driving')
-    clients = get_deployment_clients('Safe Driving')
+    identity_map.preload_deployment(deployment)
+    if clients is None:
+        clients = get_deployment_clients('Safe Driving')
+        if enqueue_client_runs("monitor.cron.update_driving_status", clients):
+            return
+
+    responses = fetch_clients_data(
+        clients, lambda client: get_driving_data(client.keyname, client.id))
 
     for client in clients:
         client_name = client.name
         client_keyname = client.keyname
         client_id = client.id
 
-        response = get_driving_data(client_keyname, client_id)
+        response = responses[client_id]
         if response is not None:
             processed_data = process_driving_data(response)
 
@@ -379,8 +437,23 @@ def update_driving_status():
         date_now = datetime.now(tz=pytz.timezone('UTC'))
 
         client = get_client(client_name, deployment)
+        uow = StatusUnitOfWork(f"Safe Driving - {client_name}")
+
+        # Load the client's units and cameras and create the new ones up front
+        identity_map.preload_client(client)
+        units = {unit_name: get_or_create_unit({'name': unit_name, 'client': client})
+                 for unit_name in hour_data}
+        get_or_create_cameras([{'name': f"cam_{unit_name}_{cam_num}", 'gx': units[unit_name]}
+                               for unit_name in hour_data
+                               for cam_num in camera_data["hour"][unit_name]])
+
+        # Failed and open trips of all the client's units
+        trip_index = TripIndex(get_client_failed_trips(client))
+        trips = TripBatch(get_client_open_trips(client), trip_index.by_pk)
 
         history_logs = []
+        camerastatus_list = []
+        camerahistory_list = []
         alerts_to_send = {}
         for unit_name, unit_logs in hour_data.items():
             if client_keyname != "tp":  # Hardcoded
@@ -394,18 +467,16 @@ def update_driving_status():
             }
             unit_obj = get_or_create_unit(unit_args)
 
-            failed_trips = get_unit_failed_trips(unit_obj)
-            num_failed_trips = len(failed_trips)
+            num_failed_trips = len(trip_index.unit_trips(unit_obj.id))
 
-            if unit_name in past_log_times:
-                for log_time in past_log_times[unit_name]:
-                    for trip in failed_trips:
-                        if (not trip.active and trip.end_datetime and trip.end_datetime > log_time > trip.start_datetime) \
-                                or (trip.end_datetime is None and log_time > trip.start_datetime):
-                            print(f"Setting {trip} to successful")
-                            trip.active = True
-                            trip.save()
-                            num_failed_trips -= 1
+            # Late logs sent during a failed trip make it successful
+            for log_time in past_log_times.get(unit_name, []):
+                trip = trip_index.find(unit_obj.id, log_time)
+                if trip is not None and not trip.active:
+                    print(f"Setting {trip} to successful")
+                    trip.active = True
+                    trips.save(trip)
+                    num_failed_trips -= 1
 
             # Returns None if the unit is new
             current_unit_status = get_unitstatus(unit_id=unit_obj.id)
@@ -423,16 +494,16 @@ def update_driving_status():
             trip = None
 
             if was_unit_on_trip == False and unit_logs.get("En_viaje", False):
-                trip = create_unit_trip(unit=unit_obj, start_datetime=date_now)
+                trip = trips.create(unit=unit_obj, start_datetime=date_now)
                 print(f"Trip created {unit_obj.name}")
             elif was_unit_on_trip:
-                trip, created = get_or_create_open_trip(
+                trip, created = trips.get_or_create_open(
                     unit_obj, start_datetime=date_now)
 
                 if not unit_logs.get("En_viaje", True):
                     trip.end_datetime = date_now
                     trip.end_date = date_now.date()
-                    trip.save()
+                    trips.save(trip)
 
             unit_status = all_units_status[unit_name]
 
@@ -443,7 +514,7 @@ def update_driving_status():
 
             if unit_logs.get("En_viaje", True) and not description.startswith("Sin comunicación") and trip is not None:
                 trip.active = True
-                trip.save()
+                trips.save(trip)
 
             priority = False
             if num_failed_trips >= 3:
@@ -502,8 +573,6 @@ def update_driving_status():
 
             status_obj = get_or_create_gxstatus(status_args)
 
-            camerastatus_list = []
-            camerahistory_list = []
             for cam_num, count in camera_data["hour"][unit_name].items():
                 camera_args = {
                     'name': f"cam_{unit_name}_{cam_num}",
@@ -533,9 +602,6 @@ def update_driving_status():
                 }
                 camerahistory_list.append(camera_history_args)
 
-            bulk_update_camerastatus(camerastatus_list)
-            bulk_create_camerahistory(camerahistory_list)
-
             last_connection = (datetime.fromisoformat(unit_logs['Ultima_actualizacion']) + timedelta(hours=6)).replace(tzinfo=pytz.UTC) \
                 if unit_logs['Ultima_actualizacion'] != 'null' else None
 
@@ -550,7 +616,7 @@ def update_driving_status():
                     alert_type = get_or_create_alerttype(description)
                     alert_args = {"alert_type": alert_type, "gx": unit_obj,
                                   "register_datetime": date_now, "register_date": date_now.date()}
-                    alert = create_alert(alert_args)
+                    uow.create_alert(alert_args)
 
                 alerts_to_send[unit_name] = alerts[unit_name]
                 last_alert = date_now
@@ -584,7 +650,8 @@ def update_driving_status():
             if "En_viaje" in unit_logs:
                 unit_status_args["defaults"]["on_trip"] = unit_logs["En_viaje"]
 
-            unitstatus = update_or_create_unitstatus(unit_status_args)
+            uow.update_or_create_status(
+                UnitStatus, "unit", unit_obj, unit_status_args["defaults"])
 
             # Last 10 minutes
 
@@ -627,11 +694,20 @@ def update_driving_status():
 
             history_logs.append(unit_history)
 
-        bulk_create_unithistory(history_logs)
+        bulk_update_camerastatus_and_history(
+            camerastatus_list, camerahistory_list)
+        trips.flush()
 
-        if alerts_to_send and os.environ.get("ALERTS") == "true":
+        uow.create_histories(UnitHistory, history_logs)
+        uow.flush()
+
+        if alerts_to_send and settings.MONITOR_ALERTS:
             send_sd_alerts(chat="SAFEDRIVING_CHAT", alerts=alerts_to_send)
 
+    severity_snapshots.register_snapshot(deployment)
+    response_cache.bump_generation(deployment.id)
+    fleet_status.refresh(FleetStatus.UNIT, deployment.name)
+
 
 def check_inactive_units():
     inactive_units = get_inactive_units()
@@ -756,22 +832,18 @@ def get_industry_data(client_keyname: str, client_id: int, deployment="Industry"
 
     credentials = get_api_credentials(deployment, client_id)
 
-    try:
-        token = api_login(login_url, credentials)
-    except requests.exceptions.ConnectionError:
-        print("Connection error")
-        return
-
     now = datetime.now(tz=pytz.timezone('UTC')).replace(tzinfo=None)
     time_interval = {
         "initial_datetime": (now - timedelta(hours=1)).isoformat(timespec="seconds"),
         "final_datetime": now.isoformat(timespec='seconds')
     }
 
-    response, status = make_request(request_url, time_interval, token)
-    if not (status == 200 or status == 201):
-        token = api_login(login_url, credentials)
-        response, status = make_request(request_url, time_interval, token)
+    try:
+        response, status = client_api.authenticated_get(
+            login_url, request_url, time_interval, credentials)
+    except requests.exceptions.ConnectionError:
+        print("Connection error")
+        return
 
     if status == 200 or status == 201:
         response = response.json()
@@ -784,165 +856,62 @@ def get_industry_data(client_keyname: str, client_id: int, deployment="Industry"
     return response
 
 
-def process_industry_data(response):
-    now = datetime.now(tz=pytz.timezone('UTC'))
-    fields = {"batch_dropping": 0,
-              "camera_connection": timedelta(0),
-              "restart": 0,
-              "license": 0,
-              "shift_change": 0,
-              "others": 0,
-              "delayed": False,
-              "delay_time": timedelta(0)}
-
-    output_cameras = {}
-
-    # TO DO: Add warn msg category instead of counting it as batch dropping by default
-    log_types = {"batch_dropping": ["Batch dropping", "[WARN MSG]"],
-                 "restart": ["Restarting", "[PIPELINE RESTART]"],
-                 "license": ["[LICENSE]"],
-                 "shift_change": ["SRC"]}
-
-    license_ends = {}
-
-    recent_threshold = 10  # Minutes
+def process_industry_data(response, now=None, deployment_name="Industry", device_models=None):
+    if not now:
+        now = datetime.now(tz=pytz.timezone('UTC'))
+
+    logs = log_engine.flatten_device_logs(response)
+    recent = log_engine.recent_logs_mask(logs, now)
+    device_logs = logs["camera"].isna()
+
+    # Only device logs are categorized; empty logs are not counted
+    device_msgs = device_logs & (logs["log"] != "")
+    categories = pd.Series(None, index=logs.index, dtype=object)
+    categories[device_msgs] = log_classifier.classify_device_logs(
+        deployment_name, logs.loc[device_msgs, "log"], logs.loc[device_msgs, "device"],
+        device_models, default="others")
+
+    hour_counts = log_engine.count_log_types(logs["device"], categories)
+    recent_counts = log_engine.count_log_types(
+        logs["device"], categories, recent)
+
+    # License end date of the last license log of each device, e.g.
+    # "[LICENSE] ... until 2024-08-01 12:00:00. ..."
+    license_ends = {device_name: None for device_name in response}
+    license_logs = logs[categories == "license"].groupby(
+        "device", sort=False)["log"].last()
+    for device_name, log_msg in license_logs.items():
+        date, time = log_msg.split("until")[1].split()[:2]
+        license_ends[device_name] = datetime.fromisoformat(
+            f'{date}T{time[:-1]}')
+
+    disconnected = logs["log"].str.startswith(("Desconectada", "[DISC CAM]"))
+    camera_disc_times = log_engine.camera_disconnection_times(
+        logs, disconnected, recent, response)
+
+    last_connections = log_engine.last_connections(logs, response)
+    first_log_times = log_engine.first_log_times(logs, recent, response)
 
     hourly_log_counts = {}
     recent_log_counts = {}
-    last_connections = {}
-
-    # First log received within the threshold time window, for each device
-    first_log_times = {}
-    camera_disc_times = {}
-
     alerts = {}
-
     for device_name, data in response.items():
-        camera_disc_times[device_name] = {}
-
-        last_connections[device_name] = None
-        first_log_times[device_name] = None
-        license_ends[device_name] = None
-
-        device_logs = data["logs"]
-        cameras_data = data["cameras"]
-
-        hourly_log_counts[device_name] = {"counts": {}, "cameras": {}}
-        recent_log_counts[device_name] = {"counts": {}, "cameras": {}}
-
-        if device_logs:
-            last_log = device_logs[0]
-            last_log_date = datetime.fromisoformat(
-                last_log["register_time"][:-1]).replace(tzinfo=pytz.utc)
-
-            last_connections[device_name] = last_log_date
-
-        device_hour_counts = {"batch_dropping": 0,
-                              "restart": 0,
-                              "license": 0,
-                              "shift_change": 0,
-                              "others": 0, }
-        device_recent_counts = {"batch_dropping": 0,
-                                "restart": 0,
-                                "license": 0,
-                                "shift_change": 0,
-                                "others": 0, }
-        for log in device_logs:
-            register_time = datetime.fromisoformat(
-                log["register_time"][:-1]).replace(tzinfo=pytz.utc)
-            log_time = datetime.fromisoformat(f'{log["log_date"]}T{log["log_time"]}').replace(
-                tzinfo=pytz.utc)
-
-            # Check if the log arrived at the server within the last 10 minutes
-
-            if register_time > now - timedelta(minutes=recent_threshold):
-                intervals = [device_hour_counts, device_recent_counts]
-
-                first_log_times[device_name] = register_time
-            else:
-                intervals = [device_hour_counts]
-
-            log_msg = log["log"]
-
-            if log_msg != "":
-                found_category = False
-                for log_type, starts in log_types.items():
-                    if any([log_msg.startswith(start) for start in starts]):
-                        for interval_count in intervals:
-                            if log_type not in interval_count:
-                                interval_count[log_type] = 1
-                            else:
-                                interval_count[log_type] += 1
-                        found_category = True
-
-                        if "[LICENSE]" in starts:
-                            days_remaining = int(log_msg.split()[-2])
-                            date, time = log_msg.split("until")[
-                                1].split()[:2]
-                            license_end = datetime.fromisoformat(
-                                f'{date}T{time[:-1]}')
-                            license_ends[device_name] = license_end
-
-                if not found_category:
-                    for interval_count in intervals:
-                        if "others" in interval_count:
-                            interval_count["others"] += 1
-                        else:
-                            interval_count["others"] = 1
-
-        hourly_log_counts[device_name]["counts"] = device_hour_counts
-        recent_log_counts[device_name]["counts"] = device_recent_counts
-
-        cam_hour_counts = {}
-        cam_recent_counts = {}
-        for camera_name, camera_logs in cameras_data.items():
-            camera_disc_times[device_name][camera_name] = {}
-            for interval in ["hour", "recent"]:
-                camera_disc_times[device_name][camera_name][interval] = timedelta(
-                    0)
-
-            for log in camera_logs:
-                register_time = datetime.fromisoformat(
-                    log["register_time"][:-1]).replace(tzinfo=pytz.utc)
-                log_time = datetime.fromisoformat(f'{log["log_date"]}T{log["log_time"]}').replace(
-                    tzinfo=pytz.utc)
-
-                log_msg = log["log"]
-
-                if log["log"].startswith("Desconectada") or log["log"].startswith("[DISC CAM]"):
-                    camera_disc_times[device_name][camera_name]["hour"] += timedelta(
-                        minutes=2)
-
-                # Check if the log arrived at the server within the last 10 minutes
-
-                if register_time > now - timedelta(minutes=recent_threshold):
-                    intervals = [cam_hour_counts, cam_recent_counts]
-
-                    first_log_time = register_time
-                    first_log_times[device_name] = first_log_time
-
-                    if log["log"].startswith("Desconectada") or log["log"].startswith("[DISC CAM]"):
-                        camera_disc_times[device_name][camera_name]["recent"] += timedelta(
-                            minutes=2)
-                else:
-                    intervals = [cam_hour_counts]
-
-                """ if log_type:  # If log isn't empty
-                    for interval_count in intervals:
-                        if log_type not in interval_count:
-                            interval_count[log_type] = 1
-                        else:
-                            interval_count[log_type] += 1 """
-
-        # Prevent an error in case there were no logs and the list is empty
-        try:
-            max_cam_disc_time = max([camera_data["recent"]
-                                    for name, camera_data in camera_disc_times[device_name].items()])
-        except ValueError:
-            max_cam_disc_time = timedelta(0)
-
-        hourly_log_counts[device_name]["cameras"][camera_name] = cam_hour_counts
-        recent_log_counts[device_name]["cameras"][camera_name] = cam_recent_counts
+        zero_counts = {"batch_dropping": 0,
+                       "restart": 0,
+                       "license": 0,
+                       "shift_change": 0,
+                       "others": 0, }
+
+        hourly_log_counts[device_name] = {
+            "counts": {**zero_counts, **hour_counts.get(device_name, {})},
+            "cameras": {camera_name: {} for camera_name in data["cameras"]}}
+        recent_log_counts[device_name] = {
+            "counts": {**zero_counts, **recent_counts.get(device_name, {})},
+            "cameras": {camera_name: {} for camera_name in data["cameras"]}}
+
+        max_cam_disc_time = max([camera_data["recent"]
+                                 for camera_data in camera_disc_times[device_name].values()],
+                                default=timedelta(0))
 
         alert_conditions = {
             "Reinicios de pipeline": (hourly_log_counts[device_name]["counts"]["restart"] > 0),
@@ -959,7 +928,7 @@ def process_industry_data(response):
     return log_counts, camera_disc_times, last_connections, first_log_times, alerts, license_ends
 
 
-def update_industry_status(deployment_name="Industry"):
+def update_industry_status(deployment_name="Industry", clients=None):
     now = datetime.now(tz=pytz.timezone("UTC"))
 
     if deployment_name == "Industry":
@@ -968,15 +937,22 @@ def update_industry_status(deployment_name="Industry"):
         chat_name = "SMART_BUILDINGS"
 
     deployment = get_or_create_deployment(deployment_name)
-    clients = get_deployment_clients(deployment_name)
+    identity_map.preload_deployment(deployment)
+    if clients is None:
+        clients = get_deployment_clients(deployment_name)
+        if enqueue_client_runs("monitor.cron.update_industry_status", clients,
+                               deployment_name=deployment_name):
+            return
+
+    responses = fetch_clients_data(
+        clients, lambda client: get_industry_data(client.keyname, client.id, deployment_name))
 
     for client in clients:
         client_keyname = client.keyname
         client_name = client.name
         client_id = client.id
 
-        response = get_industry_data(
-            client_keyname, client_id, deployment_name)
+        response = responses[client_id]
 
         """ if client_alias != "cmxws":
             continue """
@@ -984,12 +960,18 @@ def update_industry_status(deployment_name="Industry"):
             response = json.load(f) """
 
         if response is not None:
-            processed_data = process_industry_data(response)
+            processed_data = process_industry_data(
+                response, deployment_name=deployment_name,
+                device_models=get_client_device_models(client_id))
         else:
             print(f"No data for {client_name}")
             continue
 
         log_counts, disconnection_times, last_connections, first_log_times, alerts, license_ends = processed_data
+        uow = StatusUnitOfWork(f"{deployment_name} - {client_name}")
+
+        identity_map.preload_client(client)
+        get_or_create_device_cameras(client, disconnection_times)
 
         camerastatus_data = []
         camerahistory_data = []
@@ -1029,8 +1011,8 @@ def update_industry_status(deployment_name="Industry"):
                     'connected': recent_disc_time == timedelta(0),
                     'disconnection_time': recent_disc_time
                 })
-        bulk_update_camerastatus(camerastatus_data)
-        bulk_create_camerahistory(camerahistory_data)
+        bulk_update_camerastatus_and_history(
+            camerastatus_data, camerahistory_data)
 
         device_names = last_connections.keys()
 
@@ -1098,9 +1080,9 @@ def update_industry_status(deployment_name="Industry"):
                     alert_args = {"alert_type": alert_type, "gx": device,
                                   "register_datetime": now, "register_date": now.date(),
                                   "description": alert_info}
-                    alert = create_alert(alert_args)
+                    uow.create_alert(alert_args)
 
-                if alerts[device_name] and os.environ.get("ALERTS") == "true":
+                if alerts[device_name] and settings.MONITOR_ALERTS:
                     send_telegram(chat=f'{chat_name}_CHAT',
                                   message=message)
 
@@ -1157,8 +1139,7 @@ def update_industry_status(deployment_name="Industry"):
                 'delay_time': delay_time,
                 'status': status,
             }
-            device_status = update_or_create_device_status(
-                {"device": device, "defaults": defaults})
+            uow.update_or_create_status(DeviceStatus, "device", device, defaults)
 
             """ devicehistory_args = {
                 "device": device,
@@ -1189,9 +1170,12 @@ def update_industry_status(deployment_name="Industry"):
                 'others': log_counts["recent"][device_name]["counts"].get("others"),
                 'status': status
             }
-            create_device_history(devicehistory_args)
+            uow.create_history(DeviceHistory, devicehistory_args)
+
+        uow.flush()
 
-    disconnected_devices = get_devices_without_updates(deployment_name)
+    uow = StatusUnitOfWork(f"{deployment_name} - Disconnected devices")
+    disconnected_devices = get_devices_without_updates(deployment_name, clients)
     for device in disconnected_devices:
         client_name = device.client.name
 
@@ -1229,9 +1213,9 @@ def update_industry_status(deployment_name="Industry"):
                 alert_args = {"alert_type": alert_type, "gx": device,
                               "register_datetime": now, "register_date": now.date(),
                               "description": alert_info}
-                create_alert(alert_args)
+                uow.create_alert(alert_args)
 
-            if alerts and os.environ.get("ALERTS") == "true":
+            if alerts and settings.MONITOR_ALERTS:
                 send_telegram(chat=f'{chat_name}_CHAT',
                               message=message)
 
@@ -1260,8 +1244,8 @@ def update_industry_status(deployment_name="Industry"):
                 'delay_time': delay_time,
                 'status': status,
             }
-            update_or_create_device_status(
-                {"device": device, "defaults": defaults})
+            uow.update_or_create_status(
+                DeviceStatus, "device", device, defaults)
 
             devicehistory_args = {
                 'device': device,
@@ -1278,7 +1262,13 @@ def update_industry_status(deployment_name="Industry"):
                 'others': 0,
                 'status': status
             }
-            create_device_history(devicehistory_args)
+            uow.create_history(DeviceHistory, devicehistory_args)
+
+    uow.flush()
+
+    severity_snapshots.register_snapshot(deployment)
+    response_cache.bump_generation(deployment.id)
+    fleet_status.refresh(FleetStatus.DEVICE, deployment.name)
 
 
 # Smart Retail
@@ -1297,23 +1287,18 @@ def get_retail_data(client_keyname, client_id):
     if not credentials:
         return None
 
-    try:
-        token = api_login(login_url, credentials)
-    except requests.exceptions.ConnectionError:
-        print("Connection error")
-        return
-
     now = datetime.now(tz=pytz.timezone('UTC')).replace(tzinfo=None)
     time_interval = {
         "initial_datetime": (now - timedelta(hours=1)).isoformat(timespec="seconds"),
         "final_datetime": now.isoformat(timespec='seconds')
     }
 
-    response, status = make_request(request_url, time_interval, token)
-
-    if not (status == 200 or status == 201):
-        token = api_login(login_url, credentials)
-        response, status = make_request(request_url, time_interval, token)
+    try:
+        response, status = client_api.authenticated_get(
+            login_url, request_url, time_interval, credentials)
+    except requests.exceptions.ConnectionError:
+        print("Connection error")
+        return
 
     if status == 200 or status == 201:
         response = response.json()
@@ -1326,118 +1311,50 @@ def get_retail_data(client_keyname, client_id):
     return response
 
 
-def process_retail_data(response):
-    now = datetime.now(tz=pytz.timezone('UTC'))
-
-    recent_threshold = 10  # Minutes
-
-    hourly_log_counts = {}
-    recent_log_counts = {}
-    last_connections = {}
-    # First log received within the threshold time window, for each device
-    first_log_times = {}
-    disconnection_times = {}
-
-    alerts = defaultdict(set)
-
-    for device_name, data in response.items():
-        disconnection_times[device_name] = {}
-
-        last_connections[device_name] = None
-        first_log_times[device_name] = None
-
-        device_logs = data["logs"]
-        cameras_data = data["cameras"]
-
-        hourly_log_counts[device_name] = {"counts": {}, "cameras": {}}
-        recent_log_counts[device_name] = {"counts": {}, "cameras": {}}
-
-        if device_logs:
-            last_log = device_logs[0]
-            last_log_date = datetime.fromisoformat(
-                last_log["register_time"][:-1]).replace(tzinfo=pytz.utc)
-
-            last_connections[device_name] = last_log_date
-
-        device_hour_counts = {}
-        device_recent_counts = {}
-        for log in device_logs:
-            register_time = datetime.fromisoformat(
-                log["register_time"][:-1]).replace(tzinfo=pytz.utc)  # UTC
-            log_time = datetime.fromisoformat(f'{log["log_date"]}T{log["log_time"]}').replace(
-                tzinfo=pytz.utc)
-
-            # Check if the log arrived at the server within the last 10 minutes
-
-            if register_time > now - timedelta(minutes=recent_threshold):
-                intervals = [device_hour_counts, device_recent_counts]
-
-                first_log_times[device_name] = register_time
-            else:
-                intervals = [device_hour_counts]
-
-            log_msg = log["log"]
-            log_type = log_msg.split("]")[0][1:]
-
-            if log_type:  # If log isn't empty
-                for interval_count in intervals:
-                    if log_type not in interval_count:
-                        interval_count[log_type] = 1
-                    else:
-                        interval_count[log_type] += 1
-
-            alert_conditions = {}
-            for description, cond in alert_conditions.items():
-                if cond:
-                    alerts[device_name].add(description)
-
-        hourly_log_counts[device_name]["counts"] = device_hour_counts
-        recent_log_counts[device_name]["counts"] = device_recent_counts
-
-        cam_hour_counts = {}
-        cam_recent_counts = {}
-        for camera_name, camera_logs in cameras_data.items():
-            disconnection_times[device_name][camera_name] = {}
-            for interval in ["hour", "recent"]:
-                disconnection_times[device_name][camera_name][interval] = timedelta(
-                    0)
-
-            for log in camera_logs:
-                register_time = datetime.fromisoformat(
-                    log["register_time"][:-1]).replace(tzinfo=pytz.utc)
-                log_time = datetime.fromisoformat(f'{log["log_date"]}T{log["log_time"]}').replace(
-                    tzinfo=pytz.utc)
+def process_retail_data(response, now=None, device_models=None):
+    if not now:
+        now = datetime.now(tz=pytz.timezone('UTC'))
 
-                log_msg = log["log"]
-                log_type = log_msg.split("]")[0][1:]
+    logs = log_engine.flatten_device_logs(response)
+    recent = log_engine.recent_logs_mask(logs, now)
+    device_logs = logs["camera"].isna()
 
-                if log_type == "DISC_CAM":
-                    disconnection_times[device_name][camera_name]["hour"] += timedelta(
-                        minutes=2)
+    # Log type is the bracketed prefix, e.g. "[DISC_CAM] ..." (same as
+    # log.split("]")[0][1:]), unless a classification rule matches the log
+    bracket_types = logs["log"].str.extract(r'^[^\]]?([^\]]*)', expand=False)
+    log_types = log_classifier.classify_device_logs(
+        "Smart Retail", logs["log"], logs["device"], device_models).fillna(bracket_types)
 
-                # Check if the log arrived at the server within the last 10 minutes
+    hour_counts = log_engine.count_log_types(
+        logs["device"], log_types, device_logs)
+    recent_counts = log_engine.count_log_types(
+        logs["device"], log_types, device_logs & recent)
 
-                if register_time > now - timedelta(minutes=recent_threshold):
-                    intervals = [cam_hour_counts, cam_recent_counts]
+    camera_keys = [logs["device"], logs["camera"]]
+    cam_hour_counts = log_engine.count_log_types(
+        camera_keys, log_types, ~device_logs)
+    cam_recent_counts = log_engine.count_log_types(
+        camera_keys, log_types, ~device_logs & recent)
 
-                    first_log_time = register_time
-                    first_log_times[device_name] = first_log_time
+    hourly_log_counts = {}
+    recent_log_counts = {}
+    for device_name, data in response.items():
+        hourly_log_counts[device_name] = {
+            "counts": hour_counts.get(device_name, {}),
+            "cameras": {camera_name: cam_hour_counts.get((device_name, camera_name), {})
+                        for camera_name in data["cameras"]}}
+        recent_log_counts[device_name] = {
+            "counts": recent_counts.get(device_name, {}),
+            "cameras": {camera_name: cam_recent_counts.get((device_name, camera_name), {})
+                        for camera_name in data["cameras"]}}
 
-                    if log_type == "DISC_CAM":
-                        disconnection_times[device_name][camera_name]["recent"] += timedelta(
-                            minutes=2)
-                else:
-                    intervals = [cam_hour_counts]
+    disconnection_times = log_engine.camera_disconnection_times(
+        logs, bracket_types == "DISC_CAM", recent, response)
 
-                if log_type:  # If log isn't empty
-                    for interval_count in intervals:
-                        if log_type not in interval_count:
-                            interval_count[log_type] = 1
-                        else:
-                            interval_count[log_type] += 1
+    last_connections = log_engine.last_connections(logs, response)
+    first_log_times = log_engine.first_log_times(logs, recent, response)
 
-            hourly_log_counts[device_name]["cameras"][camera_name] = cam_hour_counts
-            hourly_log_counts[device_name]["cameras"][camera_name] = cam_recent_counts
+    alerts = defaultdict(set)
 
     log_counts = {"hour": hourly_log_counts, "recent": recent_log_counts}
     license = 0  # Placeholder
@@ -1445,25 +1362,37 @@ def process_retail_data(response):
     return log_counts, disconnection_times, last_connections, first_log_times, alerts, license
 
 
-def update_retail_status():
+def update_retail_status(clients=None):
     now = datetime.now(tz=pytz.timezone("UTC"))
 
     deployment = get_or_create_deployment('Smart Retail')
-    clients = get_deployment_clients('Smart Retail')
+    identity_map.preload_deployment(deployment)
+    if clients is None:
+        clients = get_deployment_clients('Smart Retail')
+        if enqueue_client_runs("monitor.cron.update_retail_status", clients):
+            return
+
+    responses = fetch_clients_data(
+        clients, lambda client: get_retail_data(client.keyname, client.id))
 
     for client in clients:
         client_alias = client.keyname
         client_name = client.name
 
-        response = get_retail_data(client_alias, client.id)
+        response = responses[client.id]
 
         if response is not None:
-            processed_data = process_retail_data(response)
+            processed_data = process_retail_data(
+                response, device_models=get_client_device_models(client.id))
         else:
             print(f"No data for {client_name}")
             continue
 
         log_counts, disconnection_times, last_connections, first_log_times, alerts, license = processed_data
+        uow = StatusUnitOfWork(f"Smart Retail - {client_name}")
+
+        identity_map.preload_client(client)
+        get_or_create_device_cameras(client, disconnection_times)
 
         camerastatus_data = []
         camerahistory_data = []
@@ -1503,8 +1432,8 @@ def update_retail_status():
                     'connected': recent_disc_time == timedelta(0),
                     'disconnection_time': recent_disc_time
                 })
-        bulk_update_camerastatus(camerastatus_data)
-        bulk_create_camerahistory(camerahistory_data)
+        bulk_update_camerastatus_and_history(
+            camerastatus_data, camerahistory_data)
 
         device_names = last_connections.keys()
 
@@ -1560,9 +1489,9 @@ def update_retail_status():
                     alert_args = {"alert_type": alert_type, "gx": device,
                                   "register_datetime": now, "register_date": now.date(),
                                   "description": alert_info}
-                    alert = create_alert(alert_args)
+                    uow.create_alert(alert_args)
 
-                """ if alerts[device_name] and os.environ.get("ALERTS") == "true":
+                """ if alerts[device_name] and settings.MONITOR_ALERTS:
                     send_telegram(chat="INDUSTRY_CHAT",
                                   message=message) """
 
@@ -1599,8 +1528,8 @@ def update_retail_status():
                 "status": status,
                 "log_counts": log_counts["hour"][device_name]["counts"]
             }
-            device_status = update_or_create_retail_device_status(
-                device=device, defaults=defaults)
+            uow.update_or_create_status(
+                RetailDeviceStatus, "device", device, defaults)
 
             devicehistory_args = {
                 "device": device,
@@ -1613,7 +1542,13 @@ def update_retail_status():
                 "status": status,
                 "log_counts": log_counts["recent"][device_name]["counts"]
             }
-            create_retail_device_history(devicehistory_args)
+            uow.create_history(RetailDeviceHistory, devicehistory_args)
+
+        uow.flush()
+
+    severity_snapshots.register_snapshot(deployment)
+    response_cache.bump_generation(deployment.id)
+    fleet_status.refresh(FleetStatus.RETAIL_DEVICE, deployment.name)
 
     '''disconnected_devices = get_retail_devices_without_updates()
     for device in disconnected_devices:
@@ -1656,7 +1591,7 @@ def update_retail_status():
                               "description": alert_info}
                 create_alert(alert_args)
 
-            """ if alerts and os.environ.get("ALERTS") == "true":
+            """ if alerts and settings.MONITOR_ALERTS:
                 send_telegram(chat="INDUSTRY_CHAT",
                               message=message)
 
@@ -1724,17 +1659,12 @@ def get_romberg_logs(client_keyname, client_id):
         return
 
     try:
-        token = api_login(login_url, credentials)
+        response, status = client_api.authenticated_get(
+            login_url, logs_url, {"minutes": 60}, credentials)
     except requests.exceptions.ConnectionError:
         print("Connection error")
         return
 
-    response, status = make_request(logs_url, {"minutes": 60}, token=token)
-    if status == 401:
-        token = api_login(login_url, credentials)
-        response, status = make_request(
-            logs_url, {"minutes": 60}, token=token)
-
     if status == 200 or status == 201:
         response = response.json()
     else:
@@ -1768,18 +1698,12 @@ def get_romberg_records(client_keyname, client_id, minutes=10):
         return
 
     try:
-        token = api_login(login_url, credentials)
+        response, status = client_api.authenticated_get(
+            login_url, records_url, {"minutes": minutes}, credentials)
     except requests.exceptions.ConnectionError:
         print("Connection error")
         return
 
-    response, status = make_request(
-        records_url, {"minutes": minutes}, token=token)
-    if status == 401:
-        token = api_login(login_url, credentials)
-        response, status = make_request(
-            records_url, {"minutes": 60}, token=token)
-
     if status == 200 or status == 201:
         response = response.json()
     elif status != 401 or status != 403:
@@ -1805,13 +1729,10 @@ def process_romberg_data(response, now=None):
     df_logs = pd.DataFrame(logs)
 
     if not df_logs.empty:
-        df_logs["Timestamp"] = df_logs["Timestamp"].apply(
-            lambda x: datetime.fromisoformat(x))
-        df_logs["Fecha_subida"] = df_logs["Fecha_subida"].apply(
-            lambda x: datetime.fromisoformat(x))
-
-        df_logs["Timestamp"] = df_logs["Timestamp"].dt.tz_localize('UTC')
-        df_logs["Fecha_subida"] = df_logs["Fecha_subida"].dt.tz_localize('UTC')
+        df_logs["Timestamp"] = pd.to_datetime(
+            df_logs["Timestamp"], format="ISO8601").dt.tz_localize('UTC')
+        df_logs["Fecha_subida"] = pd.to_datetime(
+            df_logs["Fecha_subida"], format="ISO8601").dt.tz_localize('UTC')
 
         logs_last_hour = df_logs[df_logs["Timestamp"] > (
             now - timedelta(hours=1))]
@@ -1839,33 +1760,31 @@ def process_romberg_data(response, now=None):
     '''
     Generate counts of log types in two intervals: an hour ago, and 10 minutes ago 
     '''
-    for i in range(len(logs_last_hour)):
-        log = logs_last_hour.iloc[i]
-        device_id = log["ID"]
-        log_type = log["Tipo"]
-        log_content = log["Log"]
-        log_time = log["Timestamp"]
-
-        recent = log_time > now - timedelta(minutes=recent_threshold)
-        if recent:
-            intervals = ["hour", "recent"]
-            if device_id not in first_log_times or (device_id in first_log_times and first_log_times[device_id] > log_time):
-                first_log_times[device_id] = log_time
-        else:
-            intervals = ["hour"]
-
-        if device_id not in devices_data.keys():
-            continue
-
-        for interval in intervals:
-            log_counts[interval][device_id][log_type] += 1
-
-            if log_type == "camera_missing":
-                cameras_num = log["Log"][:-2].split(":")[2].split()
-                if log_content.split()[1] == "'DISCONNECTED":
-                    for camera in cameras_num:
-                        camera_disc_times[interval][device_id][int(
-                            camera)] += timedelta(minutes=2)
+    if not logs_last_hour.empty:
+        recent = log_engine.recent_logs_mask(
+            logs_last_hour, now, column="Timestamp")
+
+        for device_id, log_time in logs_last_hour[recent].groupby("ID")["Timestamp"].min().items():
+            first_log_times[device_id] = log_time
+
+        device_logs = logs_last_hour[logs_last_hour["ID"].isin(
+            devices_data.keys())]
+        recent = recent[device_logs.index]
+
+        cameras = log_engine.disconnected_cameras(device_logs)
+        for interval, mask in [("hour", None), ("recent", recent)]:
+            type_counts = log_engine.count_log_types(
+                device_logs["ID"], device_logs["Tipo"], mask)
+            for device_id, counts in type_counts.items():
+                for log_type, count in counts.items():
+                    log_counts[interval][device_id][log_type] += count
+
+            interval_cameras = cameras if mask is None else cameras[mask[cameras.index].values]
+            camera_counts = interval_cameras.groupby(
+                [device_logs.loc[interval_cameras.index, "ID"], interval_cameras], sort=False).size()
+            for (device_id, camera), count in camera_counts.items():
+                camera_disc_times[interval][device_id][int(
+                    camera)] += timedelta(minutes=2) * int(count)
 
     '''
     Generate alerts
@@ -1886,20 +1805,27 @@ def process_romberg_data(response, now=None):
     return devices_data, log_counts, camera_disc_times, first_log_times, alerts
 
 
-def update_romberg_status():
+def update_romberg_status(clients=None):
     now = datetime.now(tz=pytz.timezone("UTC"))
     local_tz = pytz.timezone("America/Mexico_City")
 
     deployment = get_or_create_deployment('Romberg')
-    clients = get_deployment_clients('Romberg')
+    identity_map.preload_deployment(deployment)
+    if clients is None:
+        clients = get_deployment_clients('Romberg')
+        if enqueue_client_runs("monitor.cron.update_romberg_status", clients):
+            return
+
+    responses = fetch_clients_data(
+        clients, lambda client: (get_romberg_logs(client.keyname, client.id),
+                                 get_romberg_records(client.keyname, client.id)))
 
     for client in clients:
         client_keyname = client.keyname
         client_name = client.name
         client_id = client.id
 
-        logs_response = get_romberg_logs(client_keyname, client_id)
-        metrics_response = get_romberg_records(client_keyname, client_id)
+        logs_response, metrics_response = responses[client_id] or (None, None)
 
         records = defaultdict(list)
         if metrics_response:
@@ -1928,6 +1854,13 @@ def update_romberg_status():
 
         hour_cam_disc = camera_disc_times["hour"]
         recent_cam_dics = camera_disc_times["recent"]
+
+        identity_map.preload_client(client)
+        devices = {device_name: get_or_create_romberg_device(client_id, device_name, devices_data[device_name]["Dispositivo"])
+                   for device_name in recent_cam_dics}
+        get_or_create_cameras([{'name': camera_name, 'gx': devices[device_name]}
+                               for device_name, camera_disc in recent_cam_dics.items()
+                               for camera_name in camera_disc])
         for device_name, camera_disc in recent_cam_dics.items():
             device = get_or_create_romberg_device(
                 client_id, device_name, devices_data[device_name]["Dispositivo"])
@@ -1952,9 +1885,10 @@ def update_romberg_status():
                     'connected': recent_disc_time == timedelta(0),
                     'disconnection_time': recent_disc_time
                 })
-        bulk_update_camerastatus(camerastatus_data)
-        bulk_create_camerahistory(camerahistory_data)
+        bulk_update_camerastatus_and_history(
+            camerastatus_data, camerahistory_data)
 
+        uow = StatusUnitOfWork(f"Romberg - {client_name}")
         for device_name, device_data in devices_data.items():
             device_description = device_data["Dispositivo"]
             device = get_or_create_romberg_device(
@@ -1969,7 +1903,7 @@ def update_romberg_status():
 
             current_metrics = {}
             for metric_name, metric_data in most_recent_metrics.items():
-                metric = get_or_create_gx_metric(
+                metric = get_or_create_cached_gx_metric(
                     metric_name, model_name=device.model.name)
 
                 average = metric_data["Valor_promedio"]
@@ -2029,7 +1963,7 @@ def update_romberg_status():
                     alert_args = {"alert_type": alert_type, "gx": device,
                                   "register_datetime": now, "register_date": now.date(),
                                   "description": alert_info}
-                    alert = create_alert(alert_args)
+                    uow.create_alert(alert_args)
 
             status_conditions = [
                 (log_counts["hour"][device_name].get("read_only_ssd", 0)
@@ -2077,8 +2011,8 @@ def update_romberg_status():
                 "records": current_metrics,
                 "active": True
             }
-            device_status = update_or_create_romberg_device_status(
-                device=device, defaults=defaults)
+            uow.update_or_create_status(
+                RombergDeviceStatus, "device", device, defaults)
 
             devicehistory_args = {
                 "device": device,
@@ -2092,13 +2026,19 @@ def update_romberg_status():
                 "status": status,
                 "log_counts": log_counts["recent"][device_name],
             }
-            create_romberg_device_history(devicehistory_args)
+            uow.create_history(RombergDeviceHistory, devicehistory_args)
 
             print(device_description, severity, rule)
 
             # print(device.name, device.description)
             # print(delayed, delay_time)
 
+        uow.flush()
+
+    severity_snapshots.register_snapshot(deployment)
+    response_cache.bump_generation(deployment.id)
+    fleet_status.refresh(FleetStatus.ROMBERG_DEVICE, deployment.name)
+
 
 # Servers
 
@@ -2232,9 +2172,10 @@ def update_servers_status():
                         message += f' {msg}\n'
                     message += '\n'
 
-                    send_telegram(f'AWS_CHAT', message)
+                send_telegram(f'AWS_CHAT', message)
 
     set_servers_as_inactive()
+    fleet_status.refresh(FleetStatus.SERVER)
 
 
 def update_rds_status():
@@ -2356,10 +2297,12 @@ def update_rds_status():
                         message += f' {msg}\n'
                     message += '\n'
 
-                    send_telegram(f'AWS_CHAT', message)
+                send_telegram(f'AWS_CHAT', message)
 
                 print(message)
 
+    fleet_status.refresh(FleetStatus.RDS)
+
 
 def update_elb_status():
     now = datetime.now(tz=pytz.timezone("UTC"))
@@ -2500,11 +2443,12 @@ def update_elb_status():
                         message += f' {msg}\n'
                     message += '\n'
 
-                    send_telegram(f'AWS_CHAT', message)
+                send_telegram(f'AWS_CHAT', message)
 
                 print(message)
 
     set_load_balancers_as_inactive()
+    fleet_status.refresh(FleetStatus.ELB)
 
 
 # Smart Buildings
@@ -2569,41 +2513,3 @@ def send_daily_sd_report():
         message += "\nNo hubieron unidades críticas"
 
     send_telegram(chat="SAFEDRIVING_CHAT", message=message)
-
-
-# Generate data for area plots, runs hourly
-def register_severity_counts():
-    now = datetime.now(tz=pytz.timezone('UTC'))
-
-    get_severity_counts = {
-        "Safe Driving": get_units_severity_counts,
-        "Industry": lambda client: get_devices_severity_counts(client, "Industry"),
-        "Smart Retail": get_retail_devices_severity_counts,
-        "Smart Buildings": lambda client: get_devices_severity_counts(client, "Smart Buildings"),
-        "Romberg": get_romberg_devices_severity_counts,
-    }
-
-    for deployment_name in list(get_severity_counts.keys()):
-        dep_clients = get_clients(deployment_name)
-        deployment = get_or_create_deployment(deployment_name)
-
-        for client in dep_clients:
-            severity_counts = get_severity_counts[deployment_name](client)
-
-            counts_json = {}
-            for count in severity_counts:
-                counts_json[count['severity']] = count['count']
-
-            # FIX: Only SD has status level 0, but this doesn't cause a problem
-            for n in range(0, 6):
-                if n not in counts_json:
-                    counts_json[n] = 0
-
-            count_args = {
-                "deployment": deployment,
-                "client": client,
-                "timestamp": now,
-                "date": now.date(),
-                "severity_counts": counts_json
-            }
-            create_severity_count(count_args)
@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from .models import (DeviceStatus, FleetStatus, LoadBalancerStatus, RDSStatus, RetailDeviceStatus,
+                     RombergDeviceStatus, ServerStatus, UnitStatus)
+
+
+# Read model of the fleet summary: one FleetStatus row per monitored entity
+# with its current status. The status jobs refresh the rows of what they
+# monitor when they finish (one query for the statuses, one upsert, one
+# delete of the entities no longer monitored), so the summary of every
+# deployment is read from this table alone. Servers, RDS and load balancers
+# have no status, only a critical flag: they belong to the AWS deployment
+# with severity 5 when critical and 1 otherwise.
+
+AWS = "AWS"
+TOP_PROBLEMS = 5
+
+FIELDS = ["deployment", "client", "name", "severity", "priority", "description", "last_update",
+          "updated_at"]
+
+# Kind: (status model, entity field, filters)
+GX_STATUSES = {
+    FleetStatus.UNIT: (UnitStatus, "unit", {"active": True}),
+    FleetStatus.DEVICE: (DeviceStatus, "device", {"device__client__active": True}),
+    FleetStatus.RETAIL_DEVICE: (RetailDeviceStatus, "device", {"active": True}),
+    FleetStatus.ROMBERG_DEVICE: (RombergDeviceStatus, "device", {"active": True}),
+}
+
+# Kind: (status model, entity field, filters, description field)
+AWS_STATUSES = {
+    FleetStatus.SERVER: (ServerStatus, "server", {"active": True}, "state"),
+    FleetStatus.RDS: (RDSStatus, "rds", {}, "status"),
+    FleetStatus.ELB: (LoadBalancerStatus, "elb", {"active": True}, "state_code"),
+}
+
+
+def _gx_rows(kind: str, deployment: str):
+    status_model, entity, filters = GX_STATUSES[kind]
+    return status_model.objects.filter(
+        **{f"{entity}__client__deployment__name": deployment}, **filters,
+    ).values(
+        "last_update",
+        entity_id=F(f"{entity}_id"),
+        name=F(f"{entity}__name"),
+        client=F(f"{entity}__client__name"),
+        severity=F("status__severity"),
+        priority=Coalesce(F("status__priority"), Value(False)),
+        description=F("status__description"),
+    )
+
+
+def _aws_rows(kind: str):
+    status_model, entity, filters, description = AWS_STATUSES[kind]
+    return status_model.objects.filter(**filters).values(
+        entity_id=F(f"{entity}_id"),
+        name=F(f"{entity}__name"),
+        severity=Case(When(critical=True, then=Value(5)), default=Value(1)),
+        description=F(description),
+        last_update=F("last_activity"),
+    )
+
+
+def refresh(kind: str, deployment: str = None) -> int:
+    """
+    Writes the rows of the entities of kind from their current statuses (of
+    deployment, for the gx) and deletes the rows of the entities that are no
+    longer monitored. Returns the number of rows written.
+    """
+    if kind in GX_STATUSES:
+        rows = _gx_rows(kind, deployment)
+    else:
+        deployment = AWS
+        rows = _aws_rows(kind)
+
+    # Some status tables allow more than one status per entity: the last one wins
+    fleet = list({
+        row["entity_id"]: FleetStatus(kind=kind, **{"deployment": deployment, "priority": False, **row})
+        for row in rows.order_by("id")
+    }.values())
+
+    with transaction.atomic():
+        FleetStatus.objects.bulk_create(
+            fleet, batch_size=1000, update_conflicts=True,
+            unique_fields=["kind", "entity_id"], update_fields=FIELDS)
+        FleetStatus.objects.filter(kind=kind, deployment=deployment).exclude(
+            entity_id__in=[row.entity_id for row in fleet]).delete()
+
+    return len(fleet)
+
+
+def summary(top: int = TOP_PROBLEMS) -> list:
+    """
+    Counts, breakdown by kind, severity and description, and the top
+    problems (priority first, then the highest severity) of every
+    deployment, from a single query.
+    """
+    group = [F("deployment"), F("kind"), F("severity"), F("description")]
+    rows = FleetStatus.objects.annotate(
+        rank=Window(RowNumber(), partition_by=[F("deployment")],
+                    order_by=[F("priority").desc(), F("severity").desc(nulls_last=True), F("name")]),
+        group_rank=Window(RowNumber(), partition_by=group, order_by="id"),
+        group_count=Window(Count("id"), partition_by=group),
+    ).filter(
+        # The first row of each group carries its count
+        Q(rank__lte=top) | Q(group_rank=1),
+    ).order_by("deployment", "rank")
+
+    deployments = defaultdict(lambda: {
+        "total": 0, "severity_counts": {}, "kinds": {}, "breakdown": [], "top_problems": []})
+    for row in rows:
+        deployment = deployments[row.deployment]
+        if row.group_rank == 1:
+            deployment["total"] += row.group_count
+            severity = str(row.severity)
+            deployment["severity_counts"][severity] = \
+                deployment["severity_counts"].get(severity, 0) + row.group_count
+            deployment["kinds"][row.kind] = deployment["kinds"].get(row.kind, 0) + row.group_count
+            deployment["breakdown"].append({
+                "kind": row.kind, "severity": row.severity,
+                "description": row.description, "count": row.group_count})
+        # Inactive (0) and working (1) entities are not problems
+        if row.rank <= top and (row.severity or 0) > 1:
+            deployment["top_problems"].append(row)
+
+    output = []
+    for name, deployment in sorted(deployments.items()):
+        deployment["breakdown"].sort(key=lambda x: (-(x["severity"] or 0), -x["count"]))
+        output.append({"deployment": name, **deployment})
+    return output
@@ -0,0 +1,216 @@
+import threading
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import models
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import *
+
+
+# Process-level identity map for the reference rows used by the status runs
+# (gx, cameras, statuses, alert types, metrics...). Rows are preloaded in a
+# few queries per deployment and client and looked up in memory, so only rows
+# that do not exist yet cost a query. Saved and deleted rows are updated or
+# evicted through model signals, and every run reloads its client's rows, so
+# changes made by other processes are seen on the next run.
+
+CACHED_MODELS = (Unit, Device, RombergDevice, Camera, GxStatus,
+                 AlertType, GxMetric, GxModel, Client, Deployment)
+
+_lock = threading.RLock()
+_rows = defaultdict(dict)       # model -> {pk: obj}
+_indexes = defaultdict(dict)    # model -> {fields: {values: [obj, ...]}}
+
+
+def _normalize(lookup: dict):
+    # {"client": client} -> {"client_id": client.pk}
+    normalized = {}
+    for field, value in lookup.items():
+        if isinstance(value, models.Model):
+            normalized[f'{field}_id'] = value.pk
+        else:
+            normalized[field] = value
+    return normalized
+
+
+def _values(obj, fields):
+    return tuple(getattr(obj, field) for field in fields)
+
+
+def _index(model, fields):
+    index = _indexes[model].get(fields)
+    if index is None:
+        index = defaultdict(list)
+        for obj in _rows[model].values():
+            index[_values(obj, fields)].append(obj)
+        _indexes[model][fields] = index
+    return index
+
+
+def add(obj):
+    model = type(obj)
+    with _lock:
+        replaced = _rows[model].get(obj.pk)
+        _rows[model][obj.pk] = obj
+        if replaced is not None:
+            _indexes[model].clear()
+        else:
+            for fields, index in _indexes[model].items():
+                index[_values(obj, fields)].append(obj)
+
+
+def discard(model, pk):
+    with _lock:
+        if _rows[model].pop(pk, None) is not None:
+            _indexes[model].clear()
+
+
+def load(model, queryset, **scope):
+    """
+    Replaces the cached rows of model that match scope (all of them if no
+    scope is given) with the rows of queryset.
+    """
+    objs = list(queryset)
+    scope = _normalize(scope)
+
+    with _lock:
+        rows = _rows[model]
+        if scope:
+            fields = tuple(scope)
+            for pk in [pk for pk, obj in rows.items() if _values(obj, fields) == tuple(scope.values())]:
+                del rows[pk]
+        else:
+            rows.clear()
+
+        for obj in objs:
+            rows[obj.pk] = obj
+        _indexes[model].clear()
+
+
+def find(model, **lookup) -> list:
+    lookup = _normalize(lookup)
+    fields = tuple(sorted(lookup))
+
+    with _lock:
+        return list(_index(model, fields).get(tuple(lookup[field] for field in fields), []))
+
+
+def get(model, **lookup):
+    # Same as model.objects.get(**lookup), without a query on a hit
+    found = find(model, **lookup)
+    if len(found) == 1:
+        return found[0]
+
+    obj = model.objects.get(**lookup)
+    add(obj)
+    return obj
+
+
+def get_or_create(model, defaults=None, **lookup):
+    # Same as model.objects.get_or_create(**lookup, defaults=defaults),
+    # without a query on a hit
+    found = find(model, **lookup)
+    if len(found) == 1:
+        return found[0], False
+
+    obj, created = model.objects.get_or_create(defaults=defaults, **lookup)
+    add(obj)
+    return obj, created
+
+
+def bulk_get_or_create(model, lookups: list) -> list:
+    """
+    get_or_create for a list of lookups (dicts with the same fields), creating
+    all the missing rows with one bulk_create. Returns the objects in order.
+    """
+    results = [None] * len(lookups)
+    missing = {}
+    for i, lookup in enumerate(lookups):
+        found = find(model, **lookup)
+        if len(found) == 1:
+            results[i] = found[0]
+        else:
+            key = tuple(sorted(_normalize(lookup).items()))
+            missing.setdefault(key, []).append(i)
+
+    if missing:
+        # Rows may have been created since the last preload
+        existing = model.objects.filter(
+            reduce(or_, [Q(**dict(key)) for key in missing]))
+        with _lock:
+            for obj in existing:
+                _rows[model][obj.pk] = obj
+            _indexes[model].clear()
+
+        to_create = []
+        for key, positions in missing.items():
+            found = find(model, **dict(key))
+            if found:
+                obj = found[0]
+            else:
+                obj = model(**dict(key))
+                to_create.append(obj)
+            for i in positions:
+                results[i] = obj
+
+        model.objects.bulk_create(to_create)
+        for obj in to_create:
+            add(obj)
+
+    return results
+
+
+def preload_deployment(deployment):
+    load(Deployment, Deployment.objects.all())
+    load(Client, Client.objects.filter(deployment=deployment), deployment=deployment)
+    load(GxStatus, GxStatus.objects.filter(deployment=deployment), deployment=deployment)
+    load(AlertType, AlertType.objects.all())
+    load(GxModel, GxModel.objects.all())
+    load(GxMetric, GxMetric.objects.select_related("gx_model"))
+
+
+def preload_client(client):
+    load(Unit, Unit.objects.filter(client=client), client=client)
+    load(Device, Device.objects.filter(client=client), client=client)
+    load(RombergDevice, RombergDevice.objects.filter(
+        client=client).select_related("model"), client=client)
+
+    cameras = list(Camera.objects.filter(gx__client=client))
+    gx_ids = {obj.pk for model in (Unit, Device, RombergDevice)
+              for obj in find(model, client=client)}
+    with _lock:
+        rows = _rows[Camera]
+        for pk in [pk for pk, camera in rows.items() if camera.gx_id in gx_ids]:
+            del rows[pk]
+        for camera in cameras:
+            rows[camera.pk] = camera
+        _indexes[Camera].clear()
+
+
+def clear(*cached_models):
+    with _lock:
+        for model in cached_models or list(_rows):
+            _rows[model].clear()
+            _indexes[model].clear()
+
+
+@receiver(post_save)
+def on_cached_row_saved(sender, instance, created, **kwargs):
+    if sender in CACHED_MODELS and not created:
+        # Keep the cached row in sync, e.g. when a threshold or a device is
+        # edited from the admin or the API. Saves of the cached instance
+        # itself (e.g. the license days of a device) are already in sync.
+        with _lock:
+            cached = _rows[sender].get(instance.pk)
+            if cached is not None and cached is not instance:
+                add(instance)
+
+
+@receiver(post_delete)
+def on_cached_row_deleted(sender, instance, **kwargs):
+    if sender in CACHED_MODELS:
+        discard(sender, instance.pk)
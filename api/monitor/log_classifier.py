@@ -0,0 +1,163 @@
+import re
+import threading
+
+import pandas as pd
+from django.db.models import Count, Max, Q
+
+from .models import LogClassificationRule
+
+
+# Log classifier shared by the deployments. Prefix and regex rules (built-in
+# defaults plus LogClassificationRule rows) are compiled into one alternation
+# regex, so every message is matched once no matter how many rules there are.
+# Compiled classifiers are cached per (deployment, gx model) and rebuilt when
+# the deployment's rules change.
+
+# Built-in rules, checked after the ones stored in the DB. Order is priority.
+# TO DO: Add warn msg category instead of counting it as batch dropping by default
+INDUSTRY_RULES = [
+    ("batch_dropping", "Batch dropping", LogClassificationRule.PREFIX),
+    ("batch_dropping", "[WARN MSG]", LogClassificationRule.PREFIX),
+    ("restart", "Restarting", LogClassificationRule.PREFIX),
+    ("restart", "[PIPELINE RESTART]", LogClassificationRule.PREFIX),
+    ("license", "[LICENSE]", LogClassificationRule.PREFIX),
+    ("shift_change", "SRC", LogClassificationRule.PREFIX),
+]
+
+DEFAULT_RULES = {
+    "Industry": INDUSTRY_RULES,
+    "Smart Buildings": INDUSTRY_RULES,
+}
+
+# Regex syntax that is valid in a pattern of its own but not inside the
+# alternation: global flags must start the whole regex, the rule groups are
+# named r0, r1... and the group numbers of a rule change with its position
+UNSUPPORTED_SYNTAX = [
+    (re.compile(r'\(\?[aiLmsux]+\)'), "inline global flags (use (?i:...) instead)"),
+    (re.compile(r'\(\?P?<(?![=!])|\(\?P=|\(\?\('), "named groups and group references"),
+    (re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]'), "numbered backreferences"),
+]
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def pattern_error(pattern: str):
+    """
+    Why the regex pattern cannot be used in a rule, or None if it can.
+    """
+    for syntax, description in UNSUPPORTED_SYNTAX:
+        if syntax.search(pattern):
+            return f"{description} are not supported"
+
+    try:
+        re.compile(f'(?P<r0>.*?(?:{pattern}))', re.DOTALL)
+    except re.error as e:
+        return str(e)
+
+    return None
+
+
+class LogClassifier:
+    def __init__(self, rules):
+        """
+        rules is a list of (category, pattern, match_type) in priority order.
+        Rules whose regex cannot be used in the alternation are skipped.
+        """
+        self.categories = {}
+        alternatives = []
+
+        for category, pattern, match_type in rules:
+            if match_type == LogClassificationRule.REGEX:
+                error = pattern_error(pattern)
+                if error is not None:
+                    print(f"Invalid log rule {pattern!r}: {error}")
+                    continue
+                # Regex rules may match anywhere in the message
+                expression = f'.*?(?:{pattern})'
+            else:
+                expression = re.escape(pattern)
+
+            group = f'r{len(alternatives)}'
+            self.categories[group] = category
+            alternatives.append(f'(?P<{group}>{expression})')
+
+        # Alternatives are tried in order, so the first matching rule wins.
+        # The rule group encloses any group of the pattern, so lastgroup is
+        # always the rule's name.
+        self.pattern = re.compile(
+            "|".join(alternatives), re.DOTALL) if alternatives else None
+
+    def classify(self, messages: pd.Series, default=None) -> pd.Series:
+        match = self.pattern.match if self.pattern is not None else None
+        categories = self.categories
+
+        results = []
+        for message in messages:
+            m = match(message) if match and isinstance(message, str) else None
+            results.append(categories[m.lastgroup] if m else default)
+
+        return pd.Series(results, index=messages.index, dtype=object)
+
+
+def _rules_version(deployment_name: str):
+    return tuple(LogClassificationRule.objects.filter(
+        deployment__name=deployment_name
+    ).aggregate(count=Count("id"), updated=Max("updated_at")).values())
+
+
+def _load_rules(deployment_name: str, gx_model_id=None):
+    rules = LogClassificationRule.objects.filter(
+        Q(gx_model__isnull=True) | Q(gx_model_id=gx_model_id),
+        deployment__name=deployment_name, active=True,
+    ).values_list("gx_model_id", "priority", "id", "category", "pattern", "match_type")
+
+    # Model specific rules first, then by priority
+    rules = sorted(rules, key=lambda rule: (rule[0] is None, -rule[1], rule[2]))
+
+    return [rule[3:] for rule in rules] + DEFAULT_RULES.get(deployment_name, [])
+
+
+def get_classifier(deployment_name: str, gx_model_id=None, version=None) -> LogClassifier:
+    if version is None:
+        version = _rules_version(deployment_name)
+    key = (deployment_name, gx_model_id)
+
+    with _lock:
+        cached = _cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    classifier = LogClassifier(_load_rules(deployment_name, gx_model_id))
+    with _lock:
+        _cache[key] = (version, classifier)
+
+    return classifier
+
+
+def classify_device_logs(deployment_name: str, messages: pd.Series, devices: pd.Series,
+                         device_models=None, default=None) -> pd.Series:
+    """
+    Categories of messages, using the rules of the gx model of each device.
+    device_models is {device_name: gx_model_id}; devices missing from it only
+    use the deployment wide rules.
+    """
+    version = _rules_version(deployment_name)
+
+    if not device_models:
+        return get_classifier(deployment_name, version=version).classify(messages, default)
+
+    models = devices.map(device_models)
+    categories = pd.Series(default, index=messages.index, dtype=object)
+    for gx_model_id, model_messages in messages.groupby(models, dropna=False, sort=False):
+        gx_model_id = None if pd.isna(gx_model_id) else int(gx_model_id)
+        classifier = get_classifier(deployment_name, gx_model_id, version)
+        categories[model_messages.index] = classifier.classify(
+            model_messages, default)
+
+    return categories
+
+
+def clear():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,125 @@
+from datetime import timedelta
+
+import pandas as pd
+
+
+# Columnar helpers shared by the process_*_data functions in cron.py.
+# Device log trees ({device: {"logs": [...], "cameras": {camera: [...]}}}) are
+# flattened once into a DataFrame and every count is done with vectorized ops.
+
+RECENT_THRESHOLD = timedelta(minutes=10)
+CAMERA_DISCONNECTION_TIME = timedelta(minutes=2)
+
+
+def flatten_device_logs(response: dict) -> pd.DataFrame:
+    """
+    One row per log with columns device, camera (None for device logs),
+    register_time (UTC) and log, in the same order as the response.
+    """
+    devices = []
+    cameras = []
+    register_times = []
+    messages = []
+
+    for device_name, data in response.items():
+        device_logs = data["logs"]
+        devices += [device_name] * len(device_logs)
+        cameras += [None] * len(device_logs)
+        register_times += [log["register_time"] for log in device_logs]
+        messages += [log["log"] for log in device_logs]
+
+        for camera_name, camera_logs in data["cameras"].items():
+            devices += [device_name] * len(camera_logs)
+            cameras += [camera_name] * len(camera_logs)
+            register_times += [log["register_time"] for log in camera_logs]
+            messages += [log["log"] for log in camera_logs]
+
+    logs = pd.DataFrame({"device": devices, "camera": cameras,
+                         "register_time": register_times, "log": messages},
+                        dtype=object)
+
+    # register_time comes as "2024-04-04T15:10:05.123456Z"
+    logs["register_time"] = pd.to_datetime(
+        logs["register_time"].str[:-1], format="ISO8601").dt.tz_localize('UTC')
+
+    return logs
+
+
+def recent_logs_mask(logs: pd.DataFrame, now, column="register_time") -> pd.Series:
+    # Logs that arrived at the server within the last 10 minutes
+    return logs[column] > now - RECENT_THRESHOLD
+
+
+def count_log_types(keys, categories: pd.Series, mask=None) -> dict:
+    """
+    {key: {category: count}} for the rows in mask, keeping the order in which
+    each category first appears. keys is a Series (e.g. logs["device"]) or a
+    list of Series, in which case the dict is keyed by tuples. Rows with an
+    empty category are skipped.
+    """
+    valid = categories.notna() & (categories != "")
+    if mask is not None:
+        valid &= mask
+
+    if isinstance(keys, pd.Series):
+        keys = [keys]
+
+    counts = {}
+    grouped = categories[valid].groupby(
+        [key[valid] for key in keys] + [categories[valid]], sort=False).size()
+    for group, count in grouped.items():
+        key = group[0] if len(keys) == 1 else group[:-1]
+        counts.setdefault(key, {})[group[-1]] = int(count)
+
+    return counts
+
+
+def last_connections(logs: pd.DataFrame, response: dict) -> dict:
+    # Register time of the newest (first) device log, or None
+    device_logs = logs[logs["camera"].isna()]
+    newest = device_logs.groupby("device", sort=False)["register_time"].first()
+
+    return {device_name: newest[device_name].to_pydatetime() if device_name in newest.index else None
+            for device_name in response}
+
+
+def first_log_times(logs: pd.DataFrame, recent: pd.Series, response: dict) -> dict:
+    # Register time of the last recent log in response order (device logs,
+    # then cameras), i.e. the first log received within the threshold window
+    first = logs[recent].groupby("device", sort=False)["register_time"].last()
+
+    return {device_name: first[device_name].to_pydatetime() if device_name in first.index else None
+            for device_name in response}
+
+
+def camera_disconnection_times(logs: pd.DataFrame, disconnected: pd.Series,
+                               recent: pd.Series, response: dict) -> dict:
+    """
+    {device: {camera: {"hour": timedelta, "recent": timedelta}}}, adding
+    CAMERA_DISCONNECTION_TIME for every disconnection log.
+    """
+    disc_times = {device_name: {camera_name: {"hour": timedelta(0), "recent": timedelta(0)}
+                                for camera_name in data["cameras"]}
+                  for device_name, data in response.items()}
+
+    camera_logs = logs["camera"].notna() & disconnected
+    for interval, mask in [("hour", camera_logs), ("recent", camera_logs & recent)]:
+        counts = logs[mask].groupby(["device", "camera"], sort=False).size()
+        for (device_name, camera_name), count in counts.items():
+            disc_times[device_name][camera_name][interval] += CAMERA_DISCONNECTION_TIME * int(count)
+
+    return disc_times
+
+
+def disconnected_cameras(logs: pd.DataFrame) -> pd.Series:
+    """
+    Camera numbers of "camera_missing" logs reporting disconnected cameras,
+    e.g. "{'log': 'DISCONNECTED cameras: 0 1'}", one row per camera indexed
+    by the original log row.
+    """
+    is_disconnection = (logs["Tipo"] == "camera_missing") & \
+        (logs["Log"].str.split().str[1] == "'DISCONNECTED")
+    cameras = logs.loc[is_disconnection, "Log"].str[:-2].str.split(
+        ":").str[2].str.split().explode().dropna()
+
+    return cameras.astype(int)
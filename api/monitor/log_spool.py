@@ -0,0 +1,137 @@
+import fcntl
+import gzip
+import json
+import os
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import pytz
+from django.conf import settings
+
+
+# Append-only spool of the late Safe Driving logs. Every run appends its logs
+# to the active segment as a new gzip member (JSON lines) and the segment is
+# sealed once it grows past MONITOR_LATE_LOG_SEGMENT_SIZE. Sealed segments are
+# never modified: the nightly late log job reads them in chunks and deletes
+# them once its transaction is committed. A crash mid-append leaves a
+# truncated member in the active segment, and the next appends go after it:
+# the reader skips it up to the next gzip header, so only the logs of the
+# interrupted append are lost.
+
+ACTIVE = "active.jsonl.gz"
+SEGMENT_PREFIX = "segment-"
+# Magic number and deflate method of every gzip member
+GZIP_HEADER = b"\x1f\x8b\x08"
+
+
+class LogSpool:
+    def __init__(self, directory=None, segment_size=None):
+        self.directory = directory or settings.MONITOR_LATE_LOG_SPOOL_DIR
+        self.segment_size = segment_size or settings.MONITOR_LATE_LOG_SEGMENT_SIZE
+        self.active_path = os.path.join(self.directory, ACTIVE)
+
+    @contextmanager
+    def _lock(self):
+        # Appends and seals from other processes are serialized
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, logs: pd.DataFrame):
+        if logs.empty:
+            return
+
+        data = logs.to_json(orient="records", lines=True, date_format="iso")
+        if not data.endswith("\n"):
+            data += "\n"
+
+        with self._lock():
+            with open(self.active_path, "ab") as f:
+                f.write(gzip.compress(data.encode()))
+                f.flush()
+                os.fsync(f.fileno())
+
+            if os.path.getsize(self.active_path) >= self.segment_size:
+                self._seal()
+
+    def _seal(self):
+        if os.path.exists(self.active_path) and os.path.getsize(self.active_path) > 0:
+            now = datetime.now(tz=pytz.timezone("UTC"))
+            os.replace(self.active_path, os.path.join(
+                self.directory, f'{SEGMENT_PREFIX}{now:%Y%m%dT%H%M%S%f}.jsonl.gz'))
+
+    def seal(self) -> list:
+        """
+        Seals the active segment and returns the paths of all the sealed
+        segments, oldest first.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+
+        with self._lock():
+            self._seal()
+
+        return [os.path.join(self.directory, name)
+                for name in sorted(os.listdir(self.directory))
+                if name.startswith(SEGMENT_PREFIX)]
+
+    @staticmethod
+    def _members(segment: str):
+        # Decompressed gzip members of a segment. A truncated or corrupted
+        # member (an interrupted append) is skipped and the reading resumes
+        # at the next gzip header, since later appends go after it
+        with open(segment, "rb") as f:
+            data = f.read()
+
+        offset = 0
+        while offset < len(data):
+            decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+            try:
+                member = decompressor.decompress(memoryview(data)[offset:])
+                error = None if decompressor.eof else "truncated member"
+            except zlib.error as e:
+                error = f"corrupted member ({e})"
+
+            if error is None:
+                yield member
+                offset = len(data) - len(decompressor.unused_data)
+                continue
+
+            print(f"{segment}: {error} at byte {offset}")
+            offset = data.find(GZIP_HEADER, offset + 1)
+            if offset == -1:
+                return
+
+    @classmethod
+    def read(cls, segment: str, chunk_size=10000):
+        """
+        Yields the logs of a segment as lists of at most chunk_size dicts.
+        """
+        chunk = []
+        for member in cls._members(segment):
+            for line in member.decode().splitlines():
+                chunk.append(json.loads(line))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+
+        if chunk:
+            yield chunk
+
+    def read_all(self, segments: list, chunk_size=10000):
+        for segment in segments:
+            yield from self.read(segment, chunk_size)
+
+    @staticmethod
+    def delete(segments: list):
+        for segment in segments:
+            try:
+                os.remove(segment)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,33 @@
+import argparse
+from datetime import timedelta, timezone
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from monitor import rollups
+
+
+def utc_datetime(value):
+    # Datetimes without offset are UTC
+    dt = parse_datetime(value)
+    if dt is None:
+        raise argparse.ArgumentTypeError(f"{value} is not a datetime")
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the hourly rollups of the unit and device histories."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", type=utc_datetime,
+                            help="(optional) First hour, e.g. 2024-05-01T00:00Z. The first history row by default.")
+        parser.add_argument("--end", type=utc_datetime,
+                            help="(optional) Last hour. The current hour by default.")
+        parser.add_argument("--days", type=int, default=1,
+                            help="(optional) Days of history aggregated per query. 1 by default.")
+
+    def handle(self, *args, **options):
+        for history_model in rollups.ROLLUPS:
+            written = rollups.backfill(
+                history_model, options["start"], options["end"], timedelta(days=options["days"]))
+            self.stdout.write("%s: %d hourly rollups" % (history_model.__name__, written))
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from monitor import severity_snapshots
+from monitor.management.commands.backfill_rollups import utc_datetime
+from monitor.models import Deployment
+
+
+class Command(BaseCommand):
+    help = "Fills the hourly severity snapshots (area plots) of the past from the status histories."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--deployment", action="append",
+                            help="(optional) Deployment name, can be repeated. Every deployment by default.")
+        parser.add_argument("--start", type=utc_datetime,
+                            help="(optional) First hour, e.g. 2024-05-01T00:00Z. The first history row by default.")
+        parser.add_argument("--end", type=utc_datetime,
+                            help="(optional) Last hour. The current hour by default.")
+        parser.add_argument("--days", type=int, default=7,
+                            help="(optional) Days of history aggregated per query. 7 by default.")
+        parser.add_argument("--restart", action="store_true",
+                            help="(optional) Starts over instead of resuming from the last checkpoint.")
+
+    def handle(self, *args, **options):
+        names = options["deployment"] or list(severity_snapshots.HISTORIES)
+        for deployment in Deployment.objects.filter(name__in=names):
+            written = severity_snapshots.backfill(
+                deployment, options["start"], options["end"], timedelta(days=options["days"]),
+                resume=not options["restart"])
+            self.stdout.write("%s: %d hourly snapshots" % (deployment.name, written))
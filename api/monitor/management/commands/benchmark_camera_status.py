@@ -0,0 +1,70 @@
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from monitor.models import Camera, CameraStatus, Client, Deployment, Device
+from monitor.services import bulk_update_camerastatus_and_history
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Times the camera status upsert of one device while unrelated cameras are added. "
+            "Everything it writes is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cameras", type=int, default=20,
+                            help="(optional) Cameras of the benchmarked device. 20 by default.")
+        parser.add_argument("--unrelated", type=int, nargs="+", default=[0, 1000, 10000],
+                            help="(optional) Total unrelated cameras of each step. 0 1000 10000 by default.")
+        parser.add_argument("--repeat", type=int, default=5,
+                            help="(optional) Upserts timed per step, the best is reported. 5 by default.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.benchmark(options["cameras"], options["unrelated"], options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def add_cameras(self, client, name, count):
+        device = Device.objects.create(name=name, client=client)
+        return Camera.objects.bulk_create(
+            [Camera(name=f"cam{i}", gx=device) for i in range(count)], batch_size=1000)
+
+    def benchmark(self, cameras, steps, repeat):
+        now = datetime.now(tz=pytz.timezone("UTC"))
+        deployment = Deployment.objects.create(name="Camera status benchmark")
+        client = Client.objects.create(name="Camera status benchmark", deployment=deployment)
+        cameras = self.add_cameras(client, "benchmark", cameras)
+
+        unrelated = 0
+        for step in sorted(steps):
+            other = self.add_cameras(client, f"other{step}", step - unrelated)
+            CameraStatus.objects.bulk_create(
+                [CameraStatus(camera=camera, last_update=now) for camera in other], batch_size=1000)
+            unrelated = step
+
+            durations = []
+            for i in range(repeat):
+                timestamp = now + timedelta(minutes=i)
+                status_list = [{'camera': camera, 'last_update': timestamp, 'connected': i % 2 == 0,
+                                'disconnection_time': timedelta(0)} for camera in cameras]
+                history_list = [{'camera': camera, 'register_datetime': timestamp,
+                                 'register_date': timestamp.date(), 'connected': i % 2 == 0,
+                                 'disconnection_time': timedelta(0)} for camera in cameras]
+
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    bulk_update_camerastatus_and_history(status_list, history_list)
+                    durations.append(time.perf_counter() - start)
+
+            self.stdout.write("%d unrelated cameras: %d queries, %.1f ms" % (
+                unrelated, len(queries), min(durations) * 1000))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from monitor import status_intervals
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the status intervals (status timeline) of every gx from its history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100,
+                            help="(optional) Number of gx rebuilt per transaction. 100 by default.")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        for history_model, entity in status_intervals.HISTORIES.items():
+            entity_model = history_model._meta.get_field(entity).related_model
+            # Industry and retail devices share the Device model
+            gx_ids = list(entity_model.objects.filter(Exists(history_model.objects.filter(
+                **{entity: OuterRef("pk")}))).values_list("pk", flat=True))
+
+            created = 0
+            for i in range(0, len(gx_ids), batch_size):
+                with transaction.atomic():
+                    created += status_intervals.rebuild(
+                        history_model, {gx_id: None for gx_id in gx_ids[i:i + batch_size]})
+
+            self.stdout.write("%s: %d gx, %d intervals" % (history_model.__name__, len(gx_ids), created))
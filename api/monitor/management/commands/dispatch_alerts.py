@@ -0,0 +1,29 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from monitor import alerts
+
+
+class Command(BaseCommand):
+    help = "Sends the pending Telegram alerts of the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int,
+                            help="(optional) If set, keeps dispatching every INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        if not options["interval"]:
+            self.stdout.write("%d alerts sent" % alerts.dispatch())
+            return
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+
+        while not stop.is_set():
+            close_old_connections()
+            alerts.dispatch()
+            stop.wait(options["interval"])
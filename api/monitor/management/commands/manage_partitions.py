@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from monitor.partitions import maintain_partitions
+
+
+class Command(BaseCommand):
+    help = "Creates the next monthly partitions of the history tables and drops the expired ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int,
+                            help="(optional) Months of partitions created ahead (MONITOR_PARTITION_MONTHS_AHEAD).")
+        parser.add_argument("--keep-all", action="store_true",
+                            help="If set, no partition is dropped (MONITOR_HISTORY_RETENTION is ignored).")
+
+    def handle(self, *args, **options):
+        report = maintain_partitions(
+            months_ahead=options["months_ahead"],
+            retention={} if options["keep_all"] else None)
+
+        for table, (created, dropped) in report.items():
+            self.stdout.write("%s: %d created, %d dropped" % (table, len(created), len(dropped)))
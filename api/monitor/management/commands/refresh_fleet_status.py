@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from monitor import fleet_status
+from monitor.models import Deployment, FleetStatus
+
+
+class Command(BaseCommand):
+    help = "Writes the fleet status (FleetStatus) of every monitored entity from the current statuses."
+
+    def handle(self, *args, **options):
+        # Deployment name: kind of its gx
+        kinds = {"Safe Driving": FleetStatus.UNIT, "Industry": FleetStatus.DEVICE,
+                 "Smart Buildings": FleetStatus.DEVICE, "Smart Retail": FleetStatus.RETAIL_DEVICE,
+                 "Romberg": FleetStatus.ROMBERG_DEVICE}
+        for name in Deployment.objects.filter(name__in=kinds).values_list("name", flat=True):
+            written = fleet_status.refresh(kinds[name], name)
+            self.stdout.write("%s: %d rows" % (name, written))
+
+        for kind in fleet_status.AWS_STATUSES:
+            written = fleet_status.refresh(kind)
+            self.stdout.write("%s: %d rows" % (kind, written))
@@ -0,0 +1,42 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor.scheduler import Scheduler, get_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Runs the CRONJOBS of the monitor in a single long-running process."
+
+    def add_arguments(self, parser):
+        parser.add_argument("-j", "--job", action="append", dest="jobs",
+                            help="(optional) Name or path of a job to run. Can be repeated. All jobs by default.")
+        parser.add_argument("-w", "--workers", type=int,
+                            help="(optional) Maximum number of jobs running at the same time.")
+        parser.add_argument("--jitter", type=int,
+                            help="(optional) Maximum random delay in seconds before each run.")
+        parser.add_argument("--now", action="store_true",
+                            help="If set, the selected jobs are run once right away and the command exits.")
+
+    def handle(self, *args, **options):
+        jobs = get_jobs(options["jobs"])
+        if not jobs:
+            raise CommandError("No jobs found for %s." % options["jobs"])
+
+        if options["now"]:
+            for job in jobs:
+                job_run = run_job(job)
+                status = self.style.SUCCESS("OK") if job_run.success else self.style.ERROR("FAILED")
+                self.stdout.write("%s %s (%s)" % (job.name, status, job_run.duration))
+            return
+
+        scheduler = Scheduler(jobs, options["workers"], options["jitter"])
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping scheduler, waiting for running jobs...")
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        scheduler.run()
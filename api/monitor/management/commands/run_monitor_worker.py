@@ -0,0 +1,88 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from monitor import work_queue
+from monitor.models import WorkItem
+
+
+SIMULATED_JOB = "monitor.management.commands.run_monitor_worker.simulated_work"
+
+
+def simulated_work(clients=None, seconds=1):
+    # Stands in for a client API call in the benchmark
+    time.sleep(seconds)
+
+
+def _work(burst):
+    # Each process opens its own DB connection
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work_queue.work(burst=burst)
+
+
+class Command(BaseCommand):
+    help = "Runs the per-client items of the monitor work queue (MONITOR_WORK_QUEUE)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("-p", "--processes", type=int, default=1,
+                            help="(optional) Number of worker processes. 1 by default.")
+        parser.add_argument("--burst", action="store_true",
+                            help="If set, the workers exit once the queue is empty.")
+        parser.add_argument("--benchmark", type=int, metavar="ITEMS",
+                            help="(optional) Queues ITEMS simulated items and drains them with "
+                                 "1, 2, 4... up to --processes workers, reporting the throughput.")
+        parser.add_argument("--seconds", type=float, default=0.5,
+                            help="(optional) Duration of each simulated item. 0.5 by default.")
+
+    def run_workers(self, processes, burst):
+        # Connections must not be shared with the forked processes
+        connections.close_all()
+
+        workers = [multiprocessing.Process(target=_work, args=(burst,))
+                   for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+
+        def stop(signum, frame):
+            self.stdout.write("Stopping workers, running items will be retried once their lease expires...")
+            for worker in workers:
+                worker.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        for worker in workers:
+            worker.join()
+
+    def benchmark(self, items, max_processes, seconds):
+        processes = 1
+        while processes <= max_processes:
+            WorkItem.objects.bulk_create([
+                WorkItem(job=SIMULATED_JOB, kwargs={"seconds": seconds})
+                for _ in range(items)
+            ])
+
+            start = time.perf_counter()
+            self.run_workers(processes, burst=True)
+            duration = time.perf_counter() - start
+
+            self.stdout.write("%d processes: %d items in %.2fs (%.1f items/s)" % (
+                processes, items, duration, items / duration))
+            processes *= 2
+
+        WorkItem.objects.filter(job=SIMULATED_JOB).delete()
+
+    def handle(self, *args, **options):
+        if options["benchmark"]:
+            self.benchmark(options["benchmark"], options["processes"], options["seconds"])
+            return
+
+        if options["processes"] == 1:
+            processed = work_queue.work(burst=options["burst"])
+            self.stdout.write("%d items processed" % processed)
+            return
+
+        self.run_workers(options["processes"], options["burst"])
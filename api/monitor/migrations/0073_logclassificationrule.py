@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 09:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0072_alter_gxmodel_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogClassificationRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=50, verbose_name='Categoría')),
+                ('pattern', models.CharField(max_length=255, verbose_name='Patrón')),
+                ('match_type', models.CharField(choices=[('prefix', 'Prefijo'), ('regex', 'Expresión regular')], default='prefix', max_length=10)),
+                ('priority', models.IntegerField(default=0, verbose_name='Prioridad')),
+                ('active', models.BooleanField(default=True, verbose_name='Activo')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('deployment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitor.deployment')),
+                ('gx_model', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='monitor.gxmodel')),
+            ],
+        ),
+    ]
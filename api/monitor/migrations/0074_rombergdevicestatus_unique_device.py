@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 09:48
+
+from django.db import migrations, models
+
+
+def delete_duplicate_statuses(apps, schema_editor):
+    # Keep the most recent status row of each device
+    RombergDeviceStatus = apps.get_model('monitor', 'RombergDeviceStatus')
+    seen = set()
+    for status in RombergDeviceStatus.objects.order_by('device_id', '-last_update', '-id'):
+        if status.device_id in seen:
+            status.delete()
+        else:
+            seen.add(status.device_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0073_logclassificationrule'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_statuses,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rombergdevicestatus',
+            constraint=models.UniqueConstraint(fields=('device',), name='unique_romberg_device_status'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+def delete_duplicate_statuses(apps, schema_editor):
+    # Keep the most recent status row of each camera
+    CameraStatus = apps.get_model('monitor', 'CameraStatus')
+    seen = set()
+    duplicates = []
+    for status_id, camera_id in CameraStatus.objects.order_by(
+            'camera_id', '-last_update', '-id').values_list('id', 'camera_id').iterator():
+        if camera_id in seen:
+            duplicates.append(status_id)
+        else:
+            seen.add(camera_id)
+
+    CameraStatus.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0074_rombergdevicestatus_unique_device'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_statuses,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='camerastatus',
+            constraint=models.UniqueConstraint(fields=('camera',), name='unique_camera_status'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 10:40
+
+from django.conf import settings
+from django.db import migrations
+
+from monitor import partitions
+
+
+def partition_history_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for model, key in partitions.get_models(apps):
+            table = model._meta.db_table
+            if not partitions.is_partitioned(cursor, table):
+                partitions.partition_table(
+                    cursor, table, key, settings.MONITOR_PARTITION_MONTHS_AHEAD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0078_outboxmessage'),
+    ]
+
+    operations = [
+        # Tables stay partitioned if the migration is reverted
+        migrations.RunPython(partition_history_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.2 on 2026-10-18 10:55
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def drop_fk_index(model_name, name, to, index):
+    # The (fk, time) index covers the lookups of the single column index.
+    # Only the index is dropped: AlterField would also drop and re-validate
+    # the foreign key, scanning the whole table.
+    return migrations.SeparateDatabaseAndState(
+        state_operations=[
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=to),
+            ),
+        ],
+        database_operations=[
+            migrations.RunSQL(
+                f'DROP INDEX IF EXISTS "{index}"',
+                f'CREATE INDEX "{index}" ON "monitor_{model_name}" ("{name}_id")',
+            ),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0079_partition_history_tables'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='camerahistory',
+            index=models.Index(fields=['camera', 'register_datetime'], name='camerahistory_camera_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='camerahistory',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['register_datetime'], name='camerahistory_dt_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='devicehistory',
+            index=models.Index(fields=['device', 'register_datetime'], name='devicehistory_device_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='devicehistory',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['register_datetime'], name='devicehistory_dt_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='gxrecord',
+            index=models.Index(fields=['gx', 'register_time'], name='gxrecord_gx_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gxrecord',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['register_time'], name='gxrecord_time_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='loadbalancerhistory',
+            index=models.Index(fields=['elb', 'register_datetime'], name='elbhistory_elb_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rdshistory',
+            index=models.Index(fields=['rds', 'register_datetime'], name='rdshistory_rds_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='retaildevicehistory',
+            index=models.Index(fields=['device', 'register_datetime'], name='retailhistory_device_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rombergdevicehistory',
+            index=models.Index(fields=['device', 'register_datetime'], name='romberghistory_device_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serverhistory',
+            index=models.Index(fields=['server', 'register_datetime'], name='serverhistory_server_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serverhistory',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['register_datetime'], name='serverhistory_dt_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='unithistory',
+            index=models.Index(fields=['unit', 'register_datetime'], name='unithistory_unit_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='unithistory',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['register_datetime'], name='unithistory_dt_brin'),
+        ),
+        drop_fk_index('camerahistory', 'camera', 'monitor.camera', 'monitor_camerahistory_camera_id_8e3424d7'),
+        drop_fk_index('devicehistory', 'device', 'monitor.device', 'monitor_devicehistory_device_id_8f7be677'),
+        drop_fk_index('gxrecord', 'gx', 'monitor.gx', 'monitor_gxrecord_gx_id_25abe2fe'),
+        drop_fk_index('loadbalancerhistory', 'elb', 'monitor.loadbalancer', 'monitor_loadbalancerhistory_elb_id_cf5727d6'),
+        drop_fk_index('rdshistory', 'rds', 'monitor.rds', 'monitor_rdshistory_rds_id_ec2a1caa'),
+        drop_fk_index('retaildevicehistory', 'device', 'monitor.device', 'monitor_retaildevicehistory_device_id_f079e4e3'),
+        drop_fk_index('rombergdevicehistory', 'device', 'monitor.rombergdevice', 'monitor_rombergdevicehistory_device_id_a1cff2a9'),
+        drop_fk_index('serverhistory', 'server', 'monitor.server', 'monitor_serverhistory_server_id_b521c3f4'),
+        drop_fk_index('unithistory', 'unit', 'monitor.unit', 'monitor_unithistory_unit_id_055c5b1b'),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 4.2 on 2026-10-18 11:30
+
+import datetime
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0080_history_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hora')),
+                ('records', models.IntegerField(default=0)),
+                ('severity_counts', models.JSONField(default=dict)),
+                ('description_counts', models.JSONField(default=dict)),
+                ('severity', models.IntegerField(null=True, verbose_name='Severidad')),
+                ('description', models.CharField(blank=True, max_length=100, null=True)),
+                ('total', models.IntegerField(default=0, verbose_name='Total')),
+                ('restart', models.IntegerField(default=0, verbose_name='Restarts')),
+                ('reboot', models.IntegerField(default=0, verbose_name='Reboots')),
+                ('start', models.IntegerField(default=0, verbose_name='Starts')),
+                ('data_validation', models.IntegerField(default=0, verbose_name='Data validations')),
+                ('source_missing', models.IntegerField(default=0, verbose_name='Source ID')),
+                ('camera_connection', models.IntegerField(default=0, verbose_name='Camera')),
+                ('storage_devices', models.IntegerField(default=0, verbose_name='Storage devices')),
+                ('forced_reboot', models.IntegerField(default=0, verbose_name='Forced reboot')),
+                ('read_only_ssd', models.IntegerField(default=0, verbose_name='Read only SSD')),
+                ('ignition', models.IntegerField(default=0)),
+                ('aux', models.IntegerField(default=0)),
+                ('others', models.IntegerField(default=0, verbose_name='Others')),
+                ('unit', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='monitor.unit')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RombergDeviceHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hora')),
+                ('records', models.IntegerField(default=0)),
+                ('severity_counts', models.JSONField(default=dict)),
+                ('description_counts', models.JSONField(default=dict)),
+                ('severity', models.IntegerField(null=True, verbose_name='Severidad')),
+                ('description', models.CharField(blank=True, max_length=100, null=True)),
+                ('device', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='monitor.rombergdevice')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RetailDeviceHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hora')),
+                ('records', models.IntegerField(default=0)),
+                ('severity_counts', models.JSONField(default=dict)),
+                ('description_counts', models.JSONField(default=dict)),
+                ('severity', models.IntegerField(null=True, verbose_name='Severidad')),
+                ('description', models.CharField(blank=True, max_length=100, null=True)),
+                ('device', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='monitor.device')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DeviceHourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hora')),
+                ('records', models.IntegerField(default=0)),
+                ('severity_counts', models.JSONField(default=dict)),
+                ('description_counts', models.JSONField(default=dict)),
+                ('severity', models.IntegerField(null=True, verbose_name='Severidad')),
+                ('description', models.CharField(blank=True, max_length=100, null=True)),
+                ('batch_dropping', models.IntegerField(default=0)),
+                ('camera_connection', models.DurationField(default=datetime.timedelta(0))),
+                ('restart', models.IntegerField(default=0)),
+                ('license', models.IntegerField(default=0)),
+                ('shift_change', models.IntegerField(default=0)),
+                ('others', models.IntegerField(default=0)),
+                ('device', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='monitor.device')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='unithourlyrollup',
+            constraint=models.UniqueConstraint(fields=('unit', 'hour'), name='unique_unit_hourly_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='rombergdevicehourlyrollup',
+            constraint=models.UniqueConstraint(fields=('device', 'hour'), name='unique_romberg_device_hourly_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='retaildevicehourlyrollup',
+            constraint=models.UniqueConstraint(fields=('device', 'hour'), name='unique_retail_device_hourly_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='devicehourlyrollup',
+            constraint=models.UniqueConstraint(fields=('device', 'hour'), name='unique_device_hourly_rollup'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 12:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0081_hourly_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('severity', models.IntegerField(null=True, verbose_name='Severidad')),
+                ('description', models.CharField(blank=True, max_length=100, null=True)),
+                ('start_datetime', models.DateTimeField(verbose_name='Inicio')),
+                ('end_datetime', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('severity_since', models.DateTimeField()),
+                ('gx', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='monitor.gx')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='monitor.gxstatus')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='statusinterval',
+            index=models.Index(fields=['gx', 'start_datetime'], name='statusinterval_gx_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='statusinterval',
+            constraint=models.UniqueConstraint(condition=models.Q(('end_datetime__isnull', True)), fields=('gx',), name='unique_open_status_interval'),
+        ),
+    ]
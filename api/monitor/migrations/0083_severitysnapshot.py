@@ -0,0 +1,73 @@
+# Generated by Django 4.2 on 2026-10-18 12:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_severity_counts(apps, schema_editor):
+    # The hourly SeverityCount rows become snapshots of their 10 minutes, plus
+    # the deployment rows (their sum)
+    SeverityCount = apps.get_model('monitor', 'SeverityCount')
+    SeveritySnapshot = apps.get_model('monitor', 'SeveritySnapshot')
+
+    clients, deployments = {}, {}
+    for count in SeverityCount.objects.order_by('id').iterator(chunk_size=5000):
+        timestamp = count.timestamp.replace(
+            minute=count.timestamp.minute - count.timestamp.minute % 10, second=0, microsecond=0)
+        severities = {f'severity_{severity}': int(value)
+                      for severity, value in (count.severity_counts or {}).items()
+                      if str(severity) in {'0', '1', '2', '3', '4', '5'}}
+        if count.client_id is not None:
+            clients[(count.deployment_id, count.client_id, timestamp)] = severities
+        else:
+            deployments.setdefault((count.deployment_id, timestamp), []).append(severities)
+
+    for (deployment_id, client_id, timestamp), severities in clients.items():
+        deployments.setdefault((deployment_id, timestamp), []).append(severities)
+
+    snapshots = [
+        SeveritySnapshot(deployment_id=deployment_id, client_id=client_id, timestamp=timestamp,
+                         **severities)
+        for (deployment_id, client_id, timestamp), severities in clients.items()
+    ] + [
+        SeveritySnapshot(deployment_id=deployment_id, timestamp=timestamp, **{
+            f'severity_{severity}': sum(row.get(f'severity_{severity}', 0) for row in rows)
+            for severity in range(6)})
+        for (deployment_id, timestamp), rows in deployments.items()
+    ]
+    SeveritySnapshot.objects.bulk_create(snapshots, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0082_statusinterval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeveritySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('severity_0', models.IntegerField(default=0)),
+                ('severity_1', models.IntegerField(default=0)),
+                ('severity_2', models.IntegerField(default=0)),
+                ('severity_3', models.IntegerField(default=0)),
+                ('severity_4', models.IntegerField(default=0)),
+                ('severity_5', models.IntegerField(default=0)),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='monitor.client')),
+                ('deployment', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='monitor.deployment')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='severitysnapshot',
+            constraint=models.UniqueConstraint(fields=('deployment', 'client', 'timestamp'), name='unique_client_severity_snapshot'),
+        ),
+        migrations.AddConstraint(
+            model_name='severitysnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(('client__isnull', True)), fields=('deployment', 'timestamp'), name='unique_deployment_severity_snapshot'),
+        ),
+        migrations.RunPython(copy_severity_counts,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0084_backfillcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deployment',
+            name='generation',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='deployment',
+            name='last_run',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última ejecución'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0085_deployment_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('unit', 'Unidad'), ('device', 'Dispositivo'), ('retail_device', 'Dispositivo Retail'), ('romberg_device', 'Dispositivo Romberg'), ('server', 'Servidor'), ('rds', 'RDS'), ('elb', 'Load balancer')], max_length=20)),
+                ('entity_id', models.IntegerField()),
+                ('deployment', models.CharField(max_length=50, verbose_name='Despliegue')),
+                ('client', models.CharField(blank=True, max_length=50, null=True, verbose_name='Cliente')),
+                ('name', models.CharField(max_length=100, verbose_name='Nombre')),
+                ('severity', models.IntegerField(null=True, verbose_name='Severidad')),
+                ('priority', models.BooleanField(default=False)),
+                ('description', models.CharField(blank=True, max_length=100, null=True)),
+                ('last_update', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Fleet status',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='fleetstatus',
+            index=models.Index(fields=['deployment', '-priority', '-severity', 'name'], name='fleetstatus_problems_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='fleetstatus',
+            constraint=models.UniqueConstraint(fields=('kind', 'entity_id'), name='unique_fleet_status'),
+        ),
+    ]
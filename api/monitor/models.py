@@ -1,3 +1,5 @@
+from django.contrib.postgres.indexes import BrinIndex
+from django.core.exceptions import ValidationError
 from django.db import models
 from datetime import timedelta
 
@@ -5,6 +7,9 @@ from datetime import timedelta
 # Create your models here.
 class Deployment(models.Model):
     name = models.CharField("Despliegue", max_length=50)
+    # Bumped at the end of every status run (monitor.response_cache)
+    generation = models.IntegerField(default=0)
+    last_run = models.DateTimeField("Última ejecución", null=True, blank=True)
 
     def __str__(self):
         return str(self.id) + ' - ' + str(self.name)
@@ -73,7 +78,7 @@ class GxMetric(models.Model):
 
 
 class GxRecord(models.Model):
-    gx = models.ForeignKey(Gx, on_delete=models.CASCADE)
+    gx = models.ForeignKey(Gx, on_delete=models.CASCADE, db_index=False)
     metric = models.ForeignKey(GxMetric, on_delete=models.CASCADE)
     register_time = models.DateTimeField(
         auto_now=False, auto_now_add=False)
@@ -84,6 +89,12 @@ class GxRecord(models.Model):
     min_value = models.IntegerField()
     critical = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["gx", "register_time"], name="gxrecord_gx_time_idx"),
+            BrinIndex(fields=["register_time"], name="gxrecord_time_brin"),
+        ]
+
 
 class Unit(Gx):
 
@@ -117,6 +128,34 @@ class Alert(models.Model):
         return f'{self.gx.client} - {self.alert_type}'
 
 
+class StatusInterval(models.Model):
+    """
+    Period in which a gx had a status, maintained by monitor.status_intervals.
+    The current interval has no end.
+    """
+    gx = models.ForeignKey(Gx, on_delete=models.CASCADE, db_index=False)
+    status = models.ForeignKey(GxStatus, on_delete=models.CASCADE)
+    severity = models.IntegerField("Severidad", null=True)
+    description = models.CharField(max_length=100, null=True, blank=True)
+    start_datetime = models.DateTimeField("Inicio")
+    end_datetime = models.DateTimeField("Fin", null=True, blank=True)
+    # Start of the consecutive intervals with this severity ("status since")
+    severity_since = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["gx", "start_datetime"], name="statusinterval_gx_start_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["gx"], condition=models.Q(end_datetime__isnull=True),
+                name="unique_open_status_interval"),
+        ]
+
+    def __str__(self):
+        return f'{self.gx} - {self.status} ({self.start_datetime} - {self.end_datetime})'
+
+
 class Camera(models.Model):
     name = models.CharField("Nombre", max_length=50)
     gx = models.ForeignKey(Gx, on_delete=models.CASCADE, null=True)
@@ -133,13 +172,17 @@ class CameraStatus(models.Model):
 
     class Meta:
         verbose_name_plural = "Camera status"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["camera"], name="unique_camera_status"),
+        ]
 
     def __str__(self):
         return self.camera.name
 
 
 class CameraHistory(models.Model):
-    camera = models.ForeignKey(Camera, on_delete=models.CASCADE)
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE, db_index=False)
     register_date = models.DateField("Dia registro", db_index=True)
     register_datetime = models.DateTimeField("Fecha registro")
     connected = models.BooleanField(default=True)
@@ -147,6 +190,10 @@ class CameraHistory(models.Model):
 
     class Meta:
         verbose_name_plural = "Camera histories"
+        indexes = [
+            models.Index(fields=["camera", "register_datetime"], name="camerahistory_camera_dt_idx"),
+            BrinIndex(fields=["register_datetime"], name="camerahistory_dt_brin"),
+        ]
 
     def __str__(self):
         return self.camera.name
@@ -185,7 +232,7 @@ class UnitStatus(models.Model):
 
 
 class UnitHistory(models.Model):
-    unit = models.ForeignKey(Unit, on_delete=models.CASCADE)
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE, db_index=False)
     register_date = models.DateField("Dia registro", db_index=True)
     register_datetime = models.DateTimeField("Fecha registro")
     total = models.IntegerField('Total')
@@ -211,6 +258,10 @@ class UnitHistory(models.Model):
 
     class Meta:
         verbose_name_plural = "Unit histories"
+        indexes = [
+            models.Index(fields=["unit", "register_datetime"], name="unithistory_unit_dt_idx"),
+            BrinIndex(fields=["register_datetime"], name="unithistory_dt_brin"),
+        ]
 
     def __str__(self):
         return self.register_datetime.strftime("%Y-%m-%d %H:%M:%S") + ' - ' + str(self.unit.name)
@@ -257,7 +308,7 @@ class DeviceStatus(models.Model):
 
 
 class DeviceHistory(models.Model):
-    device = models.ForeignKey(Device, on_delete=models.CASCADE)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, db_index=False)
     register_date = models.DateField("Dia registro", db_index=True)
     register_datetime = models.DateTimeField("Fecha registro")
     last_connection = models.DateTimeField("Last connection", null=True)
@@ -273,6 +324,10 @@ class DeviceHistory(models.Model):
 
     class Meta:
         verbose_name_plural = "Device histories"
+        indexes = [
+            models.Index(fields=["device", "register_datetime"], name="devicehistory_device_dt_idx"),
+            BrinIndex(fields=["register_datetime"], name="devicehistory_dt_brin"),
+        ]
 
     def __str__(self):
         return self.register_date.strftime("%Y-%m-%d %H:%M:%S") + ' - ' + str(self.device.name)
@@ -298,7 +353,7 @@ class RetailDeviceStatus(models.Model):
 
 
 class RetailDeviceHistory(models.Model):
-    device = models.ForeignKey(Device, on_delete=models.CASCADE)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, db_index=False)
     register_date = models.DateField("Dia registro", db_index=True)
     register_datetime = models.DateTimeField("Fecha registro")
     last_connection = models.DateTimeField("Last connection", null=True)
@@ -310,6 +365,9 @@ class RetailDeviceHistory(models.Model):
 
     class Meta:
         verbose_name_plural = "Retail device histories"
+        indexes = [
+            models.Index(fields=["device", "register_datetime"], name="retailhistory_device_dt_idx"),
+        ]
 
     def __str__(self):
         return self.device.name
@@ -335,10 +393,14 @@ class RombergDeviceStatus(models.Model):
 
     class Meta:
         verbose_name_plural = "Romberg device status"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device"], name="unique_romberg_device_status"),
+        ]
 
 
 class RombergDeviceHistory(models.Model):
-    device = models.ForeignKey(RombergDevice, on_delete=models.CASCADE)
+    device = models.ForeignKey(RombergDevice, on_delete=models.CASCADE, db_index=False)
     register_datetime = models.DateTimeField(
         auto_now=False, auto_now_add=False)
     register_date = models.DateField(db_index=True)
@@ -352,6 +414,9 @@ class RombergDeviceHistory(models.Model):
 
     class Meta:
         verbose_name_plural = "Romberg device histories"
+        indexes = [
+            models.Index(fields=["device", "register_datetime"], name="romberghistory_device_dt_idx"),
+        ]
 
 
 class SeverityCount(models.Model):
@@ -366,6 +431,162 @@ class SeverityCount(models.Model):
         return f'{self.deployment} | {self.client} - {self.timestamp}'
 
 
+class SeveritySnapshot(models.Model):
+    """
+    Number of gx of each severity of a client, or of the whole deployment
+    (no client), every 10 minutes (UTC). Written by monitor.severity_snapshots.
+    """
+    deployment = models.ForeignKey(Deployment, on_delete=models.CASCADE, db_index=False)
+    client = models.ForeignKey(Client, null=True, blank=True, on_delete=models.CASCADE)
+    timestamp = models.DateTimeField()
+    severity_0 = models.IntegerField(default=0)
+    severity_1 = models.IntegerField(default=0)
+    severity_2 = models.IntegerField(default=0)
+    severity_3 = models.IntegerField(default=0)
+    severity_4 = models.IntegerField(default=0)
+    severity_5 = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["deployment", "client", "timestamp"],
+                name="unique_client_severity_snapshot"),
+            models.UniqueConstraint(
+                fields=["deployment", "timestamp"],
+                condition=models.Q(client__isnull=True),
+                name="unique_deployment_severity_snapshot"),
+        ]
+
+    @property
+    def severity_counts(self):
+        # Same format as SeverityCount.severity_counts
+        return {str(severity): getattr(self, f"severity_{severity}") for severity in range(6)}
+
+    def __str__(self):
+        return f'{self.deployment} | {self.client} - {self.timestamp}'
+
+
+class HourlyRollup(models.Model):
+    """
+    Summary of the history rows of an entity in an hour (UTC), maintained by
+    monitor.rollups.
+    """
+    hour = models.DateTimeField("Hora")
+    records = models.IntegerField(default=0)
+    # {severity: count} and {severity: {description: count}}
+    severity_counts = models.JSONField(default=dict)
+    description_counts = models.JSONField(default=dict)
+    # Most common severity and most common description of that severity
+    severity = models.IntegerField("Severidad", null=True)
+    description = models.CharField(max_length=100, null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class UnitHourlyRollup(HourlyRollup):
+    unit = models.ForeignKey(Unit, on_delete=models.CASCADE, db_index=False)
+    total = models.IntegerField('Total', default=0)
+    restart = models.IntegerField('Restarts', default=0)
+    reboot = models.IntegerField('Reboots', default=0)
+    start = models.IntegerField('Starts', default=0)
+    data_validation = models.IntegerField('Data validations', default=0)
+    source_missing = models.IntegerField('Source ID', default=0)
+    camera_connection = models.IntegerField('Camera', default=0)
+    storage_devices = models.IntegerField('Storage devices', default=0)
+    forced_reboot = models.IntegerField('Forced reboot', default=0)
+    read_only_ssd = models.IntegerField('Read only SSD', default=0)
+    ignition = models.IntegerField(default=0)
+    aux = models.IntegerField(default=0)
+    others = models.IntegerField('Others', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["unit", "hour"], name="unique_unit_hourly_rollup"),
+        ]
+
+    def __str__(self):
+        return f'{self.unit} - {self.hour}'
+
+
+class DeviceHourlyRollup(HourlyRollup):
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, db_index=False)
+    batch_dropping = models.IntegerField(default=0)
+    camera_connection = models.DurationField(default=timedelta(0))
+    restart = models.IntegerField(default=0)
+    license = models.IntegerField(default=0)
+    shift_change = models.IntegerField(default=0)
+    others = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device", "hour"], name="unique_device_hourly_rollup"),
+        ]
+
+    def __str__(self):
+        return f'{self.device} - {self.hour}'
+
+
+class RetailDeviceHourlyRollup(HourlyRollup):
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device", "hour"], name="unique_retail_device_hourly_rollup"),
+        ]
+
+    def __str__(self):
+        return f'{self.device} - {self.hour}'
+
+
+class RombergDeviceHourlyRollup(HourlyRollup):
+    device = models.ForeignKey(RombergDevice, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["device", "hour"], name="unique_romberg_device_hourly_rollup"),
+        ]
+
+    def __str__(self):
+        return f'{self.device} - {self.hour}'
+
+
+class LogClassificationRule(models.Model):
+    PREFIX = "prefix"
+    REGEX = "regex"
+    MATCH_TYPE_CHOICES = [
+        (PREFIX, "Prefijo"),
+        (REGEX, "Expresión regular"),
+    ]
+
+    deployment = models.ForeignKey(Deployment, on_delete=models.CASCADE)
+    # Null applies the rule to every model of the deployment
+    gx_model = models.ForeignKey(
+        GxModel, on_delete=models.CASCADE, null=True, blank=True)
+    category = models.CharField("Categoría", max_length=50)
+    pattern = models.CharField("Patrón", max_length=255)
+    match_type = models.CharField(
+        max_length=10, choices=MATCH_TYPE_CHOICES, default=PREFIX)
+    priority = models.IntegerField("Prioridad", default=0)
+    active = models.BooleanField("Activo", default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def clean(self):
+        from .log_classifier import pattern_error
+
+        if self.match_type == self.REGEX:
+            error = pattern_error(self.pattern)
+            if error is not None:
+                raise ValidationError({"pattern": error})
+
+    def __str__(self):
+        return f'{self.deployment.name} | {self.category} - {self.pattern}'
+
+
 class ServerRegion(models.Model):
     name = models.CharField(max_length=50)
 
@@ -444,7 +665,7 @@ class ServerStatus(models.Model):
 
 
 class ServerHistory(models.Model):
-    server = models.ForeignKey(Server, on_delete=models.CASCADE)
+    server = models.ForeignKey(Server, on_delete=models.CASCADE, db_index=False)
     last_launch = models.DateTimeField(auto_now=False, auto_now_add=False)
     register_datetime = models.DateTimeField(
         auto_now=False, auto_now_add=False)
@@ -457,6 +678,10 @@ class ServerHistory(models.Model):
 
     class Meta:
         verbose_name_plural = "Server histories"
+        indexes = [
+            models.Index(fields=["server", "register_datetime"], name="serverhistory_server_dt_idx"),
+            BrinIndex(fields=["register_datetime"], name="serverhistory_dt_brin"),
+        ]
 
 
 class RDSStatus(models.Model):
@@ -476,7 +701,7 @@ class RDSStatus(models.Model):
 
 
 class RDSHistory(models.Model):
-    rds = models.ForeignKey(RDS, on_delete=models.CASCADE)
+    rds = models.ForeignKey(RDS, on_delete=models.CASCADE, db_index=False)
     register_datetime = models.DateTimeField(
         auto_now=False, auto_now_add=False)
     register_date = models.DateField(
@@ -491,6 +716,9 @@ class RDSHistory(models.Model):
 
     class Meta:
         verbose_name_plural = "RDS histories"
+        indexes = [
+            models.Index(fields=["rds", "register_datetime"], name="rdshistory_rds_dt_idx"),
+        ]
 
 
 class LoadBalancer(models.Model):
@@ -522,7 +750,7 @@ class LoadBalancerStatus(models.Model):
 
 
 class LoadBalancerHistory(models.Model):
-    elb = models.ForeignKey(LoadBalancer, on_delete=models.CASCADE)
+    elb = models.ForeignKey(LoadBalancer, on_delete=models.CASCADE, db_index=False)
     register_datetime = models.DateTimeField(
         auto_now=False, auto_now_add=False)
     register_date = models.DateField(
@@ -538,3 +766,143 @@ class LoadBalancerHistory(models.Model):
 
     class Meta:
         verbose_name_plural = "Load balancer histories"
+        indexes = [
+            models.Index(fields=["elb", "register_datetime"], name="elbhistory_elb_dt_idx"),
+        ]
+
+
+class FleetStatus(models.Model):
+    """
+    Current status of every monitored entity (gx, servers, RDS and load
+    balancers), one row each, maintained by monitor.fleet_status for the
+    fleet summary.
+    """
+    UNIT = "unit"
+    DEVICE = "device"
+    RETAIL_DEVICE = "retail_device"
+    ROMBERG_DEVICE = "romberg_device"
+    SERVER = "server"
+    RDS = "rds"
+    ELB = "elb"
+    KIND_CHOICES = [
+        (UNIT, "Unidad"),
+        (DEVICE, "Dispositivo"),
+        (RETAIL_DEVICE, "Dispositivo Retail"),
+        (ROMBERG_DEVICE, "Dispositivo Romberg"),
+        (SERVER, "Servidor"),
+        (RDS, "RDS"),
+        (ELB, "Load balancer"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    entity_id = models.IntegerField()
+    # Names are copied so that the summary does not join other tables
+    deployment = models.CharField("Despliegue", max_length=50)
+    client = models.CharField("Cliente", max_length=50, null=True, blank=True)
+    name = models.CharField("Nombre", max_length=100)
+    severity = models.IntegerField("Severidad", null=True)
+    priority = models.BooleanField(default=False)
+    description = models.CharField(max_length=100, null=True, blank=True)
+    last_update = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Fleet status"
+        indexes = [
+            models.Index(fields=["deployment", "-priority", "-severity", "name"],
+                         name="fleetstatus_problems_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "entity_id"], name="unique_fleet_status"),
+        ]
+
+    def __str__(self):
+        return f'{self.deployment} | {self.name} - {self.severity}'
+
+
+class JobRun(models.Model):
+    job = models.CharField(max_length=100, db_index=True)
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+    success = models.BooleanField(null=True)
+    error = models.TextField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.job} - {self.started_at}'
+
+
+class BackfillCheckpoint(models.Model):
+    # Progress of a long backfill, so that it resumes where it stopped
+    name = models.CharField(max_length=100, unique=True)
+    position = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} - {self.position}'
+
+
+class WorkItem(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pendiente"),
+        (RUNNING, "En ejecución"),
+        (DONE, "Terminado"),
+        (FAILED, "Fallido"),
+    ]
+
+    job = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    deployment = models.ForeignKey(
+        Deployment, on_delete=models.CASCADE, null=True, blank=True)
+    client = models.ForeignKey(
+        Client, on_delete=models.CASCADE, null=True, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    worker = models.CharField(max_length=100, null=True, blank=True)
+    leased_until = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "leased_until"]),
+        ]
+
+    def __str__(self):
+        return f'{self.job} | {self.client} - {self.status}'
+
+
+class OutboxMessage(models.Model):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pendiente"),
+        (SENT, "Enviado"),
+        (FAILED, "Fallido"),
+    ]
+
+    chat = models.CharField(max_length=50)
+    message = models.TextField()
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f'{self.chat} - {self.status} ({self.created_at})'
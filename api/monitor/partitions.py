@@ -0,0 +1,216 @@
+import re
+from datetime import date, datetime
+
+import pytz
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+
+
+# Monthly range partitions (Postgres) of the history tables. Every table has a
+# partition per month named <table>_pYYYYMM plus a default partition, so rows
+# are never rejected; maintain_partitions (cron job and manage_partitions
+# command) creates the partitions of the next months and drops the ones older
+# than the table's retention, instead of deleting rows.
+
+# Model name: partition key
+PARTITIONED_MODELS = {
+    "UnitHistory": "register_datetime",
+    "DeviceHistory": "register_datetime",
+    "CameraHistory": "register_datetime",
+    "RetailDeviceHistory": "register_datetime",
+    "RombergDeviceHistory": "register_datetime",
+    "ServerHistory": "register_datetime",
+    "RDSHistory": "register_datetime",
+    "LoadBalancerHistory": "register_datetime",
+    "GxRecord": "register_time",
+}
+
+
+def month_start(dt) -> date:
+    return date(dt.year, dt.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f'{table}_p{month:%Y%m}'
+
+
+def default_partition_name(table: str) -> str:
+    return f'{table}_default'
+
+
+def get_models(apps=apps):
+    return [(apps.get_model("monitor", name), key) for name, key in PARTITIONED_MODELS.items()]
+
+
+def is_partitioned(cursor, table: str) -> bool:
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table])
+    return cursor.fetchone() is not None
+
+
+def get_partitions(cursor, table: str) -> dict:
+    # {month: partition name} of the monthly partitions of table
+    cursor.execute("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(%s)
+    """, [table])
+
+    partitions = {}
+    pattern = re.compile(rf'^{re.escape(table)}_p(\d{{4}})(\d{{2}})$')
+    for (name,) in cursor.fetchall():
+        match = pattern.match(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def create_partition(cursor, table: str, key: str, month: date):
+    """
+    Creates the partition of month. Rows of that month that are in the default
+    partition are moved to it.
+    """
+    name = partition_name(table, month)
+    default = default_partition_name(table)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{default}" WHERE "{key}" >= %s AND "{key}" < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved', [start, end])
+    cursor.execute(
+        f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)',
+        [start, end])
+
+
+def create_partitions(cursor, table: str, key: str, first: date, last: date) -> list:
+    existing = get_partitions(cursor, table)
+
+    created = []
+    month = first
+    while month <= last:
+        if month not in existing:
+            create_partition(cursor, table, key, month)
+            created.append(partition_name(table, month))
+        month = add_months(month, 1)
+
+    return created
+
+
+def drop_partitions(cursor, table: str, before: date) -> list:
+    # Drops the monthly partitions of the months before `before`
+    dropped = []
+    for month, name in sorted(get_partitions(cursor, table).items()):
+        if month < before:
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+            dropped.append(name)
+
+    return dropped
+
+
+def partition_table(cursor, table: str, key: str, months_ahead: int):
+    """
+    Turns table into a table partitioned by month on key, keeping its rows,
+    indexes, foreign keys and id sequence. The primary key becomes (id, key),
+    as Postgres requires the partition key in unique constraints.
+    """
+    old = f'{table}_old'
+
+    cursor.execute("""
+        SELECT indexrelid, pg_get_indexdef(indexrelid) FROM pg_index
+        WHERE indrelid = %s::regclass AND NOT indisprimary
+    """, [table])
+    indexes = cursor.fetchall()
+    cursor.execute("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = %s::regclass AND contype = 'f'
+    """, [table])
+    foreign_keys = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'", [table])
+    identity = cursor.fetchone()[0] != ""
+
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    # The other indexes and constraints are created once the old table is
+    # dropped, with the same names
+    cursor.execute(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{table}_pkey" TO "{old}_pkey"')
+
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING IDENTITY, '
+        f'CONSTRAINT "{table}_pkey" PRIMARY KEY (id, "{key}")) PARTITION BY RANGE ("{key}")')
+    cursor.execute(
+        f'CREATE TABLE "{default_partition_name(table)}" PARTITION OF "{table}" DEFAULT')
+
+    cursor.execute(f'SELECT min("{key}") FROM "{old}"')
+    first = cursor.fetchone()[0]
+    now = datetime.now(tz=pytz.timezone("UTC"))
+    create_partitions(cursor, table, key, month_start(first or now),
+                      add_months(month_start(now), months_ahead))
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+
+    if identity:
+        cursor.execute(
+            f'SELECT setval(pg_get_serial_sequence(%s, \'id\'), coalesce(max(id), 0) + 1, false) FROM "{old}"',
+            [table])
+    else:
+        # serial column: the sequence is kept and moved to the new table
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY "{table}".id')
+
+    cursor.execute(f'DROP TABLE "{old}"')
+    if identity:
+        # Postgres named the new identity sequence <sequence>1
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        cursor.execute(f'ALTER SEQUENCE {cursor.fetchone()[0]} RENAME TO "{sequence.split(".")[-1]}"')
+
+    for name, definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+
+def maintain_partitions(months_ahead=None, retention=None, now=None) -> dict:
+    """
+    Creates the partitions up to months_ahead months from now and drops the
+    ones older than the retention (months) of each table. retention is
+    {model name: months}; tables without retention are kept forever.
+    Returns {table: (created, dropped)}.
+    """
+    if connection.vendor != "postgresql":
+        return {}
+
+    months_ahead = settings.MONITOR_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    retention = settings.MONITOR_HISTORY_RETENTION if retention is None else retention
+    this_month = month_start(now or datetime.now(tz=pytz.timezone("UTC")))
+
+    report = {}
+    with connection.cursor() as cursor:
+        for model, key in get_models():
+            table = model._meta.db_table
+            if not is_partitioned(cursor, table):
+                print(f"{table} is not partitioned")
+                continue
+
+            with transaction.atomic():
+                created = create_partitions(cursor, table, key, this_month,
+                                            add_months(this_month, months_ahead))
+                dropped = []
+                months = retention.get(model.__name__)
+                if months:
+                    # The current month plus the previous months - 1 are kept
+                    dropped = drop_partitions(cursor, table, add_months(this_month, 1 - months))
+
+            report[table] = (created, dropped)
+            if created or dropped:
+                print(f"{table}: created {created}, dropped {dropped}")
+
+    return report
@@ -1,38 +1,80 @@
+from django.db import transaction
 from django.db.models import Q
 from functools import reduce
 import json
+import os
 from operator import or_
 import pandas as pd
 from datetime import datetime, timedelta
 from collections import defaultdict
+from bisect import bisect_left, bisect_right
 import pytz
 
+from . import rollups, status_intervals
+from .log_spool import LogSpool
 from .selectors import get_unit
 
 from .models import GxStatus, Unit, UnitHistory, UnitTrip
 
-file_path = "./past_logs.json"
-# file_path = "/home/spare/Documents/monitor/monitor-project/api/past_logs.json"
+# Written by older versions, moved to the spool on the next run
+legacy_file_path = "./past_logs.json"
 
 
-def register_logs():
-    with open(file_path, "r") as f:
-        response = json.load(f)
+def spool_legacy_file(spool: LogSpool):
+    if not os.path.exists(legacy_file_path):
+        return
+
+    with open(legacy_file_path, "r") as f:
+        spool.append(pd.DataFrame(json.load(f)))
+    os.remove(legacy_file_path)
+
+
+def count_logs(df: pd.DataFrame, intervals_data):
+    # Logs are counted in the interval that ends after them; timestamps are
+    # UTC-6
+    df["interval"] = (pd.to_datetime(df["Timestamp"].str[:-1], format="ISO8601").dt.floor("10min")
+                      + timedelta(minutes=10) + timedelta(hours=6)).dt.tz_localize("UTC")
+
+    counts = df.groupby(["Unidad", "interval", "Tipo"]).size()
+    for (unit_name, interval_time, log_type), count in counts.items():
+        interval_time = interval_time.to_pydatetime()
+        if log_type == "read_only_ssd":
+            print(f'{unit_name} {interval_time} - Read only SSD')
+
+        intervals_data[unit_name][interval_time]["counts"][log_type] += int(count)
 
-    # df = pd.DataFrame(response["logs"])
-    df = pd.DataFrame(response)
+    disconnections = df[(df["Tipo"] == "camera_missing") &
+                        (df["Log"].str.split().str[1] == "'DISCONNECTED")]
+    cameras = disconnections["Log"].str[:-2].str.split(":").str[2].str.split()
+    for unit_name, interval_time, log_cameras in zip(disconnections["Unidad"],
+                                                     disconnections["interval"], cameras):
+        if isinstance(log_cameras, list):
+            intervals_data[unit_name][interval_time.to_pydatetime()]["disc_cams"].update(
+                log_cameras)
 
-    if df.empty:
+
+def between(datetimes: list, start: datetime, end: datetime) -> range:
+    # Positions of the sorted datetimes with start < datetime < end
+    return range(bisect_right(datetimes, start), bisect_left(datetimes, end))
+
+
+def register_logs():
+    spool = LogSpool()
+    spool_legacy_file(spool)
+    segments = spool.seal()
+
+    if not segments:
         print(
             f'{datetime.now(tz=pytz.timezone("America/Mexico_City")).isoformat(sep=" ", timespec="seconds")} - File is empty')
         return
 
-    df["Timestamp"] = df["Timestamp"].apply(
-        lambda x: datetime.fromisoformat(x[:-1]))
+    with transaction.atomic():
+        register_segments(spool, segments)
+        # Segments are kept if the registration fails
+        transaction.on_commit(lambda: spool.delete(segments))
 
-    df["Fecha_subida"] = df["Fecha_subida"].apply(
-        lambda x: datetime.fromisoformat(x[:-1]))
 
+def register_segments(spool: LogSpool, segments: list):
     intervals_data = defaultdict(lambda: defaultdict(
         lambda: {"counts": defaultdict(int), "disc_cams": set()}))
 
@@ -59,36 +101,13 @@ def register_logs():
     field_to_type = {v: k for k, v in type_to_field.items()}
 
     print("Counting log types per interval...")
-    for i in range(len(df)):
-        log = df.iloc[i]
-        unit_name = log["Unidad"]
-        generation_time = log["Timestamp"]
-        upload_time = log["Fecha_subida"]
-        log_type = log["Tipo"]
-
-        interval_time = (generation_time.replace(
-            minute=generation_time.minute // 10 * 10, second=0) + timedelta(minutes=10)).to_pydatetime()
-        interval_time = (interval_time + timedelta(hours=6)).astimezone(pytz.timezone('UTC')).replace(
-            tzinfo=pytz.timezone('UTC'))
-
-        if log_type == "read_only_ssd":
-            print(f'{unit_name} {interval_time} - Read only SSD')
+    # Only the counts per interval are kept in memory, not the logs
+    for chunk in spool.read_all(segments):
+        count_logs(pd.DataFrame(chunk), intervals_data)
 
-        intervals_data[unit_name][interval_time]["counts"][log_type] += 1
-
-        restarting_loop = False
-        if log_type == "restart" and "Restarting" in log["Log"]:
-            execution_number = int(log["Log"].split()[4])
-            if execution_number > 1:
-                restarting_loop = True
-
-        intervals_data[unit_name][interval_time]["restarting_loop"] = restarting_loop
-
-        if log_type == "camera_missing" and log["Log"].split()[1] == "'DISCONNECTED":
-            cameras = set(log["Log"][:-2].split(":")[2].split())
-
-            intervals_data[unit_name][interval_time]["disc_cams"].update(
-                cameras)
+    if not intervals_data:
+        print("Segments are empty")
+        return
 
     print("Finding and modifying DB instances...")
     created_histories = []
@@ -99,19 +118,41 @@ def register_logs():
     unit_entries = Unit.objects.filter(name__in=unit_names)
     unit_entries_dict = {entry.name: entry for entry in unit_entries}
 
-    for unit_name, interval_time in intervals_data.items():
-        # unit_obj = Unit.objects.get(name=unit_name)
+    changed_entries_by_unit = {}
+    # Histories of each unit, with the counts they have in the DB:
+    # (register datetimes, counts), sorted by register datetime
+    unit_db_histories = {}
 
+    for unit_name, interval_time in intervals_data.items():
+        unit = unit_entries_dict.get(unit_name)
+        if unit is None:
+            print(f'{unit_name} - Unit not found')
+            continue
+
+        # One query per unit for the histories of its intervals and the hour
+        # before them (needed for the new status), and one for its trips
+        first_time, last_time = min(interval_time), max(interval_time)
+        histories = list(UnitHistory.objects.filter(
+            unit=unit,
+            register_datetime__gt=first_time - timedelta(hours=1),
+            register_datetime__lt=last_time + timedelta(minutes=2),
+        ).select_related("status").order_by("register_datetime"))
+        history_datetimes = [history.register_datetime for history in histories]
+        unit_db_histories[unit_name] = (history_datetimes, [
+            {field: getattr(history, field) for field in count_field_names}
+            for history in histories])
+
+        trips = UnitTrip.objects.filter(unit=unit, start_datetime__lt=last_time,
+                                        end_datetime__gt=first_time).values_list(
+            "start_datetime", "end_datetime")
+
+        unit_entries = []
         for time, interval_data in interval_time.items():
 
             unit_history = None
-            try:
-                unit_history = UnitHistory.objects.get(unit__name=unit_name,
-                                                       register_datetime__gt=time,
-                                                       register_datetime__lt=time+timedelta(minutes=2))
-
-            except Exception as e:
-                pass
+            matches = between(history_datetimes, time, time + timedelta(minutes=2))
+            if len(matches) == 1:
+                unit_history = histories[matches[0]]
 
             total = sum([num for log, num in interval_data["counts"].items()
                          if log not in {'Aux', 'Ignición'}])
@@ -125,6 +166,7 @@ def register_logs():
                 unit_history.modified = True
 
                 modified_histories.append(unit_history)
+                unit_entries.append(unit_history)
                 unit_timelines[unit_name][time] = {field: getattr(
                     unit_history, field) for field in count_field_names}
 
@@ -134,14 +176,12 @@ def register_logs():
 
                 unit_timelines[unit_name][time] = count_fields
 
-                trips = UnitTrip.objects.filter(unit__name=unit_name,
-                                                start_datetime__lt=time, end_datetime__gt=time)
-                on_trip = len(trips) > 0
+                on_trip = any(start < time < end for start, end in trips)
 
                 register_time = time.astimezone(
                     pytz.timezone('UTC'))
-                created_histories.append(UnitHistory(
-                    unit=unit_entries_dict[unit_name],
+                unit_history = UnitHistory(
+                    unit=unit,
                     register_datetime=register_time,
                     register_date=register_time.date(),
                     total=total,
@@ -149,14 +189,14 @@ def register_logs():
                     others=0,
                     on_trip=on_trip,
                     modified=True
-                ))
+                )
+                created_histories.append(unit_history)
+                unit_entries.append(unit_history)
 
-    all_new_entries = created_histories + modified_histories
-    all_new_entries.sort(key=lambda x: x.register_datetime)
+        unit_entries.sort(key=lambda x: x.register_datetime)
+        changed_entries_by_unit[unit_name] = unit_entries
 
-    changed_entries_by_unit = defaultdict(list)
-    for entry in all_new_entries:
-        changed_entries_by_unit[entry.unit.name].append(entry)
+    all_new_entries = created_histories + modified_histories
 
     print("Generating new status...")
 
@@ -187,27 +227,19 @@ def register_logs():
                         unit_timelines[unit_name][rounded_t][field]
                         for field, count in last_hour_counts.items()}
                 else:
-                    past_entry = None
-                    # units_and_times.append((unit_name, t))
-                    try:
-                        past_entry = UnitHistory.objects.get(unit__name=unit_name,
-                                                             register_datetime__gt=t -
-                                                             timedelta(
-                                                                 minutes=1),
-                                                             register_datetime__lt=t+timedelta(minutes=1))
-                    except Exception as e:
+                    history_datetimes, history_counts = unit_db_histories[unit_name]
+                    matches = between(history_datetimes, t - timedelta(minutes=1),
+                                      t + timedelta(minutes=1))
 
+                    if len(matches) == 1:
+                        past_counts = history_counts[matches[0]]
+                        for field in count_field_names:
+                            last_hour_counts[field] += past_counts[field]
+                        unit_timelines[unit_name][rounded_t] = dict(past_counts)
+                    else:
                         unit_timelines[unit_name][rounded_t] = {
                             field: 0 for field in count_field_names}
 
-                    if past_entry:
-
-                        for field in count_field_names:
-                            last_hour_counts[field] += getattr(
-                                past_entry, field)
-                            unit_timelines[unit_name][rounded_t][field] = getattr(
-                                past_entry, field)
-
             rounded_time = register_datetime.replace(
                 minute=register_datetime.minute // 10 * 10, second=0, microsecond=0)
 
@@ -257,8 +289,8 @@ def register_logs():
                     status_description = description
                     break
 
-            status = status_dict[(status_severity, status_description)]
-            entry.status = status
+            entry.status = status_dict.get(
+                (status_severity, status_description), entry.status)
 
             # if status_description in {"Read only SSD", "forced reboot (>1)", "Forced reboot reciente"} and status_description != original_description:
             # entry.save()
@@ -268,7 +300,18 @@ def register_logs():
             print(unit_name,
                   f'Before: {original_severity} - {original_description} | After: {status_severity} - {status_description}')
 
-    print(f'\n{datetime.now(tz=pytz.timezone("America/Mexico_City")).isoformat(sep=" ", timespec="seconds")} - Updated {len(all_new_entries)} entries\n\n')
+    UnitHistory.objects.bulk_create(created_histories, batch_size=1000)
+    UnitHistory.objects.bulk_update(
+        modified_histories,
+        count_field_names + ["others", "total", "modified", "status"],
+        batch_size=1000)
+    rollups.refresh(UnitHistory, created_histories + modified_histories)
 
-    with open(file_path, "w") as f:
-        response = json.dump([], f)
+    # The statuses changed in the past, the timelines are rebuilt from there
+    since = {}
+    for history in created_histories + modified_histories:
+        since[history.unit_id] = min(since.get(history.unit_id, history.register_datetime),
+                                     history.register_datetime)
+    status_intervals.rebuild(UnitHistory, since)
+
+    print(f'\n{datetime.now(tz=pytz.timezone("America/Mexico_City")).isoformat(sep=" ", timespec="seconds")} - Updated {len(all_new_entries)} entries\n\n')
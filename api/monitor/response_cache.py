@@ -0,0 +1,90 @@
+import functools
+from datetime import datetime, timezone
+from hashlib import sha1
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Deployment
+
+
+# Responses of the dashboards (status lists, severity counts, area plots, last
+# update) only change when a status run of their deployment finishes. Each
+# deployment has a generation, bumped by the status runs (and by the actions
+# that change the statuses, e.g. setting a gx as inactive); the responses are
+# cached per endpoint, query params and generation, so a bump invalidates
+# every cached response of the deployment at once. The responses carry an
+# ETag and Last-Modified (the end of the last run) and the clients get a 304
+# if their copy is from the current generation.
+
+# Deployment of the URL segment after /api/v1/monitor/
+DEPLOYMENT_PATHS = {
+    "driving": "Safe Driving",
+    "industry": "Industry",
+    "smart-buildings": "Smart Buildings",
+    "retail": "Smart Retail",
+    "romberg": "Romberg",
+}
+
+
+def bump_generation(deployment_id: int, now=None):
+    Deployment.objects.filter(id=deployment_id).update(
+        generation=F("generation") + 1,
+        last_run=now or datetime.now(tz=timezone.utc),
+    )
+
+
+def get_deployment_name(path: str):
+    segments = path.split("/")
+    return DEPLOYMENT_PATHS.get(segments[4]) if len(segments) > 4 else None
+
+
+def run_cached(deployment: str = None):
+    """
+    Caches the responses of an APIView get until the next run of deployment
+    (by default, the deployment of the URL).
+    """
+    def decorator(get):
+        @functools.wraps(get)
+        def wrapper(view, request, *args, **kwargs):
+            run = Deployment.objects.filter(
+                name=deployment or get_deployment_name(request.path),
+            ).values("id", "generation", "last_run").first()
+            if run is None:
+                return get(view, request, *args, **kwargs)
+
+            signature = sha1((request.path + "?" + urlencode(
+                sorted(request.query_params.lists()), doseq=True)).encode()).hexdigest()
+            etag = f'"{run["id"]}-{run["generation"]}-{signature[:16]}"'
+            last_modified = run["last_run"] and int(run["last_run"].timestamp())
+
+            if get_conditional_response(request, etag=etag, last_modified=last_modified):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                cache = caches[settings.MONITOR_RESPONSE_CACHE]
+                key = f"monitor-response:{signature}:{run['id']}:{run['generation']}"
+                data = cache.get(key)
+                if data is not None:
+                    response = Response(data)
+                else:
+                    response = get(view, request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    cache.set(key, response.data, settings.MONITOR_RESPONSE_CACHE_TTL)
+
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+            # Clients revalidate every time
+            patch_cache_control(response, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
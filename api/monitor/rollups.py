@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.functions import Trunc
+
+from .models import (DeviceHistory, DeviceHourlyRollup, RetailDeviceHistory,
+                     RetailDeviceHourlyRollup, RombergDeviceHistory, RombergDeviceHourlyRollup,
+                     UnitHistory, UnitHourlyRollup)
+
+
+# Hourly rollups of the status histories: per entity and hour (UTC), the
+# number of rows of each severity and description, the most common ones and
+# the summed counters. The status runs (StatusUnitOfWork) and the late log job
+# refresh the hours they write by recomputing them from their history rows, so
+# rows updated afterwards are accounted for; the backfill_rollups command
+# rebuilds past hours. The scatter plots and the unit report read the rollups
+# instead of the raw 10 minute rows.
+
+# History model: (rollup model, entity field, summed counters)
+ROLLUPS = {
+    UnitHistory: (UnitHourlyRollup, "unit", [
+        "total", "restart", "reboot", "start", "data_validation", "source_missing",
+        "camera_connection", "storage_devices", "forced_reboot", "read_only_ssd",
+        "ignition", "aux", "others",
+    ]),
+    DeviceHistory: (DeviceHourlyRollup, "device", [
+        "batch_dropping", "camera_connection", "restart", "license", "shift_change", "others",
+    ]),
+    RetailDeviceHistory: (RetailDeviceHourlyRollup, "device", []),
+    RombergDeviceHistory: (RombergDeviceHourlyRollup, "device", []),
+}
+
+
+def hour_start(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def most_common(counts: dict):
+    # Ties go to the smallest key
+    return max(sorted(counts), key=counts.get) if counts else None
+
+
+def _summaries(history_model, queryset) -> dict:
+    """
+    {(entity id, hour): unsaved rollup} of the history rows of queryset,
+    aggregated by the database per hour, severity and description.
+    """
+    rollup_model, entity, counters = ROLLUPS[history_model]
+
+    rows = queryset.filter(status__severity__isnull=False).annotate(
+        hour=Trunc("register_datetime", "hour", tzinfo=timezone.utc),
+    ).values(
+        f"{entity}_id", "hour", "status__severity", "status__description",
+    ).annotate(
+        count=Count("id"), **{counter: Sum(counter) for counter in counters},
+    ).order_by()
+
+    summaries = {}
+    for row in rows:
+        key = (row[f"{entity}_id"], row["hour"])
+        if key not in summaries:
+            summaries[key] = rollup_model(
+                **{f"{entity}_id": key[0]}, hour=key[1], records=0,
+                severity_counts={}, description_counts={},
+                **{counter: rollup_model._meta.get_field(counter).get_default()
+                   for counter in counters})
+        summary = summaries[key]
+
+        severity, description = row["status__severity"], row["status__description"] or ""
+        summary.records += row["count"]
+        summary.severity_counts[severity] = summary.severity_counts.get(severity, 0) + row["count"]
+        descriptions = summary.description_counts.setdefault(severity, {})
+        descriptions[description] = descriptions.get(description, 0) + row["count"]
+        for counter in counters:
+            if row[counter] is not None:
+                setattr(summary, counter, getattr(summary, counter) + row[counter])
+
+    for summary in summaries.values():
+        summary.severity = most_common(summary.severity_counts)
+        summary.description = most_common(summary.description_counts[summary.severity]) or None
+        # Same keys as once loaded from the JSON fields
+        summary.severity_counts = {str(severity): count
+                                   for severity, count in summary.severity_counts.items()}
+        summary.description_counts = {str(severity): descriptions
+                                      for severity, descriptions in summary.description_counts.items()}
+
+    return summaries
+
+
+def _save(history_model, rollups: list):
+    rollup_model, entity, counters = ROLLUPS[history_model]
+    rollup_model.objects.bulk_create(
+        rollups,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=[entity, "hour"],
+        update_fields=["records", "severity_counts", "description_counts",
+                       "severity", "description", *counters],
+    )
+
+
+def refresh(history_model, histories: list) -> int:
+    """
+    Recomputes the rollups of the (entity, hour) of the given history rows,
+    e.g. the rows created or updated by a run. Returns the number of rollups
+    written.
+    """
+    if history_model not in ROLLUPS:
+        return 0
+
+    rollup_model, entity, counters = ROLLUPS[history_model]
+    keys = {(getattr(history, f"{entity}_id"), hour_start(history.register_datetime))
+            for history in histories}
+    if not keys:
+        return 0
+
+    hours = [hour for _, hour in keys]
+    summaries = _summaries(history_model, history_model.objects.filter(
+        **{f"{entity}_id__in": {entity_id for entity_id, _ in keys}},
+        register_datetime__gte=min(hours),
+        register_datetime__lt=max(hours) + timedelta(hours=1),
+    ))
+    rollups = [summaries[key] for key in keys if key in summaries]
+    _save(history_model, rollups)
+
+    # Hours left without rows
+    empty = Q()
+    for key in keys - summaries.keys():
+        empty |= Q(**{f"{entity}_id": key[0], "hour": key[1]})
+    if empty:
+        rollup_model.objects.filter(empty).delete()
+
+    return len(rollups)
+
+
+def backfill(history_model, start=None, end=None, step=timedelta(days=1)) -> int:
+    """
+    Rebuilds the rollups of the hours between start and end (every hour with
+    history rows by default), step by step. Returns the number of rollups
+    written.
+    """
+    start = start or history_model.objects.aggregate(
+        first=Min("register_datetime"))["first"]
+    if start is None:
+        return 0
+    # Whole hours only, a partial hour would overwrite its rollup
+    end = hour_start(end or datetime.now(tz=timezone.utc)) + timedelta(hours=1)
+
+    written = 0
+    since = hour_start(start)
+    while since < end:
+        until = min(since + step, end)
+        summaries = _summaries(history_model, history_model.objects.filter(
+            register_datetime__gte=since, register_datetime__lt=until))
+        _save(history_model, list(summaries.values()))
+        written += len(summaries)
+        since += step
+
+    return written
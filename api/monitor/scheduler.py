@@ -0,0 +1,166 @@
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytz
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .models import JobRun
+
+
+# Long-running replacement for the django_crontab jobs: the CRONJOBS schedules
+# run inside one warm process on a bounded thread pool. A job is skipped while
+# its previous run is still queued or running, and every run is recorded in
+# JobRun with its duration.
+
+
+class CronSchedule:
+    """
+    Five field cron expression (minute hour day month weekday) supporting
+    *, numbers, ranges, lists and steps, e.g. "*/10 * * * *" or "30 9 * * 1-5".
+    """
+
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression: {expression!r}")
+
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)]
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(","):
+            value_range, _, step = part.partition("/")
+            if value_range == "*":
+                start, end = low, high
+            elif "-" in value_range:
+                start, end = map(int, value_range.split("-"))
+            else:
+                start = end = int(value_range)
+                if step:
+                    end = high
+
+            # Sunday can be written as 7
+            if start < low or end > (7 if high == 6 else high) or start > end:
+                raise ValueError(f"Invalid cron field: {field!r}")
+
+            step = int(step) if step else 1
+            values.update(value % 7 if high == 6 else value
+                          for value in range(start, end + 1, step))
+
+        return values
+
+    def matches(self, dt: datetime) -> bool:
+        if dt.minute not in self.minutes or dt.hour not in self.hours or dt.month not in self.months:
+            return False
+
+        day = dt.day in self.days
+        weekday = (dt.weekday() + 1) % 7 in self.weekdays
+        # Same as cron: if both day fields are restricted, either one matches
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+
+class Job:
+    def __init__(self, schedule: str, path: str):
+        self.schedule = CronSchedule(schedule)
+        self.path = path
+        self.name = path.rsplit(".", 1)[-1]
+
+    def __str__(self):
+        return f'{self.schedule.expression} {self.path}'
+
+
+def get_jobs(names=None) -> list:
+    # Jobs are the CRONJOBS entries; the output redirection is not needed here
+    jobs = [Job(cronjob[0], cronjob[1]) for cronjob in settings.CRONJOBS]
+    if names:
+        jobs = [job for job in jobs if job.name in names or job.path in names]
+    return jobs
+
+
+def run_job(job: Job, jitter=0):
+    if jitter:
+        # Spread the jobs that share a schedule
+        time.sleep(random.uniform(0, jitter))
+
+    close_old_connections()
+    job_run = JobRun.objects.create(
+        job=job.path, started_at=datetime.now(tz=pytz.timezone("UTC")))
+
+    try:
+        import_string(job.path)()
+        job_run.success = True
+    except Exception:
+        job_run.success = False
+        job_run.error = traceback.format_exc()
+        print(f"{job.name} failed:\n{job_run.error}")
+    finally:
+        job_run.finished_at = datetime.now(tz=pytz.timezone("UTC"))
+        job_run.duration = job_run.finished_at - job_run.started_at
+        job_run.save()
+        close_old_connections()
+
+    print(f"{job.name} finished in {job_run.duration.total_seconds():.1f}s")
+    return job_run
+
+
+class Scheduler:
+    def __init__(self, jobs: list, max_workers=None, jitter=None):
+        self.jobs = jobs
+        self.max_workers = max_workers or settings.MONITOR_SCHEDULER_WORKERS
+        self.jitter = settings.MONITOR_SCHEDULER_JITTER if jitter is None else jitter
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                           thread_name_prefix="monitor-job")
+        self.running = {}
+        self.stop_event = threading.Event()
+
+    def submit(self, job: Job):
+        future = self.running.get(job.path)
+        if future is not None and not future.done():
+            print(f"{job.name} is still running, skipping this run")
+            return None
+
+        future = self.executor.submit(run_job, job, self.jitter)
+        self.running[job.path] = future
+        return future
+
+    def tick(self, dt: datetime):
+        return [self.submit(job) for job in self.jobs if job.schedule.matches(dt)]
+
+    def run(self):
+        print(f"Scheduler started with {len(self.jobs)} jobs and {self.max_workers} workers")
+        for job in self.jobs:
+            print(f"  {job}")
+
+        next_minute = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+        try:
+            while not self.stop_event.is_set():
+                # Wake up at the start of every minute, like cron (local time)
+                if self.stop_event.wait(max(0, (next_minute - datetime.now()).total_seconds())):
+                    break
+                self.tick(next_minute)
+                next_minute += timedelta(minutes=1)
+
+                # Don't replay the minutes missed if the process was paused
+                now = datetime.now().replace(second=0, microsecond=0)
+                if next_minute < now:
+                    next_minute = now + timedelta(minutes=1)
+        finally:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def stop(self):
+        self.stop_event.set()
@@ -1,9 +1,10 @@
-from .services import EncryptionService
+from .services import EncryptionService, decrypt_api_password
 from .models import *
+from . import identity_map
 from django_filters import rest_framework as rf_filters
 from django.db.models import Q, F, Count, Max, Min
 from datetime import datetime, timedelta
-from django.db.models import Subquery
+from django.db.models import OuterRef, Subquery
 
 
 def get_deployments():
@@ -39,7 +40,7 @@ def get_unit(unit_id: int):
 
 
 def active_unitstatus_list():
-    return UnitStatus.objects.filter(active=True)
+    return UnitStatus.objects.filter(active=True).select_related("status", "unit__client")
 
 
 def get_inactive_units():
@@ -49,7 +50,8 @@ def get_inactive_units():
 
 
 def devicestatus_list(deployment_name: str):
-    return DeviceStatus.objects.filter(device__client__active=True, device__client__deployment__name=deployment_name).order_by("-status__severity")
+    return DeviceStatus.objects.filter(device__client__active=True, device__client__deployment__name=deployment_name) \
+        .select_related("status", "device__client").order_by("-status__severity")
 
 
 def camerastatus_list():
@@ -107,7 +109,8 @@ def get_device_status(device_id: int):
 
 
 def get_or_create_deployment(name: str):
-    deployment, created = Deployment.objects.get_or_create(
+    deployment, created = identity_map.get_or_create(
+        Deployment,
         name=name,
     )
     return deployment
@@ -118,7 +121,8 @@ def get_deployment_clients(deployment_name: str):
 
 
 def get_client(name: str, deployment: str):
-    client = Client.objects.get(
+    client = identity_map.get(
+        Client,
         name=name,
         deployment=deployment
     )
@@ -127,13 +131,14 @@ def get_client(name: str, deployment: str):
 
 def get_or_create_gxstatus(args):
 
-    status_obj, created = GxStatus.objects.get_or_create(**args)
+    status_obj, created = identity_map.get_or_create(GxStatus, **args)
 
     return status_obj
 
 
 def get_or_create_unit(args):
-    unit_obj, created = Unit.objects.get_or_create(
+    unit_obj, created = identity_map.get_or_create(
+        Unit,
         name=args['name'],
         client=args['client']
     )
@@ -141,26 +146,47 @@ def get_or_create_unit(args):
 
 
 def get_or_create_camera(args):
-    camera_obj, created = Camera.objects.get_or_create(
+    camera_obj, created = identity_map.get_or_create(
+        Camera,
         name=args['name'],
         gx=args['gx']
     )
     return camera_obj
 
 
+def get_or_create_cameras(args_list: list):
+    # Creates all the missing cameras with a single query
+    return identity_map.bulk_get_or_create(
+        Camera, [{'name': args['name'], 'gx': args['gx']} for args in args_list])
+
+
 def get_device_by_id(device_id: int):
     return Device.objects.get(id=device_id)
 
 
 def get_or_create_device(args):
-    device, created = Device.objects.get_or_create(
+    device, created = identity_map.get_or_create(
+        Device,
         client_id=args["client"].id,
         name=args["name"]
     )
     return device
 
 
-def get_devices_without_updates(deployment: str):
+def get_or_create_device_cameras(client, device_cameras: dict):
+    # device_cameras is {device_name: {camera_name: ...}}
+    devices = {device_name: get_or_create_device({"client": client, "name": device_name})
+               for device_name in device_cameras}
+    return get_or_create_cameras([{'name': camera_name, 'gx': devices[device_name]}
+                                  for device_name, cameras in device_cameras.items()
+                                  for camera_name in cameras])
+
+
+def get_client_device_models(client_id: int):
+    return dict(Device.objects.filter(client_id=client_id).values_list("name", "model_id"))
+
+
+def get_devices_without_updates(deployment: str, clients=None):
     import pytz
     now = datetime.now(tz=pytz.timezone("UTC"))
 
@@ -170,6 +196,8 @@ def get_devices_without_updates(deployment: str):
         client__active=True,
         client__deployment__name=deployment
     )
+    if clients is not None:
+        devices = devices.filter(client__in=clients)
 
     return devices
 
@@ -247,7 +275,7 @@ def get_unithistory(unit_id: int, filters=None):
 
     logs = UnitHistory.objects.filter(
         unit_id=unit_id,
-    )
+    ).order_by('register_datetime')
 
     return UnitHistoryFilter(filters, logs).qs
 
@@ -282,18 +310,26 @@ def get_devicehistory(device_id: int, filters=None):
 
     logs = DeviceHistory.objects.filter(
         device__id=device_id,
-    )
+    ).order_by('register_datetime')
     return DeviceHistoryFilter(filters, logs).qs
 
 
 def get_or_create_alerttype(description: str):
-    alert_type, created = AlertType.objects.get_or_create(
+    alert_type, created = identity_map.get_or_create(
+        AlertType,
         description=description
     )
 
     return alert_type
 
 
+def get_status_since(gx_id: int):
+    # Start of the current severity of a gx, from its open status interval
+    return StatusInterval.objects.filter(
+        gx_id=gx_id, end_datetime__isnull=True,
+    ).values_list('severity_since', flat=True).first()
+
+
 def get_unit_last_active_status(unit_id):
     last_status = UnitHistory.objects.filter(unit_id=unit_id).exclude(
         Q(status__description="Inactivo") |
@@ -321,20 +357,33 @@ def get_sd_critical_last_day():
 
 
 class SDScatterplotDataFilter(rf_filters.FilterSet):
-    register_datetime = rf_filters.DateFromToRangeFilter()
+    register_datetime = rf_filters.DateFromToRangeFilter(field_name='hour')
 
     class Meta:
-        model = UnitHistory
-        fields = ['register_datetime']
+        model = UnitHourlyRollup
+        fields = []
 
 
 def get_sd_scatterplot_data(unit_id, filters=None):
 
-    logs = UnitHistory.objects.filter(
+    rollups = UnitHourlyRollup.objects.filter(
         unit_id=unit_id,
-    )
+    ).order_by('hour')
+
+    return SDScatterplotDataFilter(filters, rollups).qs
+
+
+def get_unit_description_counts(unit_id: int, severity: int, since: datetime):
+    # [(description, 10 minute records)] of a severity from the hourly
+    # rollups of the hours since `since`, most common first
+    counts = {}
+    for description_counts in UnitHourlyRollup.objects.filter(
+            unit_id=unit_id, hour__gt=since - timedelta(hours=1),
+    ).values_list('description_counts', flat=True):
+        for description, count in description_counts.get(str(severity), {}).items():
+            counts[description] = counts.get(description, 0) + count
 
-    return SDScatterplotDataFilter(filters, logs).qs
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
 
 
 class UnitTripsRangeFilter(rf_filters.FilterSet):
@@ -363,20 +412,20 @@ def get_trips(unit_id: int, filters=None):
 
 
 class IndustryScatterplotDataFilter(rf_filters.FilterSet):
-    register_datetime = rf_filters.DateFromToRangeFilter()
+    register_datetime = rf_filters.DateFromToRangeFilter(field_name='hour')
 
     class Meta:
-        model = DeviceHistory
-        fields = ['register_datetime']
+        model = DeviceHourlyRollup
+        fields = []
 
 
 def get_ind_scatterplot_data(device_id: int, filters=None):
 
-    logs = DeviceHistory.objects.filter(
+    rollups = DeviceHourlyRollup.objects.filter(
         device_id=device_id,
-    )
+    ).order_by('hour')
 
-    return IndustryScatterplotDataFilter(filters, logs).qs
+    return IndustryScatterplotDataFilter(filters, rollups).qs
 
 
 def get_units_severity_counts(client=None):
@@ -424,121 +473,20 @@ class AreaPlotDataFilter(rf_filters.FilterSet):
     timestamp = rf_filters.DateFromToRangeFilter()
 
     class Meta:
-        model = SeverityCount
+        model = SeveritySnapshot
         fields = ['timestamp']
 
 
 def get_area_plot_data(deployment_name, client_name=None, filters=None):
-    client_query = Q()
+    # Snapshots of the client, or the deployment rows (no client)
+    client_query = Q(client__isnull=True)
     if client_name:
         client_query = Q(client__name=client_name)
-    logs = SeverityCount.objects.filter(
+    snapshots = SeveritySnapshot.objects.filter(
         client_query,
         deployment__name=deployment_name).order_by("timestamp")
 
-    return AreaPlotDataFilter(filters, logs).qs
-
-
-def register_sd_area_plot_historicals():
-
-    safe_driving = Deployment.objects.get(name="Safe Driving")
-    clients = get_clients(deployment_name="Safe Driving")
-
-    for client in clients:
-        current_hour = datetime.now().replace(
-            minute=0, second=0, microsecond=0)
-        hour_to_search = current_hour
-        no_data = 0
-
-        all_severity_counts = []
-        while no_data < 100:
-            limit = hour_to_search + timedelta(minutes=1)
-            logs_in_interval = UnitHistory.objects.filter(
-                unit__client=client,
-                register_datetime__range=(hour_to_search, limit))
-
-            severity_count_in_hour = logs_in_interval.values('status__severity') \
-                .annotate(severity=F('status__severity')) \
-                .values('severity') \
-                .annotate(count=Count('id')) \
-                .order_by('-severity')
-
-            if severity_count_in_hour:
-                count_dict = {str(x["severity"]): x["count"]
-                              for x in severity_count_in_hour}
-
-                for n in range(6):
-                    if str(n) not in count_dict:
-                        count_dict[str(n)] = 0
-
-                sd_count_args = {
-                    "deployment": safe_driving,
-                    "client": client,
-                    "timestamp": hour_to_search,
-                    "date": hour_to_search.date(),
-                    "severity_counts": count_dict
-                }
-                all_severity_counts.append(SeverityCount(**sd_count_args))
-
-            hour_to_search -= timedelta(hours=1)
-            if not logs_in_interval:
-                no_data += 1
-            else:
-                no_data = 0
-
-        SeverityCount.objects.bulk_create(all_severity_counts)
-
-
-def register_ind_area_plot_historicals():
-
-    industry = Deployment.objects.get(name="Industry")
-    clients = get_clients("Industry")
-
-    for client in clients:
-        current_hour = datetime.now().replace(
-            minute=0, second=0, microsecond=0)
-        hour_to_search = current_hour
-        no_data = 0
-
-        all_severity_counts = []
-        while no_data < 100:
-            limit = hour_to_search + timedelta(minutes=1)
-            logs_in_interval = DeviceHistory.objects.filter(
-                device__client=client,
-                register_datetime__range=(hour_to_search, limit))
-
-            severity_count_in_hour = logs_in_interval.values('status__severity') \
-                .annotate(severity=F('status__severity')) \
-                .values('severity') \
-                .annotate(count=Count('id')) \
-                .order_by('-severity')
-
-            if severity_count_in_hour:
-                count_dict = {str(x["severity"]): x["count"]
-                              for x in severity_count_in_hour}
-
-                for n in range(6):
-                    if str(n) not in count_dict:
-                        count_dict[str(n)] = 0
-
-                severity_count_args = {
-                    "deployment": industry,
-                    "client": client,
-                    "timestamp": hour_to_search,
-                    "date": hour_to_search.date(),
-                    "severity_counts": count_dict
-                }
-                all_severity_counts.append(
-                    SeverityCount(**severity_count_args))
-                print(severity_count_args)
-
-            hour_to_search -= timedelta(hours=1)
-            if not logs_in_interval:
-                no_data += 1
-            else:
-                no_data = 0
-
-        SeverityCount.objects.bulk_create(all_severity_counts)
+    return AreaPlotDataFilter(filters, snapshots).qs
 
 
 def get_last_sd_update():
@@ -576,10 +524,9 @@ def get_api_credentials(deployment_name, client_id):
             deployment__name=deployment_name, id=client_id)
     except:
         return None
-    encrypt = EncryptionService()
 
     username = client.api_username
-    password = encrypt.decrypt(bytes(client.api_password)).decode('utf-16')
+    password = decrypt_api_password(bytes(client.api_password))
 
     return {"username": username, "password": password}
 
@@ -675,7 +622,7 @@ class ServerStatusFilter(rf_filters.FilterSet):
 
 
 def get_serverstatus_list(filters=None):
-    all_server_status = ServerStatus.objects.filter(active=True)
+    all_server_status = ServerStatus.objects.filter(active=True).select_related("server")
     return ServerStatusFilter(filters, all_server_status).qs
 
 
@@ -796,7 +743,7 @@ class RDSStatusFilter(rf_filters.FilterSet):
 
 
 def get_rdsstatus_list(filters=None):
-    all_rds_status = RDSStatus.objects.all()
+    all_rds_status = RDSStatus.objects.select_related("rds")
     return RDSStatusFilter(filters, all_rds_status).qs
 
 
@@ -939,7 +886,8 @@ def get_load_balancer_history(elb_id: int, filters=None):
 
 
 def retail_device_status_list():
-    return RetailDeviceStatus.objects.filter(active=True).order_by("-status__severity")
+    return RetailDeviceStatus.objects.filter(active=True).select_related(
+        "status", "device__client").order_by("-status__severity")
 
 
 def get_retail_device_status(device_id):
@@ -972,25 +920,25 @@ def get_retail_device_history(args, filters=None):
 
     logs = RetailDeviceHistory.objects.filter(
         device__id=args['device_id'],
-    )
+    ).order_by('register_datetime')
     return RetailDeviceHistoryFilter(filters, logs).qs
 
 
 class RetailScatterplotDataFilter(rf_filters.FilterSet):
-    register_datetime = rf_filters.DateFromToRangeFilter()
+    register_datetime = rf_filters.DateFromToRangeFilter(field_name='hour')
 
     class Meta:
-        model = RetailDeviceHistory
-        fields = ['register_datetime']
+        model = RetailDeviceHourlyRollup
+        fields = []
 
 
 def get_retail_scatterplot_data(args, filters=None):
 
-    logs = RetailDeviceHistory.objects.filter(
+    rollups = RetailDeviceHourlyRollup.objects.filter(
         device_id=args['device_id'],
-    )
+    ).order_by('hour')
 
-    return RetailScatterplotDataFilter(filters, logs).qs
+    return RetailScatterplotDataFilter(filters, rollups).qs
 
 
 def get_retail_devices_severity_counts(client):
@@ -1013,6 +961,23 @@ def get_or_create_open_trip(unit: Unit, start_datetime: datetime):
     return trip, created
 
 
+def get_client_failed_trips(client: Client):
+    # get_unit_failed_trips for all the units of a client in one query
+    latest_active_end_datetime_subquery = UnitTrip.objects.filter(
+        unit_id=OuterRef('unit_id'),
+        active=True,
+    ).order_by('-end_datetime').values('end_datetime')[:1]
+
+    trips = UnitTrip.objects.filter(unit__client=client, active=False, start_datetime__gt=Subquery(
+        latest_active_end_datetime_subquery))
+
+    return trips
+
+
+def get_client_open_trips(client: Client):
+    return UnitTrip.objects.filter(unit__client=client, end_datetime__isnull=True)
+
+
 def get_unit_failed_trips(unit: Unit):
     latest_active_end_datetime_subquery = UnitTrip.objects.filter(
         unit=unit,
@@ -1031,7 +996,8 @@ Romberg
 
 
 def get_or_create_romberg_device(client_id, name, description):
-    device, created = RombergDevice.objects.get_or_create(
+    device, created = identity_map.get_or_create(
+        RombergDevice,
         client_id=client_id,
         name=name,
         defaults={
@@ -1046,7 +1012,8 @@ def get_romberg_device_status(device_id):
 
 
 def get_all_romberg_device_status():
-    return RombergDeviceStatus.objects.filter(active=True).order_by("-status__severity")
+    return RombergDeviceStatus.objects.filter(active=True).select_related(
+        "status", "device__client").order_by("-status__severity")
 
 
 class RombergDeviceHistoryFilter(rf_filters.FilterSet):
@@ -1073,25 +1040,25 @@ def get_romberg_device_history(args, filters=None):
 
     logs = RombergDeviceHistory.objects.filter(
         device__id=args['device_id'],
-    )
+    ).order_by('register_datetime')
     return RombergDeviceHistoryFilter(filters, logs).qs
 
 
 class RombergScatterplotDataFilter(rf_filters.FilterSet):
-    register_datetime = rf_filters.DateFromToRangeFilter()
+    register_datetime = rf_filters.DateFromToRangeFilter(field_name='hour')
 
     class Meta:
-        model = RombergDeviceHistory
-        fields = ['register_datetime']
+        model = RombergDeviceHourlyRollup
+        fields = []
 
 
 def get_romberg_scatterplot_data(args, filters=None):
 
-    logs = RombergDeviceHistory.objects.filter(
+    rollups = RombergDeviceHourlyRollup.objects.filter(
         device_id=args['device_id'],
-    )
+    ).order_by('hour')
 
-    return RombergScatterplotDataFilter(filters, logs).qs
+    return RombergScatterplotDataFilter(filters, rollups).qs
 
 
 def get_romberg_devices_severity_counts(client):
@@ -1,7 +1,9 @@
 from config.env import env
 from .models import *
+from . import identity_map
 from cryptography.fernet import Fernet, MultiFernet
 from datetime import datetime
+from functools import lru_cache
 
 from django.db import OperationalError, transaction
 import time
@@ -24,6 +26,17 @@ class EncryptionService:
         return Fernet.generate_key()
 
 
+@lru_cache(maxsize=None)
+def get_encryption_service() -> EncryptionService:
+    return EncryptionService()
+
+
+@lru_cache(maxsize=256)
+def decrypt_api_password(enc_password: bytes) -> str:
+    # Keyed by the ciphertext, so updated passwords are never served stale
+    return get_encryption_service().decrypt(enc_password).decode('utf-16')
+
+
 def set_api_credentials_in_db():
 
     def get_credentials_from_file(client):
@@ -105,34 +118,23 @@ Cameras
 
 
 def bulk_update_camerastatus(status_list):
-
-    current_cameras = CameraStatus.objects.all()
-    current_camera_ids = {
-        c_status.camera_id: c_status for c_status in current_cameras}
-
-    to_create = []
-    to_update = []
+    # Upserts only the cameras in status_list with a single
+    # INSERT ... ON CONFLICT (camera_id) DO UPDATE
+    camera_statuses = {}
     for status in status_list:
-        if status["camera"].id in current_camera_ids:
-            current_camera = current_camera_ids[status["camera"].id]
-            current_camera.last_update = status['last_update']
-            current_camera.connected = status['connected']
-            current_camera.disconnection_time = status['disconnection_time']
-            to_update.append(current_camera)
-        else:
-            to_create.append(CameraStatus(
-                camera=status["camera"],
-                last_update=status['last_update'],
-                connected=status['connected'],
-                disconnection_time=status['disconnection_time'],
-            ))
-
-    CameraStatus.objects.bulk_update(
-        to_update,
-        fields=['last_update', 'connected', 'disconnection_time']
-    )
+        camera_statuses[status["camera"].id] = CameraStatus(
+            camera=status["camera"],
+            last_update=status['last_update'],
+            connected=status['connected'],
+            disconnection_time=status['disconnection_time'],
+        )
+
     CameraStatus.objects.bulk_create(
-        to_create,
+        camera_statuses.values(),
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['camera'],
+        update_fields=['last_update', 'connected', 'disconnection_time']
     )
 
 
@@ -153,6 +155,12 @@ def bulk_create_camerahistory(history_list):
     )
 
 
+def bulk_update_camerastatus_and_history(status_list, history_list):
+    with transaction.atomic():
+        bulk_update_camerastatus(status_list)
+        bulk_create_camerahistory(history_list)
+
+
 def update_or_create_camerastatus(args, retries=3, delay=1):
     try:
         with transaction.atomic():
@@ -218,11 +226,6 @@ def create_alert(args):
     return alert
 
 
-def create_severity_count(args):
-    severity_count = SeverityCount.objects.create(**args)
-    return severity_count
-
-
 def get_or_create_client(name, keyname, deployment_name, api_username, defaults):
     deployment = Deployment.objects.get(name=deployment_name)
     client = Client.objects.get_or_create(
@@ -316,6 +319,15 @@ def get_or_create_gx_metric(name, model_name):
     return metric
 
 
+def get_or_create_cached_gx_metric(name, model_name):
+    # Status runs only: the identity map is preloaded by each run, while
+    # the web processes would keep serving rows changed by other processes
+    model = identity_map.get(GxModel, name=model_name)
+    metric, created = identity_map.get_or_create(
+        GxMetric, metric_name=name, gx_model=model)
+    return metric
+
+
 def create_gx_records(gx: Gx, records: list):
     new_records = []
     metrics = {}
@@ -326,7 +338,7 @@ def create_gx_records(gx: Gx, records: list):
         metric_name = record["Tipo_unidad"]
 
         if metric_name not in metrics:
-            metrics[metric_name] = get_or_create_gx_metric(
+            metrics[metric_name] = get_or_create_cached_gx_metric(
                 metric_name, model_name=gx.model.name)
 
         metric = metrics[metric_name]
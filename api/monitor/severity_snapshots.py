@@ -0,0 +1,171 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.db.models.functions import Trunc
+
+from .models import (BackfillCheckpoint, Client, Deployment, DeviceHistory, DeviceStatus,
+                     RetailDeviceHistory, RetailDeviceStatus, RombergDeviceHistory,
+                     RombergDeviceStatus, SeveritySnapshot, UnitHistory, UnitStatus)
+
+
+# Severity counts of the area plots: every 10 minutes, the number of gx of
+# each severity per client plus a row for the whole deployment (no client).
+# The status runs take the snapshot of their deployment when they finish, with
+# a single query grouped by client over the current statuses; a run that
+# repeats within the same 10 minutes (e.g. one per client with the work
+# queue) replaces the snapshot. The backfill_severity_snapshots command fills
+# the past hours from the history tables.
+
+SEVERITIES = range(6)
+SEVERITY_FIELDS = [f"severity_{severity}" for severity in SEVERITIES]
+
+# Deployment name: (status model, entity field, filters)
+STATUSES = {
+    "Safe Driving": (UnitStatus, "unit", {"active": True}),
+    "Industry": (DeviceStatus, "device", {}),
+    "Smart Buildings": (DeviceStatus, "device", {}),
+    "Smart Retail": (RetailDeviceStatus, "device", {"active": True}),
+    "Romberg": (RombergDeviceStatus, "device", {"active": True}),
+}
+
+# Deployment name: (history model, entity field)
+HISTORIES = {
+    "Safe Driving": (UnitHistory, "unit"),
+    "Industry": (DeviceHistory, "device"),
+    "Smart Buildings": (DeviceHistory, "device"),
+    "Smart Retail": (RetailDeviceHistory, "device"),
+    "Romberg": (RombergDeviceHistory, "device"),
+}
+
+
+def bucket_start(dt: datetime) -> datetime:
+    dt = dt.astimezone(timezone.utc)
+    return dt.replace(minute=dt.minute - dt.minute % 10, second=0, microsecond=0)
+
+
+def get_counts(deployment: Deployment) -> dict:
+    # {client id: {severity field: count}} of the current statuses
+    status_model, entity, filters = STATUSES[deployment.name]
+
+    rows = status_model.objects.filter(
+        **{f"{entity}__client__deployment": deployment}, **filters,
+    ).values(
+        client_id=F(f"{entity}__client_id"),
+    ).annotate(**{
+        f"severity_{severity}": Count("id", filter=Q(status__severity=severity))
+        for severity in SEVERITIES
+    }).order_by()
+
+    return {row.pop("client_id"): row for row in rows}
+
+
+def register_snapshot(deployment: Deployment, now=None) -> list:
+    """
+    Writes the snapshot of deployment for the 10 minutes of now, replacing
+    the one already there. Returns the rows written, the deployment row last.
+    """
+    if deployment.name not in STATUSES:
+        return []
+
+    timestamp = bucket_start(now or datetime.now(tz=timezone.utc))
+    counts = get_counts(deployment)
+
+    snapshots = [
+        SeveritySnapshot(deployment=deployment, client_id=client_id, timestamp=timestamp,
+                         **counts.get(client_id, {}))
+        for client_id in Client.objects.filter(deployment=deployment).values_list("id", flat=True)
+    ]
+    snapshots.append(SeveritySnapshot(
+        deployment=deployment, timestamp=timestamp,
+        **{field: sum(getattr(snapshot, field) for snapshot in snapshots)
+           for field in SEVERITY_FIELDS}))
+
+    with transaction.atomic():
+        # Runs of the same deployment write one at a time
+        Deployment.objects.select_for_update().filter(id=deployment.id).first()
+        SeveritySnapshot.objects.filter(deployment=deployment, timestamp=timestamp).delete()
+        SeveritySnapshot.objects.bulk_create(snapshots)
+
+    return snapshots
+
+
+def _history_snapshots(deployment: Deployment, since: datetime, until: datetime) -> list:
+    """
+    Unsaved snapshots of the hours between since and until, from the rows of
+    the first status run of each hour, aggregated by the database per client
+    and hour. The hours without rows have no snapshots.
+    """
+    history_model, entity = HISTORIES[deployment.name]
+
+    rows = history_model.objects.filter(
+        **{f"{entity}__client__deployment": deployment},
+        register_datetime__gte=since,
+        register_datetime__lt=until,
+        # One run every 10 minutes: each gx counts once per hour
+        register_datetime__minute__lt=10,
+    ).annotate(
+        hour=Trunc("register_datetime", "hour", tzinfo=timezone.utc),
+    ).values(
+        "hour", client_id=F(f"{entity}__client_id"),
+    ).annotate(**{
+        f"severity_{severity}": Count(f"{entity}_id", distinct=True,
+                                      filter=Q(status__severity=severity))
+        for severity in SEVERITIES
+    }).order_by()
+
+    snapshots = []
+    totals = defaultdict(lambda: dict.fromkeys(SEVERITY_FIELDS, 0))
+    for row in rows:
+        snapshots.append(SeveritySnapshot(deployment=deployment, timestamp=row.pop("hour"), **row))
+        row.pop("client_id")
+        for field, count in row.items():
+            totals[snapshots[-1].timestamp][field] += count
+
+    snapshots += [SeveritySnapshot(deployment=deployment, timestamp=hour, **counts)
+                  for hour, counts in totals.items()]
+    return snapshots
+
+
+def backfill(deployment: Deployment, start=None, end=None, step=timedelta(days=7),
+             resume=True) -> int:
+    """
+    Writes the hourly snapshots of deployment between start (the first
+    history row by default) and end (now), from the most recent hours back,
+    step by step. Snapshots already there are kept. The progress is saved
+    after every step; with resume, the backfill continues from there.
+    Returns the number of snapshots computed.
+    """
+    if deployment.name not in HISTORIES:
+        return 0
+
+    history_model, entity = HISTORIES[deployment.name]
+    name = f"severity_snapshots.backfill:{deployment.name}"
+
+    until = (end or datetime.now(tz=timezone.utc)).astimezone(timezone.utc).replace(
+        minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    checkpoint = BackfillCheckpoint.objects.filter(name=name).first() if resume else None
+    if checkpoint is not None:
+        until = min(until, checkpoint.position)
+
+    start = start or history_model.objects.filter(
+        **{f"{entity}__client__deployment": deployment},
+    ).aggregate(first=Min("register_datetime"))["first"]
+    if start is None:
+        return 0
+    # Whole hours only
+    start = start.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    written = 0
+    while until > start:
+        since = max(until - step, start)
+        snapshots = _history_snapshots(deployment, since, until)
+        with transaction.atomic():
+            SeveritySnapshot.objects.bulk_create(snapshots, batch_size=1000, ignore_conflicts=True)
+            BackfillCheckpoint.objects.update_or_create(name=name, defaults={"position": since})
+        written += len(snapshots)
+        until = since
+
+    BackfillCheckpoint.objects.filter(name=name).delete()
+    return written
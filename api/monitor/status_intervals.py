@@ -0,0 +1,150 @@
+from collections import defaultdict
+from itertools import groupby
+
+from django.db.models import Q
+
+from .models import (DeviceHistory, RetailDeviceHistory, RombergDeviceHistory, StatusInterval,
+                     UnitHistory)
+
+
+# Status timeline of every gx: one StatusInterval per period with the same
+# status, the current one open (no end). The status runs (StatusUnitOfWork)
+# append their history rows, closing the open interval when the status
+# changes; rows written in the past (the late log job) rebuild the intervals
+# from that point on, as does the build_status_intervals command. "Status
+# since" is the severity_since of the open interval.
+
+# History model: entity field (a gx)
+HISTORIES = {
+    UnitHistory: "unit",
+    DeviceHistory: "device",
+    RetailDeviceHistory: "device",
+    RombergDeviceHistory: "device",
+}
+
+
+def _open(gx_id: int, history, previous):
+    status = history.status
+    severity_since = history.register_datetime
+    if previous is not None and previous.severity == status.severity:
+        severity_since = previous.severity_since
+
+    return StatusInterval(
+        gx_id=gx_id, status=status, severity=status.severity, description=status.description,
+        start_datetime=history.register_datetime, severity_since=severity_since)
+
+
+def _append(gx_id: int, current, histories, updated: dict, created: list):
+    """
+    Appends the history rows (oldest first) to the timeline whose last
+    interval is current. Closed intervals that already exist are added to
+    updated, new ones to created.
+    """
+    for history in histories:
+        if history.status_id is None:
+            continue
+        if current is not None:
+            if history.register_datetime < current.start_datetime or history.status_id == current.status_id:
+                continue
+            current.end_datetime = history.register_datetime
+            if current.pk:
+                updated[current.pk] = current
+
+        current = _open(gx_id, history, current)
+        created.append(current)
+
+
+def _save(updated: dict, created: list):
+    StatusInterval.objects.bulk_update(updated.values(), ["end_datetime"], batch_size=1000)
+    StatusInterval.objects.bulk_create(created, batch_size=1000)
+
+
+def record(history_model, histories: list) -> int:
+    """
+    Appends new history rows, e.g. the rows of a status run, to the
+    timelines of their gx. Returns the number of intervals opened.
+    """
+    if history_model not in HISTORIES:
+        return 0
+
+    entity = HISTORIES[history_model]
+    by_gx = defaultdict(list)
+    for history in histories:
+        by_gx[getattr(history, f"{entity}_id")].append(history)
+    if not by_gx:
+        return 0
+
+    open_intervals = {interval.gx_id: interval for interval in StatusInterval.objects.filter(
+        gx_id__in=by_gx, end_datetime__isnull=True)}
+
+    updated, created = {}, []
+    for gx_id, gx_histories in by_gx.items():
+        _append(gx_id, open_intervals.get(gx_id),
+                sorted(gx_histories, key=lambda history: history.register_datetime),
+                updated, created)
+
+    _save(updated, created)
+    return len(created)
+
+
+def rebuild(history_model, since: dict) -> int:
+    """
+    Rebuilds the timelines of {gx id: datetime} from the interval that
+    contains the datetime on (the whole timeline if it is None), e.g. after
+    past history rows were created or updated. Returns the number of
+    intervals opened.
+    """
+    if history_model not in HISTORIES or not since:
+        return 0
+
+    entity = HISTORIES[history_model]
+    intervals = StatusInterval.objects.filter(gx_id__in=since)
+    if None not in since.values():
+        intervals = intervals.filter(
+            Q(end_datetime__isnull=True) | Q(end_datetime__gt=min(since.values())))
+
+    # The intervals that end after `since` are replaced, starting from the
+    # one that contains it. Timelines without intervals are built whole.
+    replay_from = {gx_id: None for gx_id in since}
+    stale = []
+    for interval in intervals:
+        gx_since = since[interval.gx_id]
+        if gx_since is None or interval.end_datetime is None or interval.end_datetime > gx_since:
+            stale.append(interval.id)
+            if gx_since is not None:
+                replay_from[interval.gx_id] = min(replay_from[interval.gx_id] or gx_since,
+                                                  interval.start_datetime)
+
+    # The interval before is reopened, the replayed rows may continue it
+    previous_query = Q()
+    for gx_id, start in replay_from.items():
+        if start is not None:
+            previous_query |= Q(gx_id=gx_id, end_datetime=start)
+    previous = {}
+    if previous_query:
+        previous = {interval.gx_id: interval
+                    for interval in StatusInterval.objects.filter(previous_query)}
+
+    StatusInterval.objects.filter(id__in=stale).delete()
+
+    histories = history_model.objects.filter(
+        **{f"{entity}_id__in": since}, status__isnull=False,
+    ).select_related("status").order_by(f"{entity}_id", "register_datetime")
+    if None not in replay_from.values():
+        histories = histories.filter(register_datetime__gte=min(replay_from.values()))
+
+    updated, created = {}, []
+    for interval in previous.values():
+        interval.end_datetime = None
+        updated[interval.pk] = interval
+
+    for gx_id, gx_histories in groupby(histories.iterator(chunk_size=5000),
+                                       key=lambda history: getattr(history, f"{entity}_id")):
+        start = replay_from[gx_id]
+        _append(gx_id, previous.get(gx_id),
+                (history for history in gx_histories
+                 if start is None or history.register_datetime >= start),
+                updated, created)
+
+    _save(updated, created)
+    return len(created)
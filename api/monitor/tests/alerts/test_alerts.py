@@ -0,0 +1,113 @@
+from django.test import TestCase, override_settings
+from monitor import alerts
+from monitor.models import OutboxMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import json
+import threading
+
+
+class TelegramStub(BaseHTTPRequestHandler):
+    # Replies with the queued (status, body) responses, then with 200
+    requests = []
+    responses = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        TelegramStub.requests.append((self.path, body))
+
+        status, response = TelegramStub.responses.pop(0) if TelegramStub.responses \
+            else (200, {"ok": True})
+        data = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@mock.patch.dict("os.environ", {"INDUSTRY_CHAT": "-100", "AWS_CHAT": "-200"})
+class AlertsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        TelegramStub.requests.clear()
+        TelegramStub.responses.clear()
+        settings = override_settings(
+            MONITOR_ALERTS=True,
+            TELEGRAM_BOT="token",
+            TELEGRAM_API_URL=f"http://127.0.0.1:{self.server.server_address[1]}",
+            MONITOR_ALERT_MAX_ATTEMPTS=2,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_messages_are_coalesced_per_chat(self):
+        for i in range(3):
+            alerts.queue("INDUSTRY_CHAT", f"Device {i} failed")
+        alerts.queue("AWS_CHAT", "CRÍTICO: EC2 server")
+
+        self.assertEqual(alerts.dispatch(), 4)
+
+        self.assertEqual(sorted(TelegramStub.requests, key=lambda r: r[1]["chat_id"]), [
+            ("/bottoken/sendMessage",
+             {"chat_id": "-100", "text": "Device 0 failed\n\nDevice 1 failed\n\nDevice 2 failed"}),
+            ("/bottoken/sendMessage", {"chat_id": "-200", "text": "CRÍTICO: EC2 server"}),
+        ])
+        self.assertFalse(OutboxMessage.objects.exclude(status=OutboxMessage.SENT).exists())
+        self.assertEqual(alerts.dispatch(), 0)
+
+    def test_digests_fit_telegram_limit(self):
+        messages = [OutboxMessage(message="a" * 3000), OutboxMessage(message="b" * 3000),
+                    OutboxMessage(message="c" * 5000)]
+
+        digests = list(alerts._digests(messages))
+
+        self.assertEqual([(len(text), done) for text, done in digests], [
+            (3000, messages[:1]), (3000, messages[1:2]), (4096, []), (904, messages[2:])])
+
+    def test_rate_limit_backoff(self):
+        alerts.queue("INDUSTRY_CHAT", "Device 0 failed")
+        TelegramStub.responses.append(
+            (429, {"ok": False, "parameters": {"retry_after": 60}}))
+
+        self.assertEqual(alerts.dispatch(), 0)
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.status, OutboxMessage.PENDING)
+        self.assertEqual(message.attempts, 0)
+        self.assertGreater((message.next_attempt_at - message.created_at).total_seconds(), 59)
+        # Not due yet
+        self.assertEqual(alerts.dispatch(), 0)
+        self.assertEqual(len(TelegramStub.requests), 1)
+
+    def test_failed_messages_are_retried(self):
+        alerts.queue("INDUSTRY_CHAT", "Device 0 failed")
+        TelegramStub.responses.extend([(500, {"ok": False}), (500, {"ok": False})])
+
+        alerts.dispatch()
+        OutboxMessage.objects.update(next_attempt_at=OutboxMessage.objects.get().created_at)
+        alerts.dispatch()
+
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.status, OutboxMessage.FAILED)
+        self.assertEqual(message.attempts, 2)
+        self.assertEqual(len(TelegramStub.requests), 2)
+
+    def test_alerts_disabled(self):
+        with override_settings(MONITOR_ALERTS=False):
+            self.assertIsNone(alerts.queue("INDUSTRY_CHAT", "Device 0 failed"))
+        self.assertFalse(OutboxMessage.objects.exists())
@@ -0,0 +1,55 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from monitor.services import bulk_update_camerastatus_and_history
+from monitor.models import *
+from datetime import datetime, timedelta
+import pytz
+
+
+class CameraStatusTest(TestCase):
+    def setUp(self) -> None:
+        self.now = datetime.now(tz=pytz.timezone("UTC"))
+        deployment = Deployment.objects.create(name="Industry")
+        self.client = Client.objects.create(name="Test", deployment=deployment)
+        self.device = Device.objects.create(name="d0", client=self.client)
+        self.cameras = Camera.objects.bulk_create(
+            [Camera(name=f"cam{i}", gx=self.device) for i in range(20)])
+
+        return super().setUp()
+
+    def write_batch(self, connected=True):
+        status_list = [{'camera': camera, 'last_update': self.now, 'connected': connected,
+                        'disconnection_time': timedelta(0)} for camera in self.cameras]
+        history_list = [{'camera': camera, 'register_datetime': self.now, 'register_date': self.now.date(),
+                         'connected': connected, 'disconnection_time': timedelta(0)} for camera in self.cameras]
+
+        with CaptureQueriesContext(connection) as queries:
+            bulk_update_camerastatus_and_history(status_list, history_list)
+
+        return len(queries)
+
+    def add_unrelated_cameras(self, count):
+        device = Device.objects.create(name=f"other{count}", client=self.client)
+        cameras = Camera.objects.bulk_create(
+            [Camera(name=f"cam{i}", gx=device) for i in range(count)])
+        CameraStatus.objects.bulk_create(
+            [CameraStatus(camera=camera, last_update=self.now) for camera in cameras])
+
+    def test_upsert(self):
+        self.write_batch(connected=True)
+        self.write_batch(connected=False)
+
+        self.assertEqual(CameraStatus.objects.count(), 20)
+        self.assertFalse(CameraStatus.objects.filter(connected=True).exists())
+        self.assertEqual(CameraHistory.objects.count(), 40)
+
+    def test_queries_do_not_depend_on_unrelated_cameras(self):
+        queries = []
+        for unrelated in [0, 1000, 10000]:
+            self.add_unrelated_cameras(unrelated)
+            queries.append(self.write_batch())
+
+        # Same statements no matter how many other cameras there are; the
+        # timings are measured by the benchmark_camera_status command
+        self.assertEqual(len(set(queries)), 1)
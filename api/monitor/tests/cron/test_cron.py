@@ -5,8 +5,12 @@ from monitor.models import *
 
 
 def set_default(obj):
+    from datetime import datetime
+
     if isinstance(obj, set):
         return list(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
     raise TypeError
 
 
@@ -0,0 +1,129 @@
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from monitor import apis, fleet_status
+from monitor.models import *
+from monitor.tests.utils.units import unit_counts
+from datetime import datetime, timedelta
+import pytz
+
+
+class FleetStatusTest(TestCase):
+    def setUp(self):
+        self.now = datetime(2024, 5, 2, 12, 0, tzinfo=pytz.utc)
+        self.driving, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        self.industry, _ = Deployment.objects.get_or_create(name="Industry")
+        self.unit_client = Client.objects.create(name="Fleet units", keyname="fleetunits",
+                                                 deployment=self.driving)
+        self.device_client = Client.objects.create(name="Fleet devices", keyname="fleetdevices",
+                                                   deployment=self.industry)
+        self.statuses = {severity: GxStatus.objects.create(
+            deployment=self.driving, severity=severity, priority=severity == 2,
+            description=f"Severidad {severity}") for severity in range(6)}
+        self.device_statuses = {severity: GxStatus.objects.create(
+            deployment=self.industry, severity=severity, description=f"Severidad {severity}")
+            for severity in [1, 3]}
+
+    def create_unit(self, name, severity, active=True):
+        unit = Unit.objects.create(name=name, client=self.unit_client)
+        UnitStatus.objects.create(unit=unit, status=self.statuses[severity], active=active,
+                                  last_update=self.now, **unit_counts())
+        return unit
+
+    def create_device(self, name, severity):
+        device = Device.objects.create(name=name, client=self.device_client)
+        DeviceStatus.objects.create(
+            device=device, status=self.device_statuses[severity], last_update=self.now,
+            batch_dropping=0, camera_connection=timedelta(0), restart=0, license=0,
+            shift_change=0, others=0)
+        return device
+
+    def create_server(self, name, critical):
+        server = Server.objects.create(name=name, server_type="t3.large", aws_id=f"i-{name}")
+        ServerStatus.objects.create(server=server, last_launch=self.now, last_activity=self.now,
+                                    state="running", activity_data={}, critical=critical)
+        return server
+
+    def test_refresh(self):
+        units = [self.create_unit(f"Unit {i}", severity)
+                 for i, severity in enumerate([1, 1, 3, 5])]
+        self.create_unit("Inactive unit", 5, active=False)
+
+        self.assertEqual(fleet_status.refresh(FleetStatus.UNIT, "Safe Driving"), 4)
+        row = FleetStatus.objects.get(kind=FleetStatus.UNIT, entity_id=units[3].id)
+        self.assertEqual((row.deployment, row.client, row.name, row.severity, row.description),
+                         ("Safe Driving", "Fleet units", "Unit 3", 5, "Severidad 5"))
+
+        # Updated in place, and the entities no longer monitored are removed
+        UnitStatus.objects.filter(unit=units[3]).update(status=self.statuses[1])
+        UnitStatus.objects.filter(unit=units[0]).update(active=False)
+        # Statuses, the upsert and the delete, whatever the number of units
+        with self.assertNumQueries(6):
+            fleet_status.refresh(FleetStatus.UNIT, "Safe Driving")
+        self.assertEqual(
+            sorted(FleetStatus.objects.values_list("entity_id", "severity")),
+            sorted([(units[1].id, 1), (units[2].id, 3), (units[3].id, 1)]))
+        self.assertEqual(FleetStatus.objects.get(entity_id=units[3].id).id, row.id)
+
+    def test_refresh_aws(self):
+        servers = [self.create_server("web", False), self.create_server("db", True)]
+        fleet_status.refresh(FleetStatus.SERVER)
+
+        self.assertEqual(
+            sorted(FleetStatus.objects.values_list("deployment", "name", "severity", "description")),
+            [("AWS", "db", 5, "running"), ("AWS", "web", 1, "running")])
+
+        ServerStatus.objects.filter(server=servers[0]).update(active=False)
+        fleet_status.refresh(FleetStatus.SERVER)
+        self.assertEqual(list(FleetStatus.objects.values_list("name", flat=True)), ["db"])
+
+    def test_summary(self):
+        for i, severity in enumerate([1, 1, 3, 3, 5, 2]):
+            self.create_unit(f"Unit {i}", severity)
+        for i, severity in enumerate([1, 3, 3]):
+            self.create_device(f"Device {i}", severity)
+        self.create_server("db", True)
+        fleet_status.refresh(FleetStatus.UNIT, "Safe Driving")
+        fleet_status.refresh(FleetStatus.DEVICE, "Industry")
+        fleet_status.refresh(FleetStatus.SERVER)
+
+        with self.assertNumQueries(1):
+            summary = fleet_status.summary(top=3)
+
+        self.assertEqual([deployment["deployment"] for deployment in summary],
+                         ["AWS", "Industry", "Safe Driving"])
+        driving = summary[2]
+        self.assertEqual(driving["total"], 6)
+        self.assertEqual(driving["severity_counts"], {"1": 2, "2": 1, "3": 2, "5": 1})
+        self.assertEqual(driving["kinds"], {"unit": 6})
+        self.assertEqual([(row["severity"], row["count"]) for row in driving["breakdown"]],
+                         [(5, 1), (3, 2), (2, 1), (1, 2)])
+        # Priority first, then severity and name
+        self.assertEqual([row.name for row in driving["top_problems"]],
+                         ["Unit 5", "Unit 4", "Unit 2"])
+
+        # Working devices are not problems
+        industry = summary[1]
+        self.assertEqual(industry["severity_counts"], {"1": 1, "3": 2})
+        self.assertEqual([row.name for row in fleet_status.summary(top=5)[1]["top_problems"]],
+                         ["Device 1", "Device 2"])
+
+    def test_summary_api(self):
+        self.create_unit("Unit 0", 5)
+        fleet_status.refresh(FleetStatus.UNIT, "Safe Driving")
+
+        request = APIRequestFactory().get("/api/v1/monitor/fleet/summary/", {"top": 1})
+        response = apis.FleetSummaryAPI.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]["deployment"], "Safe Driving")
+        self.assertEqual(response.data[0]["breakdown"][0]["count"], 1)
+        self.assertEqual(response.data[0]["top_problems"][0]["client"], "Fleet units")
+
+    def test_set_inactive_removes_the_unit(self):
+        unit = self.create_unit("Unit 0", 5)
+        fleet_status.refresh(FleetStatus.UNIT, "Safe Driving")
+
+        request = APIRequestFactory().post("/")
+        apis.SetUnitAsInactiveAPI.as_view()(request, unit_id=unit.id)
+
+        self.assertFalse(FleetStatus.objects.exists())
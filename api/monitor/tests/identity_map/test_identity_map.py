@@ -0,0 +1,67 @@
+from django.test import TestCase
+from monitor import identity_map
+from monitor.selectors import *
+from monitor.services import get_or_create_cached_gx_metric, get_or_create_gx_metric
+from monitor.models import *
+
+
+class IdentityMapTest(TestCase):
+    def setUp(self) -> None:
+        identity_map.clear()
+        self.deployment = Deployment.objects.create(name="Romberg")
+        self.client = Client.objects.create(
+            name="Test", deployment=self.deployment)
+        self.gx_model, created = GxModel.objects.get_or_create(name="Orin")
+        self.devices = [RombergDevice.objects.create(name=f"d{i}", client=self.client, model=self.gx_model)
+                        for i in range(10)]
+        Camera.objects.create(name="cam0", gx=self.devices[0])
+        GxMetric.objects.create(metric_name="temp", gx_model=self.gx_model)
+
+        return super().setUp()
+
+    def test_preloaded_rows_need_no_queries(self):
+        identity_map.preload_deployment(self.deployment)
+        identity_map.preload_client(self.client)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_or_create_deployment("Romberg"), self.deployment)
+            self.assertEqual(get_client("Test", self.deployment), self.client)
+            for device in self.devices:
+                self.assertEqual(get_or_create_romberg_device(
+                    self.client.id, device.name, ""), device)
+            get_or_create_camera({'name': "cam0", 'gx': self.devices[0]})
+            get_or_create_cached_gx_metric("temp", model_name="Orin")
+
+    def test_bulk_create_missing_cameras(self):
+        identity_map.preload_client(self.client)
+
+        # One query to look for existing rows and one insert
+        with self.assertNumQueries(2):
+            cameras = get_or_create_cameras([{'name': f"cam{i}", 'gx': device}
+                                             for device in self.devices for i in range(3)])
+
+        self.assertEqual(len(set(camera.pk for camera in cameras)), 30)
+        self.assertEqual(Camera.objects.count(), 30)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_or_create_camera(
+                {'name': "cam2", 'gx': self.devices[5]}), cameras[17])
+
+    def test_saved_rows_update_the_map(self):
+        identity_map.preload_deployment(self.deployment)
+
+        metric = GxMetric.objects.get(metric_name="temp")
+        metric.threshold = 80
+        metric.save()
+
+        self.assertEqual(get_or_create_cached_gx_metric(
+            "temp", model_name="Orin").threshold, 80)
+
+        metric.delete()
+        self.assertEqual(identity_map.find(GxMetric, metric_name="temp"), [])
+
+    def test_gx_metrics_of_the_api_are_read_from_the_database(self):
+        identity_map.preload_deployment(self.deployment)
+
+        # Changed by another process: no signal reaches this one
+        GxMetric.objects.filter(metric_name="temp").update(threshold=90)
+        self.assertEqual(get_or_create_gx_metric("temp", model_name="Orin").threshold, 90)
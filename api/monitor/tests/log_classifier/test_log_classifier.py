@@ -0,0 +1,77 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from monitor import log_classifier
+from monitor.models import *
+import pandas as pd
+
+
+class LogClassifierTest(TestCase):
+    def setUp(self) -> None:
+        log_classifier.clear()
+        self.deployment = Deployment.objects.create(name="Industry")
+        self.messages = pd.Series(["Batch dropping 3", "[LICENSE] until 2024-08-01 12:00:00.",
+                                   "[THERMAL] 90C", "Unknown", "SRC shift"])
+
+        return super().setUp()
+
+    def test_default_rules(self):
+        categories = log_classifier.classify_device_logs(
+            "Industry", self.messages, pd.Series(["d1"] * 5), default="others")
+
+        self.assertEqual(list(categories), ["batch_dropping", "license", "others",
+                                            "others", "shift_change"])
+
+    def test_db_rules_and_invalidation(self):
+        classifier = log_classifier.get_classifier("Industry")
+        self.assertIs(classifier, log_classifier.get_classifier("Industry"))
+
+        rule = LogClassificationRule.objects.create(
+            deployment=self.deployment, category="thermal", pattern=r"\d+C$",
+            match_type=LogClassificationRule.REGEX)
+        categories = log_classifier.classify_device_logs(
+            "Industry", self.messages, pd.Series(["d1"] * 5), default="others")
+        self.assertEqual(categories[2], "thermal")
+
+        rule.active = False
+        rule.save()
+        categories = log_classifier.classify_device_logs(
+            "Industry", self.messages, pd.Series(["d1"] * 5), default="others")
+        self.assertEqual(categories[2], "others")
+
+    def test_gx_model_rules(self):
+        client = Client.objects.create(name="Test", deployment=self.deployment)
+        nano = GxModel.objects.create(name="Nano")
+        Device.objects.create(name="d2", client=client, model=nano)
+        LogClassificationRule.objects.create(
+            deployment=self.deployment, gx_model=nano, category="license_nano", pattern="[LICENSE]")
+
+        device_models = dict(Device.objects.values_list("name", "model_id"))
+        categories = log_classifier.classify_device_logs(
+            "Industry", self.messages[:2].repeat(2).reset_index(drop=True),
+            pd.Series(["d1", "d2", "d1", "d2"]), device_models, default="others")
+
+        self.assertEqual(list(categories), ["batch_dropping", "batch_dropping",
+                                            "license", "license_nano"])
+
+    def test_rules_that_only_compile_alone_are_skipped(self):
+        patterns = [r"(?i)thermal", r"(?P<r0>\d+)C", r"(\d)\1C"]
+        for pattern in patterns:
+            LogClassificationRule.objects.create(
+                deployment=self.deployment, category="thermal", pattern=pattern,
+                match_type=LogClassificationRule.REGEX)
+        LogClassificationRule.objects.create(
+            deployment=self.deployment, category="thermal", pattern=r"(?i:thermal)",
+            match_type=LogClassificationRule.REGEX)
+
+        categories = log_classifier.classify_device_logs(
+            "Industry", self.messages, pd.Series(["d1"] * 5), default="others")
+        self.assertEqual(categories[2], "thermal")
+
+        for pattern in patterns:
+            rule = LogClassificationRule(deployment=self.deployment, category="thermal",
+                                         pattern=pattern, match_type=LogClassificationRule.REGEX)
+            with self.assertRaises(ValidationError):
+                rule.full_clean()
+        # Escaped backslashes are not backreferences
+        LogClassificationRule(deployment=self.deployment, category="thermal", pattern=r"C:\\1",
+                              match_type=LogClassificationRule.REGEX).full_clean()
@@ -0,0 +1,99 @@
+from django.test import TestCase, override_settings
+from monitor import register_late_logs
+from monitor.log_spool import LogSpool
+from unittest import mock
+import gzip
+import os
+import pandas as pd
+import tempfile
+
+
+def make_logs(n, start=0):
+    return pd.DataFrame([{
+        "Unidad": f"Unit {i % 3}",
+        "Timestamp": "2024-04-04T15:00:00.000Z",
+        "Fecha_subida": "2024-04-04T15:30:00.000Z",
+        "Tipo": "restart",
+        "Log": f"Log {i}",
+    } for i in range(start, start + n)])
+
+
+class LogSpoolTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.spool = LogSpool(self.directory.name, segment_size=1024 * 1024)
+
+    def read(self, segments):
+        return [log["Log"] for chunk in self.spool.read_all(segments) for log in chunk]
+
+    def test_append_and_seal(self):
+        self.spool.append(make_logs(5))
+        self.spool.append(make_logs(0))
+        self.spool.append(make_logs(5, start=5))
+
+        segments = self.spool.seal()
+
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(self.read(segments), [f"Log {i}" for i in range(10)])
+        # New logs go to a new segment
+        self.spool.append(make_logs(1, start=10))
+        self.assertEqual(self.spool.seal()[0], segments[0])
+        self.assertEqual(len(self.spool.seal()), 2)
+
+    def test_segments_are_rotated_by_size(self):
+        spool = LogSpool(self.directory.name, segment_size=1)
+        for i in range(3):
+            spool.append(make_logs(2, start=2 * i))
+
+        self.assertFalse(os.path.exists(spool.active_path))
+        segments = spool.seal()
+        self.assertEqual(len(segments), 3)
+        self.assertEqual(self.read(segments), [f"Log {i}" for i in range(6)])
+
+    def test_read_in_chunks(self):
+        self.spool.append(make_logs(25))
+
+        chunks = list(self.spool.read(self.spool.seal()[0], chunk_size=10))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+
+    def test_truncated_append_is_skipped(self):
+        self.spool.append(make_logs(5))
+        self.spool.append(make_logs(5, start=5))
+        # Crash in the middle of the second append
+        with open(self.spool.active_path, "r+b") as f:
+            f.truncate(os.path.getsize(self.spool.active_path) - 20)
+
+        self.assertEqual(self.read(self.spool.seal()),
+                         [f"Log {i}" for i in range(5)])
+
+    def test_appends_after_a_truncated_member_are_read(self):
+        self.spool.append(make_logs(5))
+        # Crash in the middle of the second append, then more appends
+        member = gzip.compress(make_logs(5, start=5).to_json(orient="records", lines=True).encode())
+        with open(self.spool.active_path, "ab") as f:
+            f.write(member[:len(member) // 2])
+        self.spool.append(make_logs(5, start=10))
+        self.spool.append(make_logs(5, start=15))
+
+        self.assertEqual(self.read(self.spool.seal()),
+                         [f"Log {i}" for i in list(range(5)) + list(range(10, 20))])
+
+    def test_segments_are_deleted_after_commit(self):
+        with override_settings(MONITOR_LATE_LOG_SPOOL_DIR=self.directory.name):
+            self.spool.append(make_logs(5))
+
+            with mock.patch("monitor.register_late_logs.register_segments",
+                            side_effect=ValueError("DB error")):
+                with self.assertRaises(ValueError):
+                    register_late_logs.register_logs()
+            self.assertEqual(len(self.spool.seal()), 1)
+
+            registered = []
+            with mock.patch("monitor.register_late_logs.register_segments",
+                            side_effect=lambda spool, segments: registered.extend(self.read(segments))):
+                with self.captureOnCommitCallbacks(execute=True):
+                    register_late_logs.register_logs()
+            self.assertEqual(registered, [f"Log {i}" for i in range(5)])
+            self.assertEqual(self.spool.seal(), [])
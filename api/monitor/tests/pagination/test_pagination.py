@@ -0,0 +1,142 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from api.pagination import ApproximateCountPaginator
+from monitor import apis
+from monitor.models import *
+from monitor.tests.utils.units import make_unit_history
+from datetime import datetime, timedelta
+import pytz
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        client = Client.objects.create(name="Pages", keyname="pages", deployment=deployment)
+        self.unit = Unit.objects.create(name="Pages unit", client=client)
+        status = GxStatus.objects.create(deployment=deployment, severity=1, description="Funcionando")
+        self.start = datetime(2024, 5, 2, 12, 0, tzinfo=pytz.utc)
+
+        # Two rows share each of the datetimes at 20 and 40 minutes
+        minutes = [0, 10, 20, 20, 30, 40, 40, 50, 60, 70]
+        for i, minute in enumerate(minutes):
+            register_datetime = self.start + timedelta(minutes=minute)
+            make_unit_history(self.unit, register_datetime, status=status, total=i).save()
+
+    def get(self, **params):
+        params = {"register_datetime_after": "2024-05-02T00:00:00Z",
+                  "register_datetime_before": "2024-05-03T00:00:00Z", "page_size": 3, **params}
+        request = APIRequestFactory().get("/", params)
+        return apis.UnitHistoryList.as_view()(request, unit_id=self.unit.id)
+
+    def rows(self, *ordering):
+        return list(UnitHistory.objects.filter(unit=self.unit).order_by(*ordering).values_list(
+            "total", flat=True))
+
+    def walk(self, **params):
+        # The pages following the next cursors, then back with the previous ones
+        response = self.get(**params)
+        pages = [response.data]
+        while response.data["pagination"]["next_cursor"]:
+            response = self.get(cursor=response.data["pagination"]["next_cursor"], **params)
+            pages.append(response.data)
+
+        back = [pages[-1]]
+        while response.data["pagination"]["previous_cursor"]:
+            response = self.get(cursor=response.data["pagination"]["previous_cursor"], **params)
+            back.insert(0, response.data)
+
+        self.assertEqual([page["data"] for page in back], [page["data"] for page in pages])
+        self.assertEqual([page["pagination"]["page"] for page in pages], [1, 2, 3, 4])
+        return [row["total"] for page in pages for row in page["data"]]
+
+    def test_newest_first(self):
+        # Sorted by register_datetime, the newest rows come first, as before
+        self.assertEqual(self.walk(sort="register_datetime"), self.rows("-register_datetime", "-id"))
+        self.assertEqual(self.walk(), self.rows("-register_datetime", "-id"))
+
+    def test_oldest_first(self):
+        self.assertEqual(self.walk(sort="-register_datetime"), self.rows("register_datetime", "id"))
+
+    def test_envelope(self):
+        response = self.get(sort="register_datetime", page=2)
+
+        pagination = response.data["pagination"]
+        self.assertEqual({key: pagination[key] for key in ["page", "page_size", "count", "pages"]},
+                         {"page": 2, "page_size": 3, "count": 10, "pages": 4})
+        self.assertEqual([row["total"] for row in response.data["data"]],
+                         self.rows("-register_datetime", "-id")[3:6])
+
+        # Same page as following the cursor of page 1
+        first = self.get(sort="register_datetime")
+        self.assertEqual(self.get(sort="register_datetime",
+                                  cursor=first.data["pagination"]["next_cursor"]).data,
+                         response.data)
+
+    def test_other_sorts_by_page_number(self):
+        response = self.get(sort="total", page=2)
+
+        self.assertEqual([row["total"] for row in response.data["data"]], [6, 5, 4])
+        self.assertIsNone(response.data["pagination"]["next_cursor"])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.get(cursor="not a cursor").status_code, 404)
+
+
+@override_settings(PAGINATION_EXACT_COUNT_THRESHOLD=5)
+class ApproximateCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        client = Client.objects.create(name="Counts", keyname="counts", deployment=deployment)
+        self.units = [Unit.objects.create(name=f"Counts unit {i}", client=client) for i in range(2)]
+        status = GxStatus.objects.create(deployment=deployment, severity=1, description="Funcionando")
+        start = datetime(2024, 5, 2, 12, 0, tzinfo=pytz.utc)
+
+        UnitHistory.objects.bulk_create([
+            make_unit_history(unit, start + timedelta(minutes=10 * i), status=status)
+            for unit in self.units for i in range(6)])
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE "{UnitHistory._meta.db_table}"')
+
+    def get(self, unit):
+        request = APIRequestFactory().get("/", {
+            "register_datetime_after": "2024-05-02T00:00:00Z",
+            "register_datetime_before": "2024-05-03T00:00:00Z", "page_size": 4,
+        })
+        return apis.UnitHistoryList.as_view()(request, unit_id=unit.id).data["pagination"]
+
+    def test_small_tables_are_counted(self):
+        with override_settings(PAGINATION_EXACT_COUNT_THRESHOLD=100):
+            self.assertEqual(self.get(self.units[0])["count"], 6)
+            self.assertTrue(self.get(self.units[0])["count_exact"])
+
+    def test_filtered_counts_are_cached(self):
+        pagination = self.get(self.units[0])
+        self.assertEqual((pagination["count"], pagination["count_exact"]), (6, True))
+
+        UnitHistory.objects.filter(unit=self.units[0]).first().delete()
+        pagination = self.get(self.units[0])
+        self.assertEqual((pagination["count"], pagination["count_exact"]), (6, False))
+
+        # Other filters have their own count
+        self.assertEqual(self.get(self.units[1])["count_exact"], True)
+
+    def test_unfiltered_counts_are_estimated(self):
+        paginator = ApproximateCountPaginator(UnitHistory.objects.order_by("id"), 5)
+
+        self.assertEqual(paginator.count, 12)
+        self.assertFalse(paginator.count_exact)
+
+    def test_admin_changelist(self):
+        user = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin")
+        self.client.force_login(user)
+
+        response = self.client.get("/admin/monitor/unithistory/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.context["cl"].paginator, ApproximateCountPaginator)
+        self.assertEqual(response.context["cl"].result_count, 12)
@@ -0,0 +1,93 @@
+from django.db import connection
+from django.test import TestCase
+from monitor import partitions
+from monitor.models import *
+from monitor.tests.utils.units import make_unit_history
+from datetime import date, datetime
+import pytz
+
+
+class PartitionsTest(TestCase):
+    def partition_of(self, table, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM "{table}" WHERE id = %s', [pk])
+            return cursor.fetchone()[0]
+
+    def create_history(self, unit, register_datetime):
+        history = make_unit_history(unit, register_datetime)
+        history.save()
+        return history
+
+    def test_add_months(self):
+        self.assertEqual(partitions.add_months(date(2024, 11, 1), 3), date(2025, 2, 1))
+        self.assertEqual(partitions.add_months(date(2024, 1, 1), -1), date(2023, 12, 1))
+
+    def test_history_tables_are_partitioned(self):
+        with connection.cursor() as cursor:
+            for model, key in partitions.get_models():
+                self.assertTrue(partitions.is_partitioned(cursor, model._meta.db_table))
+
+    def test_maintain_partitions(self):
+        deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        client = Client.objects.create(name="Partitions", keyname="partitions", deployment=deployment)
+        unit = Unit.objects.create(name="Partitions unit", client=client)
+        table = UnitHistory._meta.db_table
+
+        # Months without partition go to the default partition
+        old = self.create_history(unit, datetime(2020, 1, 15, tzinfo=pytz.utc))
+        recent = self.create_history(unit, datetime(2020, 5, 15, tzinfo=pytz.utc))
+        self.assertEqual(self.partition_of(table, old.id), f"{table}_default")
+
+        report = partitions.maintain_partitions(
+            months_ahead=1, retention={}, now=datetime(2020, 4, 10, tzinfo=pytz.utc))
+        self.assertEqual(report[table], ([f"{table}_p202004", f"{table}_p202005"], []))
+        # Rows of the new partitions are moved out of the default partition
+        self.assertEqual(self.partition_of(table, recent.id), f"{table}_p202005")
+
+        partitions.maintain_partitions(
+            months_ahead=0, retention={}, now=datetime(2020, 1, 10, tzinfo=pytz.utc))
+        self.assertEqual(self.partition_of(table, old.id), f"{table}_p202001")
+
+        # Keeping 4 months in May 2020 drops January's partition and its rows
+        report = partitions.maintain_partitions(
+            months_ahead=0, retention={"UnitHistory": 4}, now=datetime(2020, 5, 10, tzinfo=pytz.utc))
+        self.assertEqual(report[table][1], [f"{table}_p202001"])
+        self.assertFalse(UnitHistory.objects.filter(id=old.id).exists())
+        self.assertTrue(UnitHistory.objects.filter(id=recent.id).exists())
+        self.assertEqual(report[DeviceHistory._meta.db_table][1], [])
+
+    def test_partition_table(self):
+        table = "monitor_partitions_test"
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TABLE "{table}" (
+                    id serial PRIMARY KEY,
+                    register_datetime timestamp with time zone NOT NULL,
+                    gxstatus_id integer NOT NULL REFERENCES monitor_gxstatus(id)
+                )
+            """)
+            cursor.execute(f'CREATE INDEX "{table}_gxstatus_id" ON "{table}" (gxstatus_id)')
+            status = GxStatus.objects.create(
+                deployment=Deployment.objects.get_or_create(name="Industry")[0],
+                severity=1, description="Partitions")
+            cursor.execute(f"""
+                INSERT INTO "{table}" (register_datetime, gxstatus_id) VALUES
+                ('2024-02-10', %s), ('2024-03-10', %s)
+            """, [status.id, status.id])
+
+            partitions.partition_table(cursor, table, "register_datetime", months_ahead=1)
+
+            self.assertTrue(partitions.is_partitioned(cursor, table))
+            self.assertIn(date(2024, 2, 1), partitions.get_partitions(cursor, table))
+            cursor.execute(f'SELECT id, tableoid::regclass::text FROM "{table}" ORDER BY id')
+            self.assertEqual(cursor.fetchall(), [(1, f"{table}_p202402"), (2, f"{table}_p202403")])
+
+            # The sequence continues and the index and foreign key are kept
+            cursor.execute(f"""INSERT INTO "{table}" (register_datetime, gxstatus_id)
+                               VALUES (now(), %s) RETURNING id""", [status.id])
+            self.assertEqual(cursor.fetchone()[0], 3)
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+            self.assertIn(f"{table}_gxstatus_id", [row[0] for row in cursor.fetchall()])
+            cursor.execute("SELECT count(*) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                           [table])
+            self.assertEqual(cursor.fetchone()[0], 1)
@@ -0,0 +1,113 @@
+from django.db import connection
+from django.test import TestCase
+from monitor.models import *
+from monitor.selectors import (get_cameradisconnections, get_devicehistory, get_gxrecords,
+                               get_serverhistory, get_unithistory)
+from monitor.tests.utils.units import make_unit_history
+from datetime import datetime, timedelta
+import json
+import pytz
+
+
+ENTITIES = 30
+ROWS = 300  # per entity, every 10 minutes
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+class QueryPlansTest(TestCase):
+    """
+    The history selectors filter by entity and time range; with a seeded
+    dataset their plans must use the (entity, time) indexes instead of
+    scanning the history tables.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = datetime.now(tz=pytz.utc).replace(second=0, microsecond=0)
+        cls.end = now
+        cls.start = now - timedelta(hours=12)
+        times = [now - timedelta(minutes=10 * i) for i in range(ROWS)]
+
+        deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        client = Client.objects.create(name="Plans", keyname="plans", deployment=deployment)
+        status = GxStatus.objects.create(deployment=deployment, severity=1, description="Plans")
+        gx_model, _ = GxModel.objects.get_or_create(name="Orin")
+        gx_metric = GxMetric.objects.create(metric_name="cpu", gx_model=gx_model)
+        server_metric = ServerMetric.objects.create(name="CPU", key="CPUUtilization")
+
+        units, devices, cameras, servers = [], [], [], []
+        for i in range(ENTITIES):
+            units.append(Unit.objects.create(name=f"Plans unit {i}", client=client))
+            devices.append(Device.objects.create(name=f"Plans device {i}", client=client))
+            cameras.append(Camera.objects.create(name=f"cam{i}", gx=units[-1]))
+            servers.append(Server.objects.create(name=f"Plans server {i}", server_type="t3",
+                                                 aws_id=f"i-{i}"))
+
+        UnitHistory.objects.bulk_create([
+            make_unit_history(unit, time, status=status)
+            for unit in units for time in times])
+        DeviceHistory.objects.bulk_create([
+            DeviceHistory(device=device, register_date=time.date(), register_datetime=time,
+                          batch_dropping=0, camera_connection=timedelta(0), restart=0, license=0,
+                          shift_change=0, others=0, status=status)
+            for device in devices for time in times])
+        CameraHistory.objects.bulk_create([
+            CameraHistory(camera=camera, register_date=time.date(), register_datetime=time,
+                          connected=False, disconnection_time=timedelta(minutes=10))
+            for camera in cameras for time in times])
+        ServerHistory.objects.bulk_create([
+            ServerHistory(server=server, last_launch=now, register_date=time.date(),
+                          register_datetime=time, state="running", metric_type=server_metric,
+                          metric_value=1.0)
+            for server in servers for time in times])
+        GxRecord.objects.bulk_create([
+            GxRecord(gx=unit, metric=gx_metric, register_time=time, log_time=time,
+                     avg_value=1.0, max_value=1, min_value=1)
+            for unit in units for time in times])
+
+        with connection.cursor() as cursor:
+            for model in [UnitHistory, DeviceHistory, CameraHistory, ServerHistory, GxRecord,
+                          Camera]:
+                cursor.execute(f'ANALYZE "{model._meta.db_table}"')
+
+        cls.unit, cls.device, cls.server = units[0], devices[0], servers[0]
+
+    def assertNoSeqScan(self, queryset, model):
+        plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+        table = model._meta.db_table
+
+        scans = [node for node in plan_nodes(plan) if node.get("Relation Name", "").startswith(table)]
+        self.assertTrue(scans, f"{table} is not scanned:\n{json.dumps(plan, indent=2)}")
+        for node in scans:
+            self.assertNotEqual(node["Node Type"], "Seq Scan",
+                                f"Sequential scan on {node['Relation Name']}:\n{json.dumps(plan, indent=2)}")
+
+    def test_unithistory(self):
+        self.assertNoSeqScan(get_unithistory(self.unit.id, filters={
+            "register_datetime_after": self.start, "register_datetime_before": self.end,
+        }), UnitHistory)
+
+    def test_devicehistory(self):
+        self.assertNoSeqScan(get_devicehistory(self.device.id, filters={
+            "register_datetime_after": self.start, "register_datetime_before": self.end,
+        }), DeviceHistory)
+
+    def test_serverhistory(self):
+        self.assertNoSeqScan(get_serverhistory(self.server.id, filters={
+            "register_datetime_after": self.start, "register_datetime_before": self.end,
+        }), ServerHistory)
+
+    def test_gxrecords(self):
+        self.assertNoSeqScan(get_gxrecords(self.unit.id, filters={
+            "register_time_after": self.start, "register_time_before": self.end,
+        }), GxRecord)
+
+    def test_cameradisconnections(self):
+        self.assertNoSeqScan(get_cameradisconnections(self.unit.id, filters={
+            "register_datetime_after": self.start, "register_datetime_before": self.end,
+        }), CameraHistory)
@@ -0,0 +1,93 @@
+from django.test import TestCase, override_settings
+from monitor import register_late_logs
+from monitor.log_spool import LogSpool
+from monitor.models import *
+from monitor.tests.utils.units import make_unit_history
+from collections import defaultdict
+from datetime import datetime, timedelta
+import pandas as pd
+import pytz
+import tempfile
+
+
+def log(unit, timestamp, log_type, message="Log"):
+    return {"Unidad": unit, "Timestamp": timestamp, "Fecha_subida": timestamp,
+            "Tipo": log_type, "Log": message}
+
+
+class RegisterLateLogsTest(TestCase):
+    def setUp(self):
+        self.deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        self.client_obj = Client.objects.create(
+            name="Late logs client", keyname="late_logs", deployment=self.deployment)
+        self.unit = Unit.objects.create(name="Late unit", client=self.client_obj)
+        for severity, description in [(2, "Comunicación reciente"), (3, "Errores de memoria"),
+                                      (5, "Read only SSD")]:
+            GxStatus.objects.get_or_create(
+                deployment=self.deployment, severity=severity, description=description)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def create_history(self, register_datetime, **counts):
+        history = make_unit_history(self.unit, register_datetime, **counts)
+        history.save()
+        return history
+
+    def test_count_logs(self):
+        intervals_data = defaultdict(lambda: defaultdict(
+            lambda: {"counts": defaultdict(int), "disc_cams": set()}))
+        df = pd.DataFrame([
+            log("Late unit", "2024-04-04T09:01:10.000Z", "restart"),
+            log("Late unit", "2024-04-04T09:09:59.500Z", "restart"),
+            log("Late unit", "2024-04-04T09:10:00.000Z", "Aux"),
+            log("Late unit", "2024-04-04T09:12:00.000Z", "camera_missing",
+                "Cameras 'DISCONNECTED status: cameras: cam1 cam2'."),
+        ])
+
+        register_late_logs.count_logs(df, intervals_data)
+
+        # 09:00 - 09:10 (UTC-6) is registered at 15:10 UTC
+        first = datetime(2024, 4, 4, 15, 10, tzinfo=pytz.utc)
+        second = datetime(2024, 4, 4, 15, 20, tzinfo=pytz.utc)
+        self.assertEqual(dict(intervals_data["Late unit"][first]["counts"]), {"restart": 2})
+        self.assertEqual(dict(intervals_data["Late unit"][second]["counts"]),
+                         {"Aux": 1, "camera_missing": 1})
+        self.assertEqual(intervals_data["Late unit"][second]["disc_cams"], {"cam1", "cam2"})
+
+    def register(self, logs):
+        with override_settings(MONITOR_LATE_LOG_SPOOL_DIR=self.directory.name):
+            LogSpool().append(pd.DataFrame(logs))
+            with self.captureOnCommitCallbacks(execute=True):
+                register_late_logs.register_logs()
+
+    def test_histories_are_updated_and_created(self):
+        existing = self.create_history(
+            datetime(2024, 4, 4, 15, 10, 30, tzinfo=pytz.utc), total=1, restart=1)
+
+        self.register([
+            log("Late unit", "2024-04-04T09:05:00.000Z", "restart"),
+            log("Late unit", "2024-04-04T09:15:00.000Z", "storage_devices"),
+        ])
+
+        existing.refresh_from_db()
+        self.assertEqual((existing.restart, existing.total, existing.modified), (2, 2, True))
+        created = UnitHistory.objects.get(
+            unit=self.unit, register_datetime=datetime(2024, 4, 4, 15, 20, tzinfo=pytz.utc))
+        self.assertEqual((created.storage_devices, created.total), (1, 1))
+        self.assertEqual(created.status.description, "Errores de memoria")
+
+    def test_queries_do_not_grow_with_intervals(self):
+        start = datetime(2024, 4, 4, 12, 0, tzinfo=pytz.utc)
+        for i in range(0, 48, 2):
+            self.create_history(start + timedelta(minutes=10 * i, seconds=20), total=1, aux=1)
+
+        logs = [log("Late unit", (start - timedelta(hours=6) + timedelta(minutes=10 * i + 1)).strftime(
+            "%Y-%m-%dT%H:%M:%S.000Z"), "restart") for i in range(48)]
+
+        # Units, history and trips of the unit, statuses, bulk create and
+        # update, rollups read and upsert, status intervals and history
+        # read (plus the savepoints of the transaction)
+        with self.assertNumQueries(12):
+            self.register(logs)
+        self.assertEqual(UnitHistory.objects.filter(unit=self.unit, modified=True).count(), 48)
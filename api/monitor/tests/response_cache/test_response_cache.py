@@ -0,0 +1,82 @@
+from django.core.cache import caches
+from django.test import TestCase
+from django.utils.http import http_date
+from rest_framework.test import APIRequestFactory
+from monitor import apis, response_cache
+from monitor.models import *
+from monitor.tests.utils.units import unit_counts
+from datetime import datetime, timedelta
+import pytz
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        caches["responses"].clear()
+        self.deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        client = Client.objects.create(name="Cache client", keyname="cache", deployment=self.deployment)
+        self.status = GxStatus.objects.create(deployment=self.deployment, severity=1,
+                                              description="Funcionando")
+        self.now = datetime(2024, 5, 2, 12, 0, tzinfo=pytz.utc)
+        self.units = [self.create_unit(client, f"Cache unit {i}") for i in range(3)]
+        response_cache.bump_generation(self.deployment.id, now=self.now)
+
+    def create_unit(self, client, name):
+        unit = Unit.objects.create(name=name, client=client)
+        UnitStatus.objects.create(unit=unit, status=self.status, last_update=self.now, **unit_counts())
+        return unit
+
+    def get(self, view=apis.UnitStatusList, path="/api/v1/monitor/driving/status/", **headers):
+        request = APIRequestFactory().get(path, **headers)
+        response = view.as_view()(request)
+        response.render()
+        return response
+
+    def test_cached_until_the_next_run(self):
+        first = self.get()
+        self.assertEqual(len(first.data), 3)
+
+        UnitStatus.objects.filter(unit=self.units[0]).update(active=False)
+        # Only the generation of the deployment is read
+        with self.assertNumQueries(1):
+            cached = self.get()
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached["ETag"], first["ETag"])
+
+        response_cache.bump_generation(self.deployment.id, now=self.now + timedelta(minutes=10))
+        response = self.get()
+        self.assertEqual(len(response.data), 2)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_each_endpoint_and_query_is_cached_apart(self):
+        statuses = self.get()
+        counts = self.get(apis.UnitSeverityCount, "/api/v1/monitor/driving/status-count/")
+        self.assertNotEqual(statuses["ETag"], counts["ETag"])
+        self.assertEqual(counts.data[0]["count"], 3)
+
+        other = self.get(path="/api/v1/monitor/driving/status/?client=Cache+client")
+        self.assertNotEqual(other["ETag"], statuses["ETag"])
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(response["Last-Modified"], http_date(self.now.timestamp()))
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        with self.assertNumQueries(1):
+            not_modified = self.get(HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+
+        not_modified = self.get(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(not_modified.status_code, 304)
+
+        response_cache.bump_generation(self.deployment.id, now=self.now + timedelta(minutes=10))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 200)
+
+    def test_set_inactive_invalidates(self):
+        self.get()
+        request = APIRequestFactory().post("/")
+        apis.SetUnitAsInactiveAPI.as_view()(request, unit_id=self.units[0].id)
+
+        self.assertEqual(len(self.get().data), 2)
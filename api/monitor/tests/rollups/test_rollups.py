@@ -0,0 +1,141 @@
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from monitor import apis, rollups
+from monitor.models import *
+from monitor.selectors import get_unit_description_counts
+from monitor.unit_of_work import StatusUnitOfWork
+from monitor.tests.utils.units import unit_history_args
+from datetime import datetime, timedelta
+import pytz
+
+
+class RollupsTest(TestCase):
+    def setUp(self):
+        self.deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        self.client_obj = Client.objects.create(
+            name="Rollups client", keyname="rollups", deployment=self.deployment)
+        self.unit = Unit.objects.create(name="Rollups unit", client=self.client_obj)
+        self.ok = GxStatus.objects.create(
+            deployment=self.deployment, severity=1, description="Funcionando")
+        self.memory = GxStatus.objects.create(
+            deployment=self.deployment, severity=3, description="Errores de memoria")
+        self.ssd = GxStatus.objects.create(
+            deployment=self.deployment, severity=5, description="Read only SSD")
+        self.start = datetime(2024, 5, 2, 12, 0, tzinfo=pytz.utc)
+
+    def history_args(self, register_datetime, status, restart=0):
+        return unit_history_args(self.unit, register_datetime, status=status, restart=restart)
+
+    def write(self, statuses, start=None):
+        # One row every 10 minutes
+        start = start or self.start
+        uow = StatusUnitOfWork("Test")
+        uow.create_histories(UnitHistory, [
+            self.history_args(start + timedelta(minutes=10 * i), status, restart=1)
+            for i, status in enumerate(statuses)])
+        uow.flush()
+
+    def test_status_runs_maintain_rollups(self):
+        self.write([self.ok, self.memory, self.memory, self.ssd, self.ok, self.memory,
+                    self.ssd, self.ssd])
+
+        first, second = UnitHourlyRollup.objects.filter(unit=self.unit).order_by("hour")
+        self.assertEqual(first.hour, self.start)
+        self.assertEqual((first.records, first.restart), (6, 6))
+        self.assertEqual(first.severity_counts, {"1": 2, "3": 3, "5": 1})
+        self.assertEqual(first.description_counts["3"], {"Errores de memoria": 3})
+        self.assertEqual((first.severity, first.description), (3, "Errores de memoria"))
+        self.assertEqual((second.records, second.severity), (2, 5))
+
+        # Later runs add to the hour, ties go to the lowest severity
+        self.write([self.ssd, self.ssd], start=self.start + timedelta(minutes=5))
+        first.refresh_from_db()
+        self.assertEqual((first.records, first.severity, first.description), (8, 3, "Errores de memoria"))
+        self.write([self.ssd], start=self.start + timedelta(minutes=7))
+        first.refresh_from_db()
+        self.assertEqual((first.records, first.severity, first.description), (9, 5, "Read only SSD"))
+
+    def test_refresh_updated_histories(self):
+        self.write([self.ok, self.ok, self.memory])
+        histories = list(UnitHistory.objects.filter(unit=self.unit))
+        for history in histories:
+            history.status = self.ssd
+        UnitHistory.objects.bulk_update(histories, ["status"])
+
+        rollups.refresh(UnitHistory, histories)
+        rollup = UnitHourlyRollup.objects.get(unit=self.unit)
+        self.assertEqual((rollup.records, rollup.severity_counts, rollup.severity), (3, {"5": 3}, 5))
+
+        UnitHistory.objects.filter(unit=self.unit).delete()
+        rollups.refresh(UnitHistory, histories)
+        self.assertFalse(UnitHourlyRollup.objects.filter(unit=self.unit).exists())
+
+    def test_backfill(self):
+        self.write([self.ok, self.memory] * 10)
+        expected = list(UnitHourlyRollup.objects.filter(unit=self.unit).order_by("hour").values(
+            "hour", "records", "severity_counts", "description_counts", "severity", "description",
+            "restart"))
+        UnitHourlyRollup.objects.all().delete()
+
+        written = rollups.backfill(UnitHistory, end=self.start + timedelta(hours=12),
+                                   step=timedelta(hours=2))
+        self.assertEqual(written, len(expected))
+        self.assertEqual(list(UnitHourlyRollup.objects.filter(unit=self.unit).order_by("hour").values(
+            "hour", "records", "severity_counts", "description_counts", "severity", "description",
+            "restart")), expected)
+
+    def test_unit_scatter_plot(self):
+        self.write([self.ok, self.memory, self.memory, self.ssd, self.ok, self.memory,
+                    self.ssd, self.ssd])
+        request = APIRequestFactory().get("/", {
+            "register_datetime_after": "2024-05-02T00:00:00Z",
+            "register_datetime_before": "2024-05-02T00:00:00Z",
+        })
+        response = apis.UnitScatterPlotAPI.as_view()(request, unit_id=self.unit.id)
+
+        # Hours are labeled in UTC-6 plus one hour
+        self.assertEqual([dict(row) for row in response.data], [
+            {"hora": "2024-05-02 07h", "severidad": 3, "descripcion": "Errores de memoria"},
+            {"hora": "2024-05-02 08h", "severidad": 5, "descripcion": "Read only SSD"},
+        ])
+
+        # Whole days are filtered
+        request = APIRequestFactory().get("/", {
+            "register_datetime_after": "2024-05-03T00:00:00Z",
+            "register_datetime_before": "2024-05-03T00:00:00Z",
+        })
+        self.assertEqual(apis.UnitScatterPlotAPI.as_view()(request, unit_id=self.unit.id).data, [])
+
+    def test_unit_description_counts(self):
+        self.write([self.ssd, self.memory, self.ssd], start=datetime.now(tz=pytz.utc) - timedelta(days=2))
+        self.write([self.ssd], start=datetime.now(tz=pytz.utc) - timedelta(days=9))
+
+        self.assertEqual(
+            get_unit_description_counts(self.unit.id, 5, datetime.now(tz=pytz.utc) - timedelta(weeks=1)),
+            [("Read only SSD", 2)])
+
+    def test_retail_scatter_plot(self):
+        deployment, _ = Deployment.objects.get_or_create(name="Smart Retail")
+        device = Device.objects.create(name="Retail device", client=self.client_obj)
+        delayed = GxStatus.objects.create(deployment=deployment, severity=3, description="Retraso")
+        restarts = GxStatus.objects.create(deployment=deployment, severity=3, description="Reinicios")
+
+        uow = StatusUnitOfWork("Test")
+        for i, status in enumerate([delayed, restarts, restarts, delayed, restarts, restarts]):
+            register_datetime = self.start + timedelta(minutes=20 * i)
+            uow.create_history(RetailDeviceHistory, dict(
+                device=device, register_datetime=register_datetime,
+                register_date=register_datetime.date(), status=status, log_counts={}))
+        uow.flush()
+
+        request = APIRequestFactory().get("/", {
+            "register_datetime_after": "2024-05-02T00:00:00Z",
+            "register_datetime_before": "2024-05-02T00:00:00Z",
+        })
+        response = apis.RetailDeviceScatterPlotAPI.as_view()(request, device_id=device.id)
+
+        # Descriptions are the most common of the severity in the whole range
+        self.assertEqual([dict(row) for row in response.data], [
+            {"hora": "2024-05-02 06h", "severidad": 3, "descripcion": "Reinicios"},
+            {"hora": "2024-05-02 07h", "severidad": 3, "descripcion": "Reinicios"},
+        ])
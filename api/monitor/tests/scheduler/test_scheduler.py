@@ -0,0 +1,77 @@
+from django.test import TestCase
+from monitor.scheduler import CronSchedule, Job, Scheduler, run_job
+from monitor.models import JobRun
+from datetime import datetime
+from unittest import mock
+import threading
+
+
+calls = []
+
+
+def sample_job():
+    calls.append(datetime.now())
+
+
+def failing_job():
+    raise ValueError("API down")
+
+
+class SchedulerTest(TestCase):
+    def test_cron_schedule(self):
+        every_ten = CronSchedule("*/10 * * * *")
+        self.assertTrue(every_ten.matches(datetime(2024, 4, 4, 15, 20)))
+        self.assertFalse(every_ten.matches(datetime(2024, 4, 4, 15, 25)))
+
+        daily = CronSchedule("30 9 * * *")
+        self.assertTrue(daily.matches(datetime(2024, 4, 4, 9, 30)))
+        self.assertFalse(daily.matches(datetime(2024, 4, 4, 10, 30)))
+
+        # 2024-04-07 is a Sunday
+        weekdays = CronSchedule("0 8 * * 1-5")
+        self.assertTrue(weekdays.matches(datetime(2024, 4, 5, 8, 0)))
+        self.assertFalse(weekdays.matches(datetime(2024, 4, 7, 8, 0)))
+        self.assertTrue(CronSchedule("0 8 * * 7").matches(datetime(2024, 4, 7, 8, 0)))
+
+        self.assertEqual(CronSchedule("5,35 1-3/2 * * *").minutes, {5, 35})
+        self.assertEqual(CronSchedule("5,35 1-3/2 * * *").hours, {1, 3})
+        with self.assertRaises(ValueError):
+            CronSchedule("61 * * * *")
+        with self.assertRaises(ValueError):
+            CronSchedule("* * * *")
+
+    # Closing the connection would break the test transaction
+    @mock.patch("monitor.scheduler.close_old_connections")
+    def test_run_job_records_run(self, close_old_connections):
+        job_run = run_job(Job("* * * * *", "monitor.tests.scheduler.test_scheduler.sample_job"))
+
+        self.assertTrue(job_run.success)
+        self.assertIsNotNone(job_run.duration)
+        self.assertEqual(len(calls), 1)
+
+        job_run = run_job(Job("* * * * *", "monitor.tests.scheduler.test_scheduler.failing_job"))
+        self.assertFalse(job_run.success)
+        self.assertIn("API down", job_run.error)
+        self.assertEqual(JobRun.objects.count(), 2)
+
+    def test_skip_if_still_running(self):
+        release = threading.Event()
+        job = Job("*/10 * * * *", "monitor.tests.scheduler.test_scheduler.sample_job")
+        other_job = Job("0 * * * *", "monitor.tests.scheduler.test_scheduler.failing_job")
+
+        with mock.patch("monitor.scheduler.run_job", side_effect=lambda job, jitter: release.wait(5)):
+            scheduler = Scheduler([job, other_job], max_workers=2, jitter=0)
+
+            first = scheduler.tick(datetime(2024, 4, 4, 15, 0))
+            self.assertEqual(len([future for future in first if future]), 2)
+
+            # Still running ten minutes later
+            self.assertEqual(scheduler.tick(datetime(2024, 4, 4, 15, 10)), [None])
+
+            release.set()
+            for future in first:
+                future.result()
+
+            self.assertIsNotNone(scheduler.submit(job))
+            scheduler.stop()
+            scheduler.executor.shutdown(wait=True)
@@ -0,0 +1,167 @@
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from monitor import apis, severity_snapshots
+from monitor.models import *
+from monitor.tests.utils.units import make_unit_history, unit_counts
+from datetime import datetime, timedelta
+import pytz
+
+
+class SeveritySnapshotsTest(TestCase):
+    def setUp(self):
+        self.deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        self.first = Client.objects.create(name="Snapshot client 1", keyname="snap1",
+                                           deployment=self.deployment)
+        self.second = Client.objects.create(name="Snapshot client 2", keyname="snap2",
+                                            deployment=self.deployment)
+        self.empty = Client.objects.create(name="Snapshot client 3", keyname="snap3",
+                                           deployment=self.deployment)
+        self.statuses = {severity: GxStatus.objects.create(
+            deployment=self.deployment, severity=severity, description=f"Severidad {severity}")
+            for severity in range(6)}
+        self.now = datetime(2024, 5, 2, 12, 17, 42, tzinfo=pytz.utc)
+
+    def create_units(self, client, severities, active=True):
+        for severity in severities:
+            unit = Unit.objects.create(name=f"{client.keyname} unit {Unit.objects.count()}",
+                                       client=client)
+            UnitStatus.objects.create(unit=unit, status=self.statuses[severity], active=active,
+                                      last_update=self.now, **unit_counts())
+
+    def snapshots(self):
+        return {snapshot.client_id: snapshot.severity_counts
+                for snapshot in SeveritySnapshot.objects.filter(deployment=self.deployment)}
+
+    def counts(self, *severities):
+        return {str(severity): severities.count(severity) for severity in range(6)}
+
+    def test_snapshot_per_client_and_deployment(self):
+        self.create_units(self.first, [1, 1, 3, 5])
+        self.create_units(self.second, [0, 1, 5])
+        # Inactive units are not counted
+        self.create_units(self.second, [5], active=False)
+
+        severity_snapshots.register_snapshot(self.deployment, now=self.now)
+
+        self.assertEqual(self.snapshots(), {
+            self.first.id: self.counts(1, 1, 3, 5),
+            self.second.id: self.counts(0, 1, 5),
+            self.empty.id: self.counts(),
+            None: self.counts(0, 1, 1, 1, 3, 5, 5),
+        })
+        self.assertEqual(set(SeveritySnapshot.objects.values_list("timestamp", flat=True)),
+                         {datetime(2024, 5, 2, 12, 10, tzinfo=pytz.utc)})
+
+    def test_same_ten_minutes_replace_the_snapshot(self):
+        self.create_units(self.first, [1, 1])
+        severity_snapshots.register_snapshot(self.deployment, now=self.now)
+        UnitStatus.objects.filter(unit__client=self.first).update(status=self.statuses[5])
+        severity_snapshots.register_snapshot(self.deployment, now=self.now + timedelta(minutes=2))
+
+        self.assertEqual(SeveritySnapshot.objects.count(), 4)
+        self.assertEqual(self.snapshots()[None], self.counts(5, 5))
+
+    def test_one_query_for_all_clients(self):
+        self.create_units(self.first, [1, 3])
+        self.create_units(self.second, [5])
+        for i in range(10):
+            client = Client.objects.create(name=f"Snapshot client {i + 4}", keyname=f"snap{i + 4}",
+                                           deployment=self.deployment)
+            self.create_units(client, [1, 5])
+
+        # Counts, clients, and the atomic lock, delete and insert
+        with self.assertNumQueries(7):
+            severity_snapshots.register_snapshot(self.deployment, now=self.now)
+
+    def test_area_plot(self):
+        self.create_units(self.first, [1, 3])
+        self.create_units(self.second, [5])
+        severity_snapshots.register_snapshot(self.deployment, now=self.now)
+        severity_snapshots.register_snapshot(self.deployment, now=self.now + timedelta(minutes=10))
+
+        request = APIRequestFactory().get("/", {
+            "timestamp_after": "2024-05-02T00:00:00Z", "timestamp_before": "2024-05-02T00:00:00Z",
+        })
+        response = apis.SafeDrivingAreaPlotAPI.as_view()(request)
+
+        # The deployment rows, labeled in UTC-6
+        self.assertEqual([dict(row) for row in response.data], [
+            {"timestamp": "2024-05-02 06:10h", "severity_counts": self.counts(1, 3, 5)},
+            {"timestamp": "2024-05-02 06:20h", "severity_counts": self.counts(1, 3, 5)},
+        ])
+
+        request = APIRequestFactory().get("/", {
+            "timestamp_after": "2024-05-02T00:00:00Z", "timestamp_before": "2024-05-02T00:00:00Z",
+            "client": self.second.name,
+        })
+        response = apis.SafeDrivingAreaPlotAPI.as_view()(request)
+        self.assertEqual([row["severity_counts"] for row in response.data],
+                         [self.counts(5), self.counts(5)])
+
+
+class SeveritySnapshotsBackfillTest(TestCase):
+    def setUp(self):
+        self.deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        clients = [Client.objects.create(name=f"Backfill client {i}", keyname=f"backfill{i}",
+                                         deployment=self.deployment) for i in range(2)]
+        self.units = [Unit.objects.create(name=f"Backfill unit {i}", client=clients[i % 2])
+                      for i in range(3)]
+        self.statuses = {severity: GxStatus.objects.create(
+            deployment=self.deployment, severity=severity, description=f"Severidad {severity}")
+            for severity in [1, 3, 5]}
+        self.start = datetime(2024, 5, 2, 12, 0, tzinfo=pytz.utc)
+
+    def write(self, unit, severities):
+        # One row every 10 minutes from start
+        UnitHistory.objects.bulk_create([
+            make_unit_history(unit, self.start + timedelta(minutes=10 * i, seconds=20),
+                              status=self.statuses[severity])
+            for i, severity in enumerate(severities)])
+
+    def snapshots(self):
+        return {(snapshot.client_id, snapshot.timestamp.hour): (snapshot.severity_1,
+                                                                 snapshot.severity_3,
+                                                                 snapshot.severity_5)
+                for snapshot in SeveritySnapshot.objects.filter(deployment=self.deployment)}
+
+    def test_backfill(self):
+        # Only the first run of each hour (12:00 and 13:00) is counted
+        self.write(self.units[0], [1, 5, 5, 5, 5, 5, 3, 3])
+        self.write(self.units[1], [5, 5, 5, 5, 5, 5, 1])
+        self.write(self.units[2], [1, 1, 1, 1, 1, 1, 5])
+        first, second = self.units[0].client_id, self.units[1].client_id
+
+        written = severity_snapshots.backfill(
+            self.deployment, end=self.start + timedelta(hours=3), step=timedelta(hours=1))
+
+        self.assertEqual(written, 6)
+        self.assertEqual(self.snapshots(), {
+            (first, 12): (2, 0, 0), (second, 12): (0, 0, 1), (None, 12): (2, 0, 1),
+            (first, 13): (0, 1, 1), (second, 13): (1, 0, 0), (None, 13): (1, 1, 1),
+        })
+        self.assertFalse(BackfillCheckpoint.objects.exists())
+
+    def test_snapshots_of_the_status_runs_are_kept(self):
+        self.write(self.units[0], [1, 1])
+        severity_snapshots.register_snapshot(self.deployment, now=self.start)
+        SeveritySnapshot.objects.filter(client__isnull=True).update(severity_1=7)
+
+        severity_snapshots.backfill(self.deployment, end=self.start)
+
+        self.assertEqual(self.snapshots()[(None, 12)], (7, 0, 0))
+
+    def test_resume_from_checkpoint(self):
+        self.write(self.units[0], [1] * 18)
+        name = "severity_snapshots.backfill:Safe Driving"
+        BackfillCheckpoint.objects.create(name=name, position=self.start + timedelta(hours=2))
+
+        severity_snapshots.backfill(
+            self.deployment, end=self.start + timedelta(hours=3), step=timedelta(hours=1))
+
+        # The hour after the checkpoint was done by the interrupted backfill
+        self.assertEqual(sorted({hour for _, hour in self.snapshots()}), [12, 13])
+
+        severity_snapshots.backfill(
+            self.deployment, end=self.start + timedelta(hours=3), step=timedelta(hours=1),
+            resume=False)
+        self.assertEqual(sorted({hour for _, hour in self.snapshots()}), [12, 13, 14])
@@ -0,0 +1,88 @@
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from monitor import apis, status_intervals
+from monitor.models import *
+from monitor.unit_of_work import StatusUnitOfWork
+from monitor.tests.utils.units import unit_history_args
+from datetime import datetime, timedelta
+import pytz
+
+
+class StatusIntervalsTest(TestCase):
+    def setUp(self):
+        self.deployment, _ = Deployment.objects.get_or_create(name="Safe Driving")
+        self.client_obj = Client.objects.create(
+            name="Intervals client", keyname="intervals", deployment=self.deployment)
+        self.unit = Unit.objects.create(name="Intervals unit", client=self.client_obj)
+        self.ok = GxStatus.objects.create(
+            deployment=self.deployment, severity=1, description="Funcionando")
+        self.memory = GxStatus.objects.create(
+            deployment=self.deployment, severity=3, description="Errores de memoria")
+        self.messages = GxStatus.objects.create(
+            deployment=self.deployment, severity=3, description="Más de 10 mensajes")
+        self.start = datetime(2024, 5, 2, 12, 0, tzinfo=pytz.utc)
+
+    def history_args(self, register_datetime, status):
+        return unit_history_args(self.unit, register_datetime, status=status)
+
+    def write(self, statuses, start):
+        # One row every 10 minutes, one status run per row
+        for i, status in enumerate(statuses):
+            uow = StatusUnitOfWork("Test")
+            uow.create_history(UnitHistory, self.history_args(start + timedelta(minutes=10 * i), status))
+            uow.flush()
+
+    def timeline(self):
+        return list(StatusInterval.objects.filter(gx_id=self.unit.id).order_by("start_datetime").values_list(
+            "description", "start_datetime", "end_datetime", "severity_since"))
+
+    def minutes(self, minutes):
+        return self.start + timedelta(minutes=minutes)
+
+    def test_status_runs_close_intervals(self):
+        self.write([self.ok, self.ok, self.memory, self.messages, self.messages, self.ok], self.start)
+
+        self.assertEqual(self.timeline(), [
+            ("Funcionando", self.start, self.minutes(20), self.start),
+            ("Errores de memoria", self.minutes(20), self.minutes(30), self.minutes(20)),
+            # Same severity, the severity started with the previous interval
+            ("Más de 10 mensajes", self.minutes(30), self.minutes(50), self.minutes(20)),
+            ("Funcionando", self.minutes(50), None, self.minutes(50)),
+        ])
+
+    def test_rebuild_from_past_rows(self):
+        self.write([self.ok, self.ok, self.ok, self.memory, self.memory], self.start)
+
+        # The late log job changes a past status
+        history = UnitHistory.objects.get(unit=self.unit, register_datetime=self.minutes(10))
+        history.status = self.messages
+        history.save()
+        status_intervals.rebuild(UnitHistory, {self.unit.id: self.minutes(10)})
+
+        self.assertEqual(self.timeline(), [
+            ("Funcionando", self.start, self.minutes(10), self.start),
+            ("Más de 10 mensajes", self.minutes(10), self.minutes(20), self.minutes(10)),
+            ("Funcionando", self.minutes(20), self.minutes(30), self.minutes(20)),
+            ("Errores de memoria", self.minutes(30), None, self.minutes(30)),
+        ])
+
+        # And back, the first interval is continued
+        history.status = self.ok
+        history.save()
+        status_intervals.rebuild(UnitHistory, {self.unit.id: self.minutes(10)})
+        self.assertEqual(self.timeline(), [
+            ("Funcionando", self.start, self.minutes(30), self.start),
+            ("Errores de memoria", self.minutes(30), None, self.minutes(30)),
+        ])
+
+        # Whole rebuild
+        StatusInterval.objects.all().delete()
+        status_intervals.rebuild(UnitHistory, {self.unit.id: None})
+        self.assertEqual(len(self.timeline()), 2)
+
+    def test_status_time(self):
+        self.write([self.ok, self.memory, self.messages], self.start)
+        request = APIRequestFactory().get("/")
+        response = apis.UnitStatusTime.as_view()(request, unit_id=self.unit.id)
+
+        self.assertEqual(response.data["register_datetime"], "2024-05-02T12:10:00Z")
@@ -0,0 +1,148 @@
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from monitor import apis
+from monitor.models import *
+from monitor.tests.utils.units import unit_counts
+from datetime import datetime, timedelta
+import pytz
+
+
+class StatusListQueriesTest(TestCase):
+    # Each list is requested with a few rows and again with more rows: the
+    # number of queries must stay the same
+
+    def setUp(self):
+        self.now = datetime(2024, 5, 2, 12, 0, tzinfo=pytz.utc)
+        self.statuses = {}
+        for name in ["Safe Driving", "Industry", "Smart Retail", "Romberg"]:
+            deployment, _ = Deployment.objects.get_or_create(name=name)
+            self.statuses[name] = [GxStatus.objects.create(
+                deployment=deployment, severity=severity, priority=severity == 2,
+                description=f"Severidad {severity}") for severity in range(4)]
+        self.region = ServerRegion.objects.create(name="us-east-1")
+        self.project_deployment = Deployment.objects.get(name="Industry")
+
+    def get(self, view, path):
+        # The status lists are cached until the next run of their deployment
+        caches["responses"].clear()
+        request = APIRequestFactory().get(path)
+        response = view.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertConstantQueries(self, num, create_rows, view, path):
+        for rows in [2, 6]:
+            create_rows(rows)
+            with self.assertNumQueries(num):
+                response = self.get(view, path)
+        return response
+
+    def client_of(self, deployment):
+        deployment = Deployment.objects.get(name=deployment)
+        return Client.objects.create(name=f"{deployment.name} {Client.objects.count()}",
+                                     keyname=f"client{Client.objects.count()}",
+                                     deployment=deployment)
+
+    def create_units(self, rows):
+        client = self.client_of("Safe Driving")
+        for i in range(rows):
+            unit = Unit.objects.create(name=f"{client.keyname} unit {i}", client=client)
+            UnitStatus.objects.create(unit=unit, status=self.statuses["Safe Driving"][i % 4],
+                                      last_update=self.now, **unit_counts())
+
+    def create_devices(self, deployment, rows):
+        client = self.client_of(deployment)
+        return [Device.objects.create(name=f"{client.keyname} device {i}", client=client)
+                for i in range(rows)]
+
+    def test_unit_status_list(self):
+        response = self.assertConstantQueries(
+            2, self.create_units, apis.UnitStatusList, "/api/v1/monitor/driving/status/")
+
+        # Priority first, then severity and name, descending
+        expected = sorted(UnitStatus.objects.select_related("status", "unit"),
+                          key=lambda x: (x.status.priority, x.status.severity, x.unit.name),
+                          reverse=True)
+        self.assertEqual([row["unit_id"] for row in response.data],
+                         [status.unit_id for status in expected])
+        self.assertEqual(response.data[0]["severity"], 2)
+
+    def test_device_status_list(self):
+        def create_rows(rows):
+            for i, device in enumerate(self.create_devices("Industry", rows)):
+                DeviceStatus.objects.create(
+                    device=device, status=self.statuses["Industry"][i % 4], batch_dropping=0,
+                    camera_connection=timedelta(0), restart=0, license=0, shift_change=0, others=0)
+
+        response = self.assertConstantQueries(
+            2, create_rows, apis.DeviceStatusList, "/api/v1/monitor/industry/status/")
+        self.assertEqual(len(response.data), 8)
+        self.assertEqual(response.data[0]["severity"], 3)
+
+    def test_retail_device_status_list(self):
+        def create_rows(rows):
+            for i, device in enumerate(self.create_devices("Smart Retail", rows)):
+                RetailDeviceStatus.objects.create(
+                    device=device, status=self.statuses["Smart Retail"][i % 4], log_counts={})
+
+        response = self.assertConstantQueries(
+            2, create_rows, apis.RetailDeviceStatusList, "/api/v1/monitor/retail/status/")
+        self.assertEqual(len(response.data), 8)
+
+    def test_romberg_device_status_list(self):
+        def create_rows(rows):
+            client = self.client_of("Romberg")
+            for i in range(rows):
+                device = RombergDevice.objects.create(name=f"{client.keyname} device {i}", client=client)
+                RombergDeviceStatus.objects.create(
+                    device=device, status=self.statuses["Romberg"][i % 4], last_update=self.now,
+                    last_detection=self.now, last_activity=self.now, records={}, log_counts={})
+
+        response = self.assertConstantQueries(
+            2, create_rows, apis.RombergDeviceStatusList, "/api/v1/monitor/romberg/status/")
+        self.assertEqual(len(response.data), 8)
+
+    def create_servers(self, rows):
+        for i in range(rows):
+            server = Server.objects.create(name=f"server {Server.objects.count()}",
+                                           server_type="t3.large", aws_id=f"i-{i}", region=self.region)
+            activity_data = {"Uso de CPU": float(i * 7 % 10)} if i else {}
+            ServerStatus.objects.create(server=server, last_launch=self.now, last_activity=self.now,
+                                        state="running", activity_data=activity_data)
+            project = Project.objects.create(name=f"{server.name} project",
+                                             deployment=self.project_deployment)
+            project.servers.add(server)
+
+    def test_server_status_list(self):
+        response = self.assertConstantQueries(
+            1, self.create_servers, apis.ServerStatusListAPI, "/api/v1/monitor/servers/status/")
+
+        cpu = [row["activity_data"].get("Uso de CPU", 0) for row in response.data]
+        self.assertEqual(len(cpu), 8)
+        self.assertEqual(cpu, sorted(cpu, reverse=True))
+
+    def test_all_servers_projects(self):
+        response = self.assertConstantQueries(
+            2, self.create_servers, apis.AllServersProjectsAPI, "/api/v1/monitor/servers/projects/")
+        self.assertEqual(response.data[0]["projects"], ["server 0 project"])
+
+    def create_rds(self, rows):
+        for i in range(rows):
+            rds = RDS.objects.create(name=f"rds {RDS.objects.count()}", region=self.region)
+            RDSStatus.objects.create(rds=rds, status="available", last_activity=self.now,
+                                     activity_data={"Uso de CPU": float(i * 7 % 10)})
+            Project.objects.create(name=f"{rds.name} project", database=rds,
+                                   deployment=self.project_deployment)
+
+    def test_rds_status_list(self):
+        response = self.assertConstantQueries(
+            1, self.create_rds, apis.RDSStatusListAPI, "/api/v1/monitor/rds/status/")
+
+        cpu = [row["activity_data"]["Uso de CPU"] for row in response.data]
+        self.assertEqual(cpu, sorted(cpu, reverse=True))
+
+    def test_all_rds_projects(self):
+        response = self.assertConstantQueries(
+            2, self.create_rds, apis.AllRDSProjectsAPI, "/api/v1/monitor/rds/projects/")
+        self.assertEqual(response.data[0]["projects"], ["rds 0 project"])
@@ -0,0 +1,87 @@
+from django.test import TestCase
+from monitor.selectors import get_client_failed_trips, get_client_open_trips, get_unit_failed_trips
+from monitor.trips import TripBatch, TripIndex
+from monitor.models import *
+from datetime import datetime, timedelta
+import pytz
+
+
+class TripsTest(TestCase):
+    def setUp(self) -> None:
+        self.now = datetime(2024, 4, 4, 12, tzinfo=pytz.UTC)
+        deployment = Deployment.objects.create(name="Safe Driving")
+        self.client = Client.objects.create(name="Test", deployment=deployment)
+        self.units = [Unit.objects.create(name=str(i), client=self.client)
+                      for i in range(3)]
+
+        # Unit 0: a successful trip and three failed trips after it, the last one open
+        self.create_trip(self.units[0], -10, -9, active=True)
+        self.create_trip(self.units[0], -8, -7)
+        self.create_trip(self.units[0], -6, -5)
+        self.create_trip(self.units[0], -4, None)
+        # Unit 1: failed trip before its last successful trip
+        self.create_trip(self.units[1], -10, -9)
+        self.create_trip(self.units[1], -8, -7, active=True)
+        # Unit 2: open successful trip
+        self.create_trip(self.units[2], -10, -9)
+        self.create_trip(self.units[2], -8, None, active=True)
+
+        return super().setUp()
+
+    def create_trip(self, unit, start_hours, end_hours, active=False):
+        start = self.now + timedelta(hours=start_hours)
+        end = self.now + timedelta(hours=end_hours) if end_hours is not None else None
+        return UnitTrip.objects.create(unit=unit, start_datetime=start, start_date=start.date(),
+                                       end_datetime=end, end_date=end.date() if end else None,
+                                       active=active, success=False)
+
+    def test_client_failed_trips_match_unit_failed_trips(self):
+        expected = {trip.pk for unit in self.units for trip in get_unit_failed_trips(unit)}
+
+        with self.assertNumQueries(1):
+            trips = {trip.pk for trip in get_client_failed_trips(self.client)}
+
+        self.assertEqual(trips, expected)
+        self.assertEqual(len(trips), 3)
+
+    def test_find(self):
+        index = TripIndex(get_client_failed_trips(self.client))
+        unit_id = self.units[0].id
+
+        self.assertIsNone(index.find(unit_id, self.now - timedelta(hours=9)))
+        self.assertEqual(index.find(unit_id, self.now - timedelta(hours=7, minutes=30)).start_datetime,
+                         self.now - timedelta(hours=8))
+        # Between two trips
+        self.assertIsNone(index.find(unit_id, self.now - timedelta(hours=4, minutes=30)))
+        # Open trip
+        self.assertEqual(index.find(unit_id, self.now).start_datetime,
+                         self.now - timedelta(hours=4))
+        self.assertIsNone(index.find(self.units[1].id, self.now))
+
+    def test_batch(self):
+        index = TripIndex(get_client_failed_trips(self.client))
+        batch = TripBatch(get_client_open_trips(self.client), index.by_pk)
+
+        trip = index.find(self.units[0].id, self.now)
+        trip.active = True
+        batch.save(trip)
+
+        open_trip, created = batch.get_or_create_open(self.units[0], self.now)
+        self.assertIs(open_trip, trip)
+        self.assertFalse(created)
+        open_trip.end_datetime = self.now
+        open_trip.end_date = self.now.date()
+        batch.save(open_trip)
+
+        new_trip = batch.create(self.units[1], self.now)
+        new_trip.active = True
+        batch.save(new_trip)
+
+        with self.assertNumQueries(2):
+            batch.flush()
+
+        trip.refresh_from_db()
+        self.assertTrue(trip.active)
+        self.assertEqual(trip.end_datetime, self.now)
+        self.assertTrue(UnitTrip.objects.get(
+            unit=self.units[1], start_datetime=self.now).active)
@@ -0,0 +1,69 @@
+from django.test import TestCase
+from monitor.unit_of_work import StatusUnitOfWork
+from monitor.models import *
+from datetime import datetime, timedelta
+import pytz
+
+
+class StatusUnitOfWorkTest(TestCase):
+    def setUp(self) -> None:
+        self.now = datetime.now(tz=pytz.timezone("UTC"))
+        deployment = Deployment.objects.create(name="Industry")
+        self.client = Client.objects.create(
+            name="Test", deployment=deployment)
+        self.status = GxStatus.objects.create(
+            deployment=deployment, severity=1, description="Comunicación reciente")
+        self.alert_type = AlertType.objects.create(
+            description="Sin conexión reciente")
+
+        return super().setUp()
+
+    def device_counts(self, **kwargs):
+        return {
+            'batch_dropping': 0,
+            'camera_connection': timedelta(0),
+            'restart': 0,
+            'license': 0,
+            'shift_change': 0,
+            'others': 0,
+            'status': self.status,
+            **kwargs
+        }
+
+    def run_flush(self, devices, **kwargs):
+        uow = StatusUnitOfWork("Test")
+        for device in devices:
+            uow.update_or_create_status(
+                DeviceStatus, "device", device, {'last_update': self.now, **self.device_counts(**kwargs)})
+            uow.create_history(DeviceHistory, {
+                'device': device,
+                'register_date': self.now.date(),
+                'register_datetime': self.now,
+                **self.device_counts(**kwargs)
+            })
+            uow.create_alert({"alert_type": self.alert_type, "gx": device,
+                              "register_datetime": self.now, "register_date": self.now.date()})
+        return uow.flush()
+
+    def test_upsert(self):
+        device = Device.objects.create(name="d1", client=self.client)
+        self.run_flush([device], last_connection=self.now, restart=2)
+        self.run_flush([device], restart=5)
+
+        status = DeviceStatus.objects.get(device=device)
+        self.assertEqual(status.restart, 5)
+        # Fields not given in the second run keep their value
+        self.assertEqual(status.last_connection, self.now)
+        self.assertEqual(DeviceHistory.objects.filter(device=device).count(), 2)
+        self.assertEqual(Alert.objects.filter(gx=device).count(), 2)
+
+    def test_query_count_does_not_grow_with_devices(self):
+        devices = [Device.objects.create(name=f"d{i}", client=self.client)
+                   for i in range(50)]
+
+        small = self.run_flush(devices[:2])
+        large = self.run_flush(devices)
+
+        self.assertEqual(large["rows"], 150)
+        self.assertEqual(small["queries"], large["queries"])
+        self.assertEqual(DeviceStatus.objects.count(), 50)
@@ -0,0 +1,23 @@
+from monitor.models import UnitHistory
+
+
+# Log counts of UnitStatus and UnitHistory
+COUNT_FIELDS = ["total", "restart", "reboot", "start", "data_validation", "source_missing",
+                "camera_connection", "storage_devices", "forced_reboot", "read_only_ssd",
+                "ignition", "aux", "others"]
+
+
+def unit_counts(**counts) -> dict:
+    """Zero for every log count, except the given ones (and any other field given)."""
+    return {**dict.fromkeys(COUNT_FIELDS, 0), **counts}
+
+
+def unit_history_args(unit, register_datetime, **counts) -> dict:
+    """Args of a UnitHistory of unit at register_datetime, for the unit of work."""
+    return {"unit": unit, "register_datetime": register_datetime,
+            "register_date": register_datetime.date(), **unit_counts(**counts)}
+
+
+def make_unit_history(unit, register_datetime, **counts) -> UnitHistory:
+    """Unsaved UnitHistory of unit at register_datetime, for save or bulk_create."""
+    return UnitHistory(**unit_history_args(unit, register_datetime, **counts))
@@ -0,0 +1,111 @@
+from django.test import TestCase, override_settings
+from monitor import work_queue
+from monitor.models import Client, Deployment, WorkItem
+from datetime import datetime, timedelta
+from unittest import mock
+import pytz
+
+
+calls = []
+
+
+def sample_job(clients=None, **kwargs):
+    calls.append(([client.name for client in clients], kwargs))
+
+
+def failing_job(clients=None):
+    raise ValueError("API down")
+
+
+# The workers close stale connections between items, which would close the
+# connection of the test transaction
+@mock.patch("monitor.work_queue.close_old_connections", mock.Mock())
+@override_settings(MONITOR_WORK_MAX_ATTEMPTS=2)
+class WorkQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+        self.deployment, _ = Deployment.objects.get_or_create(name="Industry")
+        self.clients = [
+            Client.objects.create(name=f"Queue client {i}", keyname=f"queue_{i}",
+                                  deployment=self.deployment)
+            for i in range(3)
+        ]
+
+    def test_enqueue_skips_queued_clients(self):
+        items = work_queue.enqueue_clients(
+            "monitor.tests.work_queue.test_work_queue.sample_job", self.clients[:2],
+            deployment_name="Industry")
+        self.assertEqual(len(items), 2)
+
+        items = work_queue.enqueue_clients(
+            "monitor.tests.work_queue.test_work_queue.sample_job", self.clients,
+            deployment_name="Industry")
+        self.assertEqual([item.client for item in items], [self.clients[2]])
+
+    def test_claim_and_run(self):
+        work_queue.enqueue_clients(
+            "monitor.tests.work_queue.test_work_queue.sample_job", self.clients,
+            deployment_name="Industry")
+
+        processed = work_queue.work("worker-1", burst=True)
+
+        self.assertEqual(processed, 3)
+        self.assertEqual(sorted(calls), sorted(
+            ([client.name], {"deployment_name": "Industry"}) for client in self.clients))
+        self.assertFalse(WorkItem.objects.exclude(status=WorkItem.DONE).exists())
+        self.assertIsNone(work_queue.claim("worker-1"))
+
+    def test_expired_lease_is_reclaimed(self):
+        work_queue.enqueue_clients(
+            "monitor.tests.work_queue.test_work_queue.sample_job", self.clients[:1])
+
+        item = work_queue.claim("worker-1")
+        self.assertEqual(item.attempts, 1)
+        # Leased items are not handed to other workers
+        self.assertIsNone(work_queue.claim("worker-2"))
+
+        # worker-1 crashed and its lease expired
+        WorkItem.objects.filter(id=item.id).update(
+            leased_until=datetime.now(tz=pytz.timezone("UTC")) - timedelta(seconds=1))
+        retried = work_queue.claim("worker-2")
+        self.assertEqual(retried.id, item.id)
+        self.assertEqual(retried.attempts, 2)
+
+        # The old owner can neither renew nor finish the item anymore
+        self.assertFalse(work_queue.renew(item))
+        work_queue.finish(item)
+        self.assertEqual(WorkItem.objects.get(id=item.id).status, WorkItem.RUNNING)
+
+        work_queue.finish(retried)
+        self.assertEqual(WorkItem.objects.get(id=item.id).status, WorkItem.DONE)
+
+    def test_failed_items_are_retried(self):
+        work_queue.enqueue_clients(
+            "monitor.tests.work_queue.test_work_queue.failing_job", self.clients[:1])
+
+        work_queue.run_item(work_queue.claim("worker-1"))
+        item = WorkItem.objects.get()
+        self.assertEqual(item.status, WorkItem.PENDING)
+        self.assertIn("API down", item.error)
+
+        work_queue.run_item(work_queue.claim("worker-1"))
+        item = WorkItem.objects.get()
+        self.assertEqual(item.status, WorkItem.FAILED)
+        self.assertEqual(item.attempts, 2)
+
+    def test_expired_lease_without_attempts_left_fails(self):
+        work_queue.enqueue_clients(
+            "monitor.tests.work_queue.test_work_queue.sample_job", self.clients[:1])
+        expired = datetime.now(tz=pytz.timezone("UTC")) - timedelta(seconds=1)
+
+        # The item kills its worker on both attempts
+        for attempt in range(2):
+            item = work_queue.claim(f"worker-{attempt}")
+            self.assertEqual(item.attempts, attempt + 1)
+            WorkItem.objects.filter(id=item.id).update(leased_until=expired)
+
+        self.assertIsNone(work_queue.claim("worker-3"))
+        self.assertEqual(WorkItem.objects.get().status, WorkItem.FAILED)
+        # The client can be queued again
+        self.assertEqual(len(work_queue.enqueue_clients(
+            "monitor.tests.work_queue.test_work_queue.sample_job", self.clients[:1])), 1)
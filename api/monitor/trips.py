@@ -0,0 +1,94 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+from .models import UnitTrip
+
+
+class TripIndex:
+    """
+    Failed trips of a client grouped by unit and sorted by start, so the trip
+    a late log belongs to is found with a binary search.
+    """
+
+    def __init__(self, trips):
+        self.trips = defaultdict(list)
+        self.by_pk = {}
+
+        for trip in sorted(trips, key=lambda trip: trip.start_datetime):
+            self.trips[trip.unit_id].append(trip)
+            self.by_pk[trip.pk] = trip
+
+        self.starts = {unit_id: [trip.start_datetime for trip in unit_trips]
+                       for unit_id, unit_trips in self.trips.items()}
+
+    def unit_trips(self, unit_id) -> list:
+        return self.trips.get(unit_id, [])
+
+    def find(self, unit_id, log_time):
+        # Trip with start < log_time < end (or still open), or None
+        starts = self.starts.get(unit_id)
+        if not starts:
+            return None
+
+        i = bisect_left(starts, log_time) - 1
+        if i < 0:
+            return None
+
+        trip = self.trips[unit_id][i]
+        if trip.end_datetime is None or log_time < trip.end_datetime:
+            return trip
+        return None
+
+
+class TripBatch:
+    """
+    Opens, closes and updates the trips of a client in memory and writes them
+    with one bulk_create and one bulk_update.
+    """
+
+    UPDATE_FIELDS = ['active', 'end_datetime', 'end_date']
+
+    def __init__(self, open_trips, known_trips=None):
+        # Use the same instances as the trip index, so that changes made
+        # through either one are written once
+        known_trips = known_trips or {}
+        self.open_trips = {trip.unit_id: known_trips.get(trip.pk, trip)
+                           for trip in sorted(open_trips, key=lambda trip: trip.start_datetime)}
+        self.to_create = []
+        self.to_update = {}
+
+    def create(self, unit, start_datetime, success=False):
+        # Same as services.create_unit_trip
+        trip = UnitTrip(
+            unit=unit,
+            start_datetime=start_datetime,
+            start_date=start_datetime.date(),
+            success=success
+        )
+        self.to_create.append(trip)
+        return trip
+
+    def get_or_create_open(self, unit, start_datetime):
+        # Same as selectors.get_or_create_open_trip
+        trip = self.open_trips.get(unit.id)
+        if trip is not None:
+            return trip, False
+
+        trip = UnitTrip(unit=unit, start_datetime=start_datetime,
+                        start_date=start_datetime.date())
+        self.to_create.append(trip)
+        self.open_trips[unit.id] = trip
+        return trip, True
+
+    def save(self, trip):
+        # New trips are written with their latest values on flush
+        if trip.pk is not None:
+            self.to_update[trip.pk] = trip
+
+    def flush(self):
+        UnitTrip.objects.bulk_create(self.to_create, batch_size=1000)
+        UnitTrip.objects.bulk_update(
+            self.to_update.values(), fields=self.UPDATE_FIELDS, batch_size=1000)
+
+        self.to_create = []
+        self.to_update = {}
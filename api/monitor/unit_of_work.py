@@ -0,0 +1,107 @@
+import time
+from collections import defaultdict
+
+from django.db import OperationalError, connection, transaction
+
+from . import rollups, status_intervals
+from .models import Alert
+
+
+class StatusUnitOfWork:
+    """
+    Collects the status upserts, history rows and alerts of a status run and
+    writes them in one transaction, along with the hourly rollups and status
+    intervals of the histories. Status rows are upserted with
+    INSERT ... ON CONFLICT on their unique gx field, so a flush costs a few
+    statements per model instead of a few per device.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.statuses = defaultdict(dict)
+        self.histories = defaultdict(list)
+        self.alerts = []
+
+    def update_or_create_status(self, model, field: str, obj, defaults: dict):
+        # Same semantics as model.objects.update_or_create(**{field: obj}, defaults=defaults);
+        # a second call for the same obj updates the pending row
+        pending = self.statuses[(model, field)].setdefault(obj.pk, (obj, {}))
+        pending[1].update(defaults)
+
+    def create_history(self, model, args: dict):
+        self.histories[model].append(model(**args))
+
+    def create_histories(self, model, args_list: list):
+        for args in args_list:
+            self.create_history(model, args)
+
+    def create_alert(self, args: dict):
+        self.alerts.append(Alert(**args))
+
+    def __len__(self):
+        return sum(len(rows) for rows in self.statuses.values()) + \
+            sum(len(rows) for rows in self.histories.values()) + len(self.alerts)
+
+    def _write(self):
+        for (model, field), rows in self.statuses.items():
+            # Rows may set different fields (e.g. on_trip is optional), and
+            # only the fields that were given must be overwritten on conflict
+            by_fields = defaultdict(list)
+            for obj, defaults in rows.values():
+                by_fields[tuple(sorted(defaults))].append(
+                    model(**{field: obj, **defaults}))
+
+            for update_fields, objs in by_fields.items():
+                model.objects.bulk_create(
+                    objs,
+                    batch_size=1000,
+                    update_conflicts=True,
+                    unique_fields=[field],
+                    update_fields=list(update_fields),
+                )
+
+        for model, objs in self.histories.items():
+            model.objects.bulk_create(objs, batch_size=1000)
+            rollups.refresh(model, objs)
+            status_intervals.record(model, objs)
+
+        Alert.objects.bulk_create(self.alerts, batch_size=1000)
+
+    def flush(self, retries=3, delay=1):
+        """
+        Writes everything collected so far and returns a report with the
+        number of rows and queries of the flush.
+        """
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        rows = len(self)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_queries):
+                with transaction.atomic():
+                    self._write()
+        except OperationalError as e:
+            if retries > 0:
+                time.sleep(delay)  # Wait for a moment before retrying
+                return self.flush(retries - 1, delay)
+            else:
+                raise e
+
+        report = {
+            "name": self.name,
+            "rows": rows,
+            "queries": len(queries),
+            "duration": time.perf_counter() - start,
+        }
+        print(f'{self.name}: {report["rows"]} rows in {report["queries"]} queries '
+              f'({report["duration"]:.2f}s)')
+
+        self.statuses.clear()
+        self.histories.clear()
+        self.alerts.clear()
+
+        return report
@@ -5,6 +5,7 @@ from . import apis
 
 urlpatterns = [
     path("deployments/", apis.DeploymentList.as_view(), name="deployments"),
+    path("fleet/summary/", apis.FleetSummaryAPI.as_view(), name="fleet-summary"),
     path("gx-models/",
          include(([
              path("create/", apis.GxModelCreateAPI.as_view(),
@@ -0,0 +1,161 @@
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import pytz
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import WorkItem
+
+
+# DB-backed queue of per-client work shared by several worker processes or
+# nodes. Items are claimed with SELECT ... FOR UPDATE SKIP LOCKED and held
+# with a lease that the worker keeps renewing while it runs the item; if the
+# worker dies the lease expires and another worker retries the item.
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def enqueue_clients(job: str, clients, **kwargs) -> list:
+    """
+    One item per client for job (the path of a function that takes a clients
+    list). Clients that already have the same work pending or running are
+    skipped.
+    """
+    clients = list(clients)
+    queued = set(WorkItem.objects.filter(
+        job=job,
+        kwargs=kwargs,
+        client__in=clients,
+        status__in=[WorkItem.PENDING, WorkItem.RUNNING],
+    ).values_list("client_id", flat=True))
+
+    return WorkItem.objects.bulk_create([
+        WorkItem(job=job, kwargs=kwargs, client=client,
+                 deployment_id=client.deployment_id)
+        for client in clients if client.id not in queued
+    ])
+
+
+def claim(worker: str, lease=None):
+    """
+    Leases the oldest pending item, or a running one whose lease expired, to
+    worker. Running items with an expired lease and no attempts left are
+    failed instead. Returns None if there is nothing to do.
+    """
+    lease = lease or settings.MONITOR_WORK_LEASE
+    now = datetime.now(tz=pytz.timezone("UTC"))
+
+    with transaction.atomic():
+        # Items whose worker died (or hung) on every attempt are not retried,
+        # otherwise the client would never be queued again
+        WorkItem.objects.filter(
+            status=WorkItem.RUNNING, leased_until__lt=now,
+            attempts__gte=settings.MONITOR_WORK_MAX_ATTEMPTS,
+        ).update(status=WorkItem.FAILED, finished_at=now, leased_until=None,
+                 error="Lease expired on the last attempt")
+
+        item = WorkItem.objects.select_for_update(skip_locked=True).filter(
+            Q(status=WorkItem.PENDING) |
+            Q(status=WorkItem.RUNNING, leased_until__lt=now)
+        ).order_by("id").first()
+
+        if item is None:
+            return None
+
+        item.status = WorkItem.RUNNING
+        item.worker = worker
+        item.attempts += 1
+        item.leased_until = now + timedelta(seconds=lease)
+        item.started_at = now
+        item.save(update_fields=["status", "worker", "attempts",
+                                 "leased_until", "started_at"])
+
+    return item
+
+
+def renew(item: WorkItem, lease=None) -> bool:
+    # False if the item was taken over by another worker
+    lease = lease or settings.MONITOR_WORK_LEASE
+    now = datetime.now(tz=pytz.timezone("UTC"))
+
+    return WorkItem.objects.filter(
+        id=item.id, worker=item.worker, status=WorkItem.RUNNING
+    ).update(leased_until=now + timedelta(seconds=lease)) == 1
+
+
+def finish(item: WorkItem, error=None):
+    now = datetime.now(tz=pytz.timezone("UTC"))
+
+    if error is None:
+        status = WorkItem.DONE
+    elif item.attempts < settings.MONITOR_WORK_MAX_ATTEMPTS:
+        status = WorkItem.PENDING  # Retried by the next free worker
+    else:
+        status = WorkItem.FAILED
+
+    WorkItem.objects.filter(id=item.id, worker=item.worker).update(
+        status=status, finished_at=now, leased_until=None, error=error)
+
+
+def run_item(item: WorkItem, lease=None):
+    lease = lease or settings.MONITOR_WORK_LEASE
+
+    # Keep the lease while the item runs
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(lease / 3):
+            renew(item, lease)
+        close_old_connections()
+
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+
+    error = None
+    try:
+        job = import_string(item.job)
+        if item.client_id is not None:
+            job(clients=[item.client], **item.kwargs)
+        else:
+            job(**item.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        print(f"{item} failed:\n{error}")
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+
+    finish(item, error)
+    return error is None
+
+
+def work(worker=None, burst=False, lease=None, poll_interval=None):
+    """
+    Runs items until stopped. With burst, returns the number of items run
+    once the queue is empty.
+    """
+    worker = worker or worker_name()
+    poll_interval = poll_interval or settings.MONITOR_WORK_POLL_INTERVAL
+
+    processed = 0
+    while True:
+        close_old_connections()
+        item = claim(worker, lease)
+
+        if item is None:
+            if burst:
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        run_item(item, lease)
+        processed += 1